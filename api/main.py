@@ -135,13 +135,27 @@ def list_venues(db: Session = Depends(deps.get_db)) -> List[VenueOut]:
 
 
 @app.post("/admin/ingest")
-def admin_ingest(credentials: HTTPBasicCredentials = Depends(security)) -> dict:
+def admin_ingest(
+    credentials: HTTPBasicCredentials = Depends(security),
+    pipeline: Optional[str] = Query(None, pattern="^(files|stream)$", description="files (default: INGEST_PIPELINE) or stream"),
+    audit: bool = Query(False, description="Stream mode: also write the raw events file"),
+) -> dict:
     # Basic authentication
     verify_admin(credentials)
+    pipeline = pipeline or os.environ.get("INGEST_PIPELINE", "files")
     # Run ingestion + normalisation synchronously
+    if pipeline == "stream":
+        # Sources are normalised and written as they are fetched (see normalize/streaming.py).
+        from ingestion.formats import FORMAT, filename, resolve_format
+        from ingestion.run_all import OUTPUT_DIR
+        from normalize.streaming import run_pipeline
+
+        audit_path = OUTPUT_DIR / filename("raw_events", resolve_format(FORMAT)) if audit else None
+        counts = run_pipeline(str(audit_path) if audit_path else None)
+        return {"status": "ok", "message": "Streaming ingestion executed", "events": counts["events"]}
     from ingestion.run_all import main as ingestion_main  # imported here to avoid overhead
     from normalize.normalizer import normalize_and_upsert
 
-    ingestion_main()
-    normalize_and_upsert()
-    return {"status": "ok", "message": "Ingestion and normalisation executed"}
+    raw_events_path = ingestion_main()
+    counts = normalize_and_upsert(str(raw_events_path))
+    return {"status": "ok", "message": "Ingestion and normalisation executed", "events": counts["events"]}
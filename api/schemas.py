@@ -4,7 +4,7 @@ Pydantic schemas for API responses.
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Optional
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel, Field
 
@@ -35,6 +35,7 @@ class TournamentOut(BaseModel):
     variant: Optional[str] = None
     status: Optional[str] = None
     source_url: Optional[str] = None
+    origins: Optional[List[Dict[str, Optional[str]]]] = None
     venue: VenueOut
 
     class Config:
@@ -0,0 +1,111 @@
+"""
+Benchmark the datetime parser against the previous dateutil-only parse_datetime.
+
+Parses ``--count`` date strings drawn from a pool of ``--distinct`` values, in
+the mix sources actually publish: ISO 8601 (50%), day-first numeric dates
+(30%) and French long dates (20%), each source using one format. The legacy
+function cannot read French dates; the number of values each parser
+understood is printed next to its time.
+
+Usage:
+    python -m benchmarks.bench_datetimes [--count 1000000] [--distinct 20000]
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Tuple
+
+from dateutil import parser as dateutil_parser
+
+from normalize.datetimes import DatetimeParser, _parse
+
+WEEKDAYS = ["lundi", "mardi", "mercredi", "jeudi", "vendredi", "samedi", "dimanche"]
+MONTHS = [
+    "janvier",
+    "février",
+    "mars",
+    "avril",
+    "mai",
+    "juin",
+    "juillet",
+    "août",
+    "septembre",
+    "octobre",
+    "novembre",
+    "décembre",
+]
+
+
+def legacy_parse_datetime(value: Optional[str]) -> Optional[datetime]:
+    """parse_datetime as it was before `normalize.datetimes`."""
+    if not value:
+        return None
+    try:
+        return dateutil_parser.isoparse(value)
+    except Exception:
+        try:
+            return dateutil_parser.parse(value)
+        except Exception:
+            return None
+
+
+def make_values(count: int, distinct: int, seed: int = 0) -> List[Tuple[str, str]]:
+    rng = random.Random(seed)
+    base = datetime(2025, 1, 1)
+    pool = []
+    for i in range(distinct):
+        dt = base + timedelta(
+            days=rng.randrange(730),
+            hours=rng.choice([14, 18, 19, 20, 21]),
+            minutes=rng.choice([0, 15, 30]),
+        )
+        kind = rng.random()
+        if kind < 0.5:
+            pool.append(("feed", dt.isoformat() + "+01:00"))
+        elif kind < 0.8:
+            pool.append(("club", dt.strftime("%d/%m/%Y %H:%M")))
+        else:
+            text = f"{WEEKDAYS[dt.weekday()]} {dt.day} {MONTHS[dt.month - 1]} {dt.year} à {dt.hour}h{dt.minute:02d}"
+            pool.append(("casino", text))
+    return [rng.choice(pool) for _ in range(count)]
+
+
+def timed(
+    label: str,
+    fn: Callable[[str, str], Optional[datetime]],
+    values: List[Tuple[str, str]],
+) -> None:
+    start = time.perf_counter()
+    parsed = sum(1 for source, value in values if fn(value, source) is not None)
+    elapsed = time.perf_counter() - start
+    rate = len(values) / elapsed
+    print(
+        f"{label:>18}: {elapsed:7.2f} s  {rate:>10,.0f} values/s  {parsed:>9,} parsed"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--count", type=int, default=1_000_000)
+    parser.add_argument("--distinct", type=int, default=20_000)
+    args = parser.parse_args()
+
+    values = make_values(args.count, args.distinct)
+    timed(
+        "legacy (dateutil)", lambda value, source: legacy_parse_datetime(value), values
+    )
+    # Fast paths alone: no memoisation, no learned format.
+    timed(
+        "fast paths", lambda value, source: _parse.__wrapped__(value, None)[0], values
+    )
+    _parse.cache_clear()
+    learned = DatetimeParser()
+    timed("learned + cached", learned.parse, values)
+    print(f"learned formats: {learned.learned_formats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark cross-source deduplication on synthetic normalised events.
+
+Builds ``--events`` normalised events spread over ``--venues`` venues and a
+season of evenings; ``--duplicates`` of them are announced a second time by
+another source, with a reworded title and a start shifted by up to an hour.
+`dedup.dedupe` runs on growing prefixes of the set: with blocking by venue
+and start bucket the time per event stays flat, and the recall line shows how
+many planted duplicates were merged.
+
+Usage:
+    python -m benchmarks.bench_dedup [--events 100000] [--venues 300] [--duplicates 0.3]
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+from normalize.dedup import dedupe
+
+TITLES = [
+    "Main Event",
+    "Deepstack",
+    "Omaha PLO",
+    "Turbo KO",
+    "Freezeout",
+    "Super Stack",
+    "Mystery Bounty",
+]
+REWORDINGS = [
+    lambda t, b: f"{t} {b}€",
+    lambda t, b: f"{t.upper()} - {b} €",
+    lambda t, b: f"Tournoi {t.lower()} {b} €",
+    lambda t, b: f"{t.replace(' ', '')} {b}€",
+]
+SEASON_START = datetime(2025, 9, 1, 18, 0, tzinfo=timezone.utc)
+
+
+def make_events(
+    count: int, venues: int, duplicates: float, seed: int = 0
+) -> List[Dict]:
+    rng = random.Random(seed)
+    events: List[Dict] = []
+    i = 0
+    while len(events) < count:
+        title, buy_in = rng.choice(TITLES), rng.choice([50, 100, 150, 250, 500])
+        start = SEASON_START + timedelta(
+            days=rng.randrange(365), minutes=30 * rng.randrange(8)
+        )
+        base = {
+            "venue_name": f"Casino {rng.randrange(venues)}",
+            "city": "Lyon",
+            "buy_in_cents": buy_in * 100,
+            "start": start,
+        }
+        events.append(
+            dict(
+                base,
+                title=f"{title} {buy_in}€",
+                source_name="rss",
+                source_hash=f"rss-{i}",
+                duplicate_of=None,
+            )
+        )
+        if rng.random() < duplicates and len(events) < count:
+            reworded = rng.choice(REWORDINGS)(title, buy_in)
+            shifted = start + timedelta(minutes=rng.choice([0, 15, 30, 60]))
+            events.append(
+                dict(
+                    base,
+                    title=reworded,
+                    start=shifted,
+                    source_name="agenda",
+                    source_hash=f"agenda-{i}",
+                    duplicate_of=i,
+                )
+            )
+        i += 1
+    rng.shuffle(events)
+    return events
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--venues", type=int, default=300)
+    parser.add_argument("--duplicates", type=float, default=0.3)
+    args = parser.parse_args()
+
+    events = make_events(args.events, args.venues, args.duplicates)
+    for size in (args.events // 4, args.events // 2, args.events):
+        sample = events[:size]
+        originals = {e["source_hash"] for e in sample}
+        planted = sum(
+            1
+            for e in sample
+            if e["duplicate_of"] is not None and f"rss-{e['duplicate_of']}" in originals
+        )
+        start = time.perf_counter()
+        merged, stats = dedupe(sample)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{size:>8} events: {elapsed:6.2f} s  {elapsed / size * 1e6:6.1f} µs/event  "
+            f"{stats['comparisons']:>8} comparisons  {stats['merged']:>6} merged / {planted} planted  -> {len(merged)} events"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Benchmark event fingerprinting throughput.
+
+Compares the historical ``sha1(str(raw_event))`` hash with the canonical
+BLAKE2b identity key + content hash of `ingestion.fingerprint`.
+
+Usage:
+    python -m benchmarks.bench_fingerprint [--events 200000]
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import time
+
+from ingestion.fingerprint import content_hash, stamp
+
+
+def make_events(count: int):
+    return [
+        {
+            "source_name": "bench",
+            "source_url": f"https://casino.example/tournoi/{i}",
+            "title": f"Deepstack #{i}",
+            "description": "Structure 30 minutes, re-entry illimitée"
+            if i % 3
+            else None,
+            "start": f"2025-10-{i % 28 + 1:02d}T20:00:00",
+            "end": None,
+            "buy_in": str(50 + i % 10 * 50),
+            "variant": "NLHE",
+            "venue_name": f"Casino {i % 150}",
+            "address": None,
+            "city": "Lyon",
+        }
+        for i in range(count)
+    ]
+
+
+def legacy(event):
+    return hashlib.sha1(str(event).encode("utf-8", errors="ignore")).hexdigest()
+
+
+def timed(label, fn, events):
+    start = time.perf_counter()
+    for ev in events:
+        fn(ev)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{label:>28}: {elapsed * 1000:8.1f} ms  ({len(events) / elapsed:,.0f} events/s)"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=200_000)
+    args = parser.parse_args()
+
+    events = make_events(args.events)
+    timed("sha1(str(event))", legacy, events)
+    timed("content_hash", content_hash, events)
+    timed("stamp (identity + content)", lambda ev: stamp(dict(ev)), events)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark the intermediate file formats between ingestion and normalisation.
+
+Writes and reads back the same stamped raw events in every installed format
+of `ingestion.formats` and reports throughput and on-disk size.
+
+Usage:
+    python -m benchmarks.bench_formats [--events 200000]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from ingestion import formats
+from ingestion.fingerprint import stamp
+
+
+def make_events(count: int):
+    return [
+        stamp(
+            {
+                "source_name": "bench",
+                "source_url": f"https://casino.example/tournoi/{i}",
+                "title": f"Deepstack #{i}",
+                "description": "Structure 30 minutes, re-entry illimitée"
+                if i % 3
+                else None,
+                "start": f"2025-10-{i % 28 + 1:02d}T20:00:00",
+                "end": None,
+                "buy_in": str(50 + i % 10 * 50),
+                "variant": "NLHE",
+                "venue_name": f"Casino {i % 150}",
+                "address": None,
+                "city": "Lyon",
+            }
+        )
+        for i in range(count)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=200_000)
+    args = parser.parse_args()
+
+    events = make_events(args.events)
+    print(f"{'format':>8} {'write ev/s':>12} {'read ev/s':>12} {'size MiB':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in formats.available_formats():
+            path = Path(tmp) / formats.filename("bench", fmt)
+            start = time.perf_counter()
+            with formats.open_writer(path, fmt) as writer:
+                for ev in events:
+                    writer.write(ev)
+            write_s = time.perf_counter() - start
+            start = time.perf_counter()
+            count = sum(1 for _ in formats.read_events(path))
+            read_s = time.perf_counter() - start
+            assert count == len(events)
+            size = os.path.getsize(path) / 2**20
+            print(
+                f"{fmt:>8} {len(events) / write_s:12,.0f} {len(events) / read_s:12,.0f} {size:9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
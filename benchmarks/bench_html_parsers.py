@@ -0,0 +1,56 @@
+"""
+Benchmark the HTML parser backends on large schedule pages.
+
+Generates pages with thousands of `.event-item` rows and times how long each
+installed backend of `ingestion.html_backends` takes to extract them.
+
+Usage:
+    python -m benchmarks.bench_html_parsers [--rows 5000] [--repeat 5]
+"""
+from __future__ import annotations
+
+import argparse
+import time
+
+from ingestion.html_ingestor import HtmlIngestor
+from ingestion.html_backends import available_backends
+
+ROW = """  <div class="event-item">
+    <div class="event-title">Deepstack #{i}</div>
+    <div class="event-date">{day:02d}/10/2025 20:00</div>
+    <div class="event-venue">Casino {i}</div>
+    <div class="event-buyin">{buy_in} €</div>
+  </div>
+"""
+
+
+def make_page(rows: int) -> bytes:
+    body = "".join(
+        ROW.format(i=i, day=i % 28 + 1, buy_in=50 + i % 10 * 50) for i in range(rows)
+    )
+    return f'<!DOCTYPE html><html><head><meta charset="UTF-8"></head><body>\n{body}</body></html>'.encode(
+        "utf-8"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    page = make_page(args.rows)
+    print(f"page: {args.rows} rows, {len(page) / 1024:.0f} KiB")
+    for backend in available_backends():
+        ingestor = HtmlIngestor("https://bench.local/", "bench", parser=backend)
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            count = sum(1 for _ in ingestor.extract(page))
+            best = min(best, time.perf_counter() - start)
+        assert count == args.rows
+        print(f"{backend:>12}: {best * 1000:8.1f} ms  ({args.rows / best:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
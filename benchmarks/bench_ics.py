@@ -0,0 +1,73 @@
+"""
+Benchmark the ICS ingestor engines on a generated calendar.
+
+Compares the streaming parser (``engine="stream"``) with the historical
+`ics`-library implementation (``engine="ics"``, skipped when `ics` is not
+installed). One event in ten is a weekly recurrence, which only the streaming
+engine expands.
+
+Usage:
+    python -m benchmarks.bench_ics [--events 20000]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from ingestion.ics_ingestor import Calendar, IcsIngestor
+
+
+def write_calendar(path: str, count: int) -> None:
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write("BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//bench//FR\r\n")
+        for i in range(count):
+            day = i % 28 + 1
+            f.write("BEGIN:VEVENT\r\n")
+            f.write(f"UID:{i}@bench\r\n")
+            f.write(f"SUMMARY:Deepstack #{i}\r\n")
+            f.write(
+                "DESCRIPTION:Structure 30 minutes\\, re-entry illimitée\\nBuy-in 100 €\r\n"
+            )
+            f.write(f"DTSTART;TZID=Europe/Paris:202611{day:02d}T200000\r\n")
+            f.write(f"DTEND;TZID=Europe/Paris:202611{day:02d}T235900\r\n")
+            if i % 10 == 0:
+                f.write("RRULE:FREQ=WEEKLY;COUNT=12\r\n")
+            f.write("END:VEVENT\r\n")
+        f.write("END:VCALENDAR\r\n")
+
+
+def timed(label: str, ingestor: IcsIngestor) -> None:
+    start = time.perf_counter()
+    count = sum(1 for _ in ingestor.parse())
+    elapsed = time.perf_counter() - start
+    # Memory is measured on a second pass: tracemalloc skews timings.
+    tracemalloc.start()
+    sum(1 for _ in ingestor.parse())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{label:>8}: {elapsed * 1000:8.1f} ms  {count:7d} events  peak {peak / 2**20:6.1f} MiB"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=20_000)
+    parser.add_argument("--horizon-days", type=int, default=365)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.ics")
+        write_calendar(path, args.events)
+        timed("stream", IcsIngestor(path, "bench", horizon_days=args.horizon_days))
+        if Calendar is None:
+            print("     ics: skipped (ics library not installed)")
+        else:
+            timed("ics", IcsIngestor(path, "bench", engine="ics"))
+
+
+if __name__ == "__main__":
+    main()
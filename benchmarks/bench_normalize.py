@@ -0,0 +1,84 @@
+"""
+Benchmark inline versus multi-process normalisation of raw events.
+
+Normalises ``--events`` synthetic raw events (mixed date formats, buy-ins and
+variants) with `iter_normalized` on the calling process, then with
+`parallel.map_chunks` for each worker count of ``--workers``. No database is
+involved: this measures the normalisation stage alone, in events per second.
+
+Usage:
+    python -m benchmarks.bench_normalize [--events 200000] [--workers 2 4] [--chunk-size 2000]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import time
+from typing import Dict, Iterable, List
+
+from normalize.normalizer import iter_normalized, normalize_chunk
+from normalize.parallel import CHUNK_SIZE, map_chunks
+
+VARIANTS = ["No Limit Hold'em", "PLO", "Mixed games", "Hold'em KO"]
+
+
+def make_raw_events(count: int) -> List[Dict]:
+    events = []
+    for i in range(count):
+        day, hour = i % 28 + 1, 18 + i % 4
+        if i % 3 == 0:
+            start = f"2025-10-{day:02d}T{hour}:00:00+02:00"
+        elif i % 3 == 1:
+            start = f"{day:02d}/10/2025 {hour}:30"
+        else:
+            start = f"samedi {day} octobre 2025 à {hour}h"
+        events.append(
+            {
+                "source_name": f"source-{i % 12}",
+                "source_url": f"https://example.org/{i}",
+                "title": f"Tournoi #{i}",
+                "description": "Structure 20 minutes",
+                "start": start,
+                "end": None,
+                "buy_in": f"{50 + i % 10 * 25} €",
+                "variant": VARIANTS[i % len(VARIANTS)],
+                "venue_name": f"Casino {i % 300}",
+                "address": None,
+                "city": "Lyon",
+                "source_hash": f"{i:032x}",
+            }
+        )
+    return events
+
+
+def timed(label: str, events: Iterable[Dict], total: int) -> None:
+    start = time.perf_counter()
+    count = sum(1 for _ in events)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{label:>12}: {elapsed:7.2f} s  {total / elapsed:>10,.0f} events/s  ({count} normalised)"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=200_000)
+    parser.add_argument(
+        "--workers", type=int, nargs="+", default=[2, os.cpu_count() or 1]
+    )
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    raws = make_raw_events(args.events)
+    print(f"{os.cpu_count()} CPUs")
+    timed("inline", iter_normalized(raws), len(raws))
+    for workers in sorted(set(args.workers)):
+        timed(
+            f"{workers} workers",
+            map_chunks(normalize_chunk, raws, workers, args.chunk_size),
+            len(raws),
+        )
+
+
+if __name__ == "__main__":
+    main()
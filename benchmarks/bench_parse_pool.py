@@ -0,0 +1,72 @@
+"""
+Benchmark parsing HTML pages on I/O threads versus in the parse pool.
+
+Simulates the parse stage of a run with many already downloaded pages:
+worker threads either extract the events themselves (serialised by the GIL)
+or hand the bytes to `ingestion.parse_pool.ParsePool`.
+
+Usage:
+    python -m benchmarks.bench_parse_pool [--pages 16] [--rows 2000] [--threads 4] [--workers N]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.bench_html_parsers import make_page
+from ingestion.parse_pool import ParsePool
+from ingestion.runner import extract_events
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=16)
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--parser", default="html.parser")
+    args = parser.parse_args()
+
+    page = make_page(args.rows)
+    source = {
+        "name": "bench",
+        "type": "html",
+        "url": "https://bench.local/",
+        "parser": args.parser,
+    }
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as threads:
+        counts = list(
+            threads.map(lambda _: len(extract_events(source, page)), range(args.pages))
+        )
+    threaded = time.perf_counter() - start
+    assert counts == [args.rows] * args.pages
+
+    with ParsePool(workers=args.workers) as pool:
+        pool.run(
+            extract_events, source, make_page(1)
+        )  # start the workers outside the timing
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.threads) as threads:
+            results = list(
+                threads.map(
+                    lambda _: pool.run(extract_events, source, page), range(args.pages)
+                )
+            )
+        pooled = time.perf_counter() - start
+    assert [len(events) for events, _, _ in results] == [args.rows] * args.pages
+
+    print(
+        f"{args.pages} pages x {args.rows} rows, {args.threads} I/O threads, parser {args.parser}"
+    )
+    print(f"  parse on I/O threads: {threaded:7.2f} s")
+    print(
+        f"  parse pool ({args.workers} proc): {pooled:7.2f} s  (waited {sum(r[1] for r in results):.2f} s in total)"
+    )
+
+
+if __name__ == "__main__":
+    main()
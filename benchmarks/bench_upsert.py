@@ -0,0 +1,105 @@
+"""
+Benchmark per-row upserts against the bulk COPY + set-based merge writer.
+
+Per-row upserts are timed with a venue lookup query per event and with the
+preloaded `VenueResolver`; the bulk writer shares the resolver too.
+
+Needs a Postgres database with the project schema (``DATABASE_URL``). Each
+run happens in a transaction that is rolled back, so the database is left
+untouched.
+
+Usage:
+    DATABASE_URL=postgresql://... python -m benchmarks.bench_upsert [--events 20000] [--venues 200] [--batch-size 5000]
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from datetime import datetime, timedelta, timezone
+
+from normalize.bulk import BulkWriter
+from normalize.normalizer import get_engine, upsert_tournament, upsert_venue
+from normalize.venues import VenueResolver
+
+
+def make_rows(count: int, venues: int):
+    start = datetime(2030, 1, 1, 19, tzinfo=timezone.utc)
+    for i in range(count):
+        venue = {
+            "name": f"Bench Casino {i % venues}",
+            "address": f"{i % venues} rue du Bench",
+            "city": "Lyon",
+            "department": "Rhône",
+            "region": "Auvergne-Rhône-Alpes",
+            "lat": 45.76,
+            "lon": 4.83,
+        }
+        event = {
+            "title": f"Bench Deepstack #{i}",
+            "description": "Structure 30 minutes",
+            "start": start + timedelta(hours=i),
+            "end": None,
+            "buy_in_cents": 10000,
+            "variant": "Holdem",
+            "source_url": f"https://bench.example/{i}",
+            "source_hash": f"bench-{i}",
+        }
+        yield venue, event
+
+
+def per_row(conn, rows) -> None:
+    for venue, event in rows:
+        upsert_tournament(conn, upsert_venue(conn, **venue), event)
+
+
+def per_row_resolver(conn, rows) -> None:
+    resolver = VenueResolver(conn)
+    for venue, event in rows:
+        upsert_tournament(conn, resolver.resolve(venue), event)
+
+
+def bulk(conn, rows, batch_size: int) -> None:
+    writer = BulkWriter(conn, batch_size, resolver=VenueResolver(conn))
+    for venue, event in rows:
+        writer.add(venue, event)
+    writer.close()
+
+
+def timed(label: str, engine, fn, count: int) -> None:
+    with engine.connect() as conn:
+        trans = conn.begin()
+        start = time.perf_counter()
+        try:
+            fn(conn)
+            elapsed = time.perf_counter() - start
+        finally:
+            trans.rollback()
+    print(f"{label:>22}: {elapsed:8.2f} s  ({count / elapsed:,.0f} events/s)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=20_000)
+    parser.add_argument("--venues", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    engine = get_engine()
+    rows = list(make_rows(args.events, args.venues))
+    timed("per-row upserts", engine, lambda conn: per_row(conn, rows), len(rows))
+    timed(
+        "per-row + resolver",
+        engine,
+        lambda conn: per_row_resolver(conn, rows),
+        len(rows),
+    )
+    timed(
+        f"bulk (batch {args.batch_size})",
+        engine,
+        lambda conn: bulk(conn, rows, args.batch_size),
+        len(rows),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Benchmark venue lookups by the in-memory matcher.
+
+Loads ``--venues`` synthetic venues (spread over a hundred cities, with
+coordinates) into a `VenueResolver` through a fake connection, then times
+``--lookups`` lookups of each kind: exact name and city, folded spelling,
+reworded name (token match), name with an extra word (fuzzy match)
+and an unnamed venue at a known venue's coordinates (location match). No
+database is involved. Lookups repeat every ``--venues``, as events of one
+venue do, so repeated spellings are answered from the aliases found the
+first time.
+
+Usage:
+    python -m benchmarks.bench_venues [--venues 5000] [--lookups 20000]
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from types import SimpleNamespace
+from typing import Callable, Dict, List
+
+from normalize.venues import VenueResolver
+
+NAMES = [
+    "Barrière",
+    "Partouche",
+    "Joa",
+    "Tranchant",
+    "Pasino",
+    "Vikings",
+    "Emeraude",
+    "Grand Cercle",
+    "Lucien",
+    "Royal",
+]
+
+
+class FakeConn:
+    def __init__(self, rows: List[SimpleNamespace]) -> None:
+        self.rows = rows
+
+    def execute(self, statement, params=None):
+        return self.rows if str(statement).startswith("SELECT id, name, city") else []
+
+
+def make_venues(count: int) -> List[SimpleNamespace]:
+    rng = random.Random(0)
+    return [
+        SimpleNamespace(
+            id=i,
+            name=f"Casino {NAMES[i % len(NAMES)]} {i // len(NAMES)}",
+            city=f"Ville {i % 100}",
+            address=None,
+            postcode=None,
+            latitude=42.0 + rng.random() * 8,
+            longitude=-4.0 + rng.random() * 12,
+        )
+        for i in range(count)
+    ]
+
+
+def timed(
+    label: str,
+    resolver: VenueResolver,
+    lookups: List[Dict],
+    expected: Callable[[int], int],
+) -> None:
+    start = time.perf_counter()
+    found = [resolver.match(venue) for venue in lookups]
+    elapsed = time.perf_counter() - start
+    correct = sum(1 for i, venue_id in enumerate(found) if venue_id == expected(i))
+    print(
+        f"{label:>10}: {elapsed / len(lookups) * 1e6:7.1f} µs/lookup  {correct}/{len(lookups)} resolved"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--venues", type=int, default=5000)
+    parser.add_argument("--lookups", type=int, default=20000)
+    args = parser.parse_args()
+
+    rows = make_venues(args.venues)
+    start = time.perf_counter()
+    resolver = VenueResolver(FakeConn(rows))
+    print(f"loaded {len(rows)} venues in {time.perf_counter() - start:.2f} s")
+    ids = [i % len(rows) for i in range(args.lookups)]
+    v = lambda i: rows[ids[i]]  # noqa: E731
+    n = range(args.lookups)
+    timed(
+        "exact",
+        resolver,
+        [{"name": v(i).name, "city": v(i).city} for i in n],
+        lambda i: ids[i],
+    )
+    timed(
+        "folded",
+        resolver,
+        [{"name": v(i).name.upper(), "city": v(i).city.lower()} for i in n],
+        lambda i: ids[i],
+    )
+    timed(
+        "tokens",
+        resolver,
+        [
+            {
+                "name": v(i).name.replace("Casino ", "") + " " + v(i).city,
+                "city": v(i).city,
+            }
+            for i in n
+        ],
+        lambda i: ids[i],
+    )
+    timed(
+        "fuzzy",
+        resolver,
+        [{"name": v(i).name + " Poker Room", "city": v(i).city} for i in n],
+        lambda i: ids[i],
+    )
+    timed(
+        "location",
+        resolver,
+        [
+            {
+                "name": "Unknown Venue",
+                "city": None,
+                "lat": v(i).latitude,
+                "lon": v(i).longitude,
+            }
+            for i in n
+        ],
+        lambda i: ids[i],
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""
+Shared HTTP fetcher used by every ingestor.
+
+All sources go through a single `requests.Session` so that TCP/TLS
+connections are kept alive and pooled per host across sources and runs of
+the same process. Transient failures (connection errors, timeouts, 429 and
+5xx answers) are retried with exponential backoff and full jitter, honouring
+`Retry-After` when the server sends one. Bodies are transparently decoded
+(gzip/deflate, and brotli when the `brotli` package is installed) and capped
+at `INGEST_HTTP_MAX_BYTES` so a misbehaving server cannot exhaust memory.
+
+Each fetch returns a `FetchResult` carrying the latency, the decoded body
+size and the number of bytes read from the wire, which ingestors add to their
+per-source stats.
+"""
+from __future__ import annotations
+
+import codecs
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from email.message import Message
+from typing import BinaryIO, Dict, Iterator, Mapping, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .http_cache import HttpCache, NotModified
+
+try:
+    import brotli  # type: ignore  # noqa: F401
+except ImportError:
+    brotli = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = os.environ.get("INGEST_USER_AGENT", "poker-fr-tournaments/1.0")
+TIMEOUT_SECONDS = float(os.environ.get("INGEST_HTTP_TIMEOUT_SECONDS", "30"))
+MAX_RETRIES = int(os.environ.get("INGEST_HTTP_RETRIES", "3"))
+BACKOFF_SECONDS = float(os.environ.get("INGEST_HTTP_BACKOFF_SECONDS", "0.5"))
+BACKOFF_MAX_SECONDS = 30.0
+MAX_RESPONSE_BYTES = int(os.environ.get("INGEST_HTTP_MAX_BYTES", str(20 * 1024 * 1024)))
+POOL_MAXSIZE = int(os.environ.get("INGEST_HTTP_POOL_SIZE", "4"))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+CHUNK_SIZE = 64 * 1024
+
+
+class ResponseTooLarge(Exception):
+    """Raised when a response body exceeds the configured size cap."""
+
+
+@dataclass
+class FetchResult:
+    url: str
+    status: int
+    content: bytes
+    headers: Mapping[str, str]
+    latency: float
+    wire_bytes: int
+    attempts: int
+    encoding: Optional[str] = None
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+    @property
+    def not_modified(self) -> bool:
+        return self.status == 304
+
+
+class Fetcher:
+    """Pooled, retrying HTTP client shared by the ingestors."""
+
+    def __init__(
+        self,
+        timeout: float = TIMEOUT_SECONDS,
+        max_retries: int = MAX_RETRIES,
+        backoff: float = BACKOFF_SECONDS,
+        max_bytes: int = MAX_RESPONSE_BYTES,
+        pool_maxsize: int = POOL_MAXSIZE,
+    ) -> None:
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_bytes = max_bytes
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=16, pool_maxsize=pool_maxsize, max_retries=0
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update(
+            {
+                "User-Agent": USER_AGENT,
+                "Accept-Encoding": "gzip, deflate, br"
+                if brotli is not None
+                else "gzip, deflate",
+            }
+        )
+
+    def _delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after and retry_after.isdigit():
+            return min(BACKOFF_MAX_SECONDS, float(retry_after))
+        return random.uniform(0, min(BACKOFF_MAX_SECONDS, self.backoff * 2**attempt))
+
+    def _read(self, response: requests.Response) -> bytes:
+        length = response.headers.get("Content-Length")
+        if length and length.isdigit() and int(length) > self.max_bytes:
+            raise ResponseTooLarge(
+                f"{response.url}: {length} bytes exceeds {self.max_bytes}"
+            )
+        chunks = []
+        size = 0
+        for chunk in response.iter_content(CHUNK_SIZE):
+            size += len(chunk)
+            if size > self.max_bytes:
+                raise ResponseTooLarge(
+                    f"{response.url}: body exceeds {self.max_bytes} bytes"
+                )
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    def _open(
+        self, url: str, headers: Optional[Dict[str, str]]
+    ) -> Tuple[requests.Response, int]:
+        """Send the request with retries and return the open streaming response."""
+        attempt = 0
+        while True:
+            try:
+                response = self.session.get(
+                    url, headers=headers, timeout=self.timeout, stream=True
+                )
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._delay(attempt)
+                logger.warning("GET %s failed (%s), retrying in %.1fs", url, exc, delay)
+            else:
+                if (
+                    response.status_code in RETRY_STATUSES
+                    and attempt < self.max_retries
+                ):
+                    delay = self._delay(attempt, response.headers.get("Retry-After"))
+                    logger.warning(
+                        "GET %s returned %d, retrying in %.1fs",
+                        url,
+                        response.status_code,
+                        delay,
+                    )
+                    response.close()
+                else:
+                    try:
+                        response.raise_for_status()
+                    except requests.HTTPError:
+                        response.close()
+                        raise
+                    return response, attempt + 1
+            time.sleep(delay)
+            attempt += 1
+
+    def get(self, url: str, headers: Optional[Dict[str, str]] = None) -> FetchResult:
+        """GET ``url`` with retries; 304 answers are returned, other errors raised."""
+        start = time.perf_counter()
+        response, attempts = self._open(url, headers)
+        with response:
+            content = self._read(response)
+            wire_bytes = (
+                response.raw.tell() if hasattr(response.raw, "tell") else len(content)
+            )
+        result = FetchResult(
+            url=url,
+            status=response.status_code,
+            content=content,
+            headers=response.headers,
+            latency=time.perf_counter() - start,
+            wire_bytes=wire_bytes,
+            attempts=attempts,
+            encoding=response.encoding,
+        )
+        logger.debug("GET %s: %d bytes in %.2fs", url, len(content), result.latency)
+        return result
+
+    @contextmanager
+    def open_stream(
+        self, url: str, headers: Optional[Dict[str, str]] = None
+    ) -> Iterator["FetchStream"]:
+        """Open ``url`` for incremental reading, for files too large to buffer.
+
+        The body is exposed as a binary file object with the transfer encoding
+        (gzip/deflate/br) already decoded; it is not subject to the size cap.
+        """
+        start = time.perf_counter()
+        response, attempts = self._open(url, headers)
+        try:
+            response.raw.decode_content = True
+            yield FetchStream(
+                url,
+                response.raw,
+                response.headers,
+                time.perf_counter() - start,
+                attempts,
+            )
+        finally:
+            response.close()
+
+
+@dataclass
+class FetchStream:
+    url: str
+    raw: BinaryIO
+    headers: Mapping[str, str]
+    latency: float
+    attempts: int
+
+    @property
+    def wire_bytes(self) -> int:
+        return self.raw.tell() if hasattr(self.raw, "tell") else 0
+
+
+_default_fetcher: Optional[Fetcher] = None
+_default_lock = threading.Lock()
+
+
+def get_fetcher() -> Fetcher:
+    """Return the process-wide fetcher shared by all ingestors."""
+    global _default_fetcher
+    with _default_lock:
+        if _default_fetcher is None:
+            _default_fetcher = Fetcher()
+        return _default_fetcher
+
+
+def record_fetch(stats: Dict, result: FetchResult) -> None:
+    """Accumulate the latency and size of ``result`` into ingestor ``stats``."""
+    stats["fetches"] = stats.get("fetches", 0) + 1
+    stats["fetch_seconds"] = stats.get("fetch_seconds", 0.0) + result.latency
+    stats["bytes"] = stats.get("bytes", 0) + len(result.content)
+    stats["wire_bytes"] = stats.get("wire_bytes", 0) + result.wire_bytes
+
+
+def declared_charset(headers: Mapping[str, str]) -> Optional[str]:
+    """Return the charset declared by the Content-Type header, if a known one."""
+    message = Message()
+    message["Content-Type"] = headers.get("Content-Type") or ""
+    charset = message.get_content_charset()
+    if charset is None:
+        return None
+    try:
+        return codecs.lookup(charset).name
+    except LookupError:
+        return None
+
+
+def fetch_conditional(
+    fetcher: Fetcher, url: str, cache: Optional[HttpCache], stats: Dict
+) -> Tuple[bytes, Optional[str]]:
+    """Fetch ``url`` through ``cache`` and return the body to parse and its charset.
+
+    Validators from the cache are sent with the request. On a 304,
+    NotModified is raised when the previously extracted events can be
+    replayed, otherwise the cached body is returned. The charset is the one
+    declared by the response (see `declared_charset`), or None. Cache
+    hits/misses and fetch metrics are accumulated into ``stats``.
+    """
+    if cache is None:
+        result = fetcher.get(url)
+        record_fetch(stats, result)
+        return result.content, declared_charset(result.headers)
+    result = fetcher.get(url, headers=cache.validators(url))
+    record_fetch(stats, result)
+    if result.not_modified:
+        stats["cache_hits"] = stats.get("cache_hits", 0) + 1
+        if cache.has_events(url):
+            raise NotModified(url)
+        body = cache.load_body(url)
+        if body is not None:
+            return body, cache.charset(url)
+        result = fetcher.get(url)
+        record_fetch(stats, result)
+    stats["cache_misses"] = stats.get("cache_misses", 0) + 1
+    charset = declared_charset(result.headers)
+    cache.store_response(
+        url,
+        result.headers.get("ETag"),
+        result.headers.get("Last-Modified"),
+        result.content,
+        charset,
+    )
+    return result.content, charset
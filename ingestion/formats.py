@@ -0,0 +1,325 @@
+"""
+Intermediate file formats between ingestion and normalisation.
+
+Raw events travel from the ingestors to the normaliser through files (part
+files, the assembled ``raw_events`` file, delta files and cached events).
+JSON Lines is easy to inspect but its text round-trip dominates both I/O and
+CPU on large runs, so the format is pluggable (`INGEST_FORMAT`):
+
+* ``jsonl``: one JSON object per line. The default, since operators and
+  downstream consumers read ``raw_events.jsonl``.
+* ``msgpack``: chunks of msgpack-encoded events, each compressed with zstd
+  and prefixed with its length, after a small magic header. Needs the
+  optional `msgpack` and `zstandard` packages.
+* ``arrow``: an Arrow IPC file of string record batches (zstd-compressed
+  buffers when available). Needs the optional `pyarrow` package. Keys that
+  are not raw event fields, or whose value is not a string, are kept in a
+  JSON ``extra`` column; absent fields read back as None.
+* ``auto``: the fastest format installed (arrow, msgpack, then jsonl).
+
+The binary formats are opt-in.
+
+Readers never need to be told the format: `read_events` sniffs it from the
+magic bytes at the start of the file, so the normaliser reads whatever the
+ingestion side wrote. Binary files are read through a memory map.
+"""
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import shutil
+import struct
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Type, Union
+
+from .fingerprint import EVENT_FIELDS
+
+try:
+    import msgpack  # type: ignore
+    import zstandard  # type: ignore
+except ImportError:
+    msgpack = None  # type: ignore
+    zstandard = None  # type: ignore
+
+try:
+    import pyarrow as pa  # type: ignore
+except ImportError:
+    pa = None  # type: ignore
+
+FORMAT = os.environ.get("INGEST_FORMAT", "jsonl")
+CHUNK_EVENTS = 4096
+WRITE_BUFFER_BYTES = 1024 * 1024
+ZSTD_LEVEL = 3
+
+MSGPACK_MAGIC = b"PFTMSGZ1"
+ARROW_MAGIC = b"ARROW1"
+_FRAME = struct.Struct("<I")
+
+EXTENSIONS = {"jsonl": ".jsonl", "msgpack": ".msgpack", "arrow": ".arrow"}
+AUTO_ORDER = ("arrow", "msgpack", "jsonl")
+ARROW_COLUMNS = EVENT_FIELDS + ("source_id", "source_hash", "change", "extra")
+
+
+def available_formats() -> List[str]:
+    available = {"jsonl": True, "msgpack": msgpack is not None, "arrow": pa is not None}
+    return [name for name in EXTENSIONS if available[name]]
+
+
+def resolve_format(name: Optional[str]) -> str:
+    """Return the format to write for ``name`` (None is jsonl, ``auto`` the fastest)."""
+    if not name:
+        return "jsonl"
+    if name == "auto":
+        return next(n for n in AUTO_ORDER if n in available_formats())
+    if name not in EXTENSIONS:
+        raise ValueError(
+            f"Unknown intermediate format {name!r}; choose from {sorted(EXTENSIONS)}"
+        )
+    if name not in available_formats():
+        raise RuntimeError(f"Intermediate format {name!r} is not installed")
+    return name
+
+
+def filename(stem: str, fmt: str) -> str:
+    """Return the file name of ``stem`` written in ``fmt`` (e.g. raw_events.arrow)."""
+    return stem + EXTENSIONS[fmt]
+
+
+def find_latest(directory: Path, stem: str) -> Path:
+    """Return the most recently written ``stem`` file in ``directory``, in any format."""
+    candidates = [directory / filename(stem, fmt) for fmt in EXTENSIONS]
+    existing = [p for p in candidates if p.exists()]
+    if not existing:
+        return candidates[0]
+    return max(existing, key=lambda p: p.stat().st_mtime)
+
+
+def sniff_format(path: Path) -> str:
+    """Return the format ``path`` was written in, from its magic bytes."""
+    with open(path, "rb") as f:
+        head = f.read(len(MSGPACK_MAGIC))
+    if head == MSGPACK_MAGIC:
+        return "msgpack"
+    if head.startswith(ARROW_MAGIC):
+        return "arrow"
+    return "jsonl"
+
+
+class JsonlWriter:
+    def __init__(self, path: Path) -> None:
+        self._file = open(path, "w", encoding="utf-8", buffering=WRITE_BUFFER_BYTES)
+
+    def write(self, event: Dict) -> None:
+        self._file.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class MsgpackWriter:
+    """Writes length-prefixed zstd frames of ``CHUNK_EVENTS`` msgpack events."""
+
+    def __init__(self, path: Path) -> None:
+        self._file = open(path, "wb", buffering=WRITE_BUFFER_BYTES)
+        self._file.write(MSGPACK_MAGIC)
+        self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+        self._buffer: List[Dict] = []
+
+    def write(self, event: Dict) -> None:
+        self._buffer.append(event)
+        if len(self._buffer) >= CHUNK_EVENTS:
+            self._flush()
+
+    def _flush(self) -> None:
+        if self._buffer:
+            frame = self._compressor.compress(
+                msgpack.packb(self._buffer, use_bin_type=True)
+            )
+            self._file.write(_FRAME.pack(len(frame)))
+            self._file.write(frame)
+            self._buffer = []
+
+    def close(self) -> None:
+        try:
+            self._flush()
+        finally:
+            self._file.close()
+
+
+def _arrow_schema():
+    return pa.schema([(name, pa.string()) for name in ARROW_COLUMNS])
+
+
+def _arrow_options():
+    codec = "zstd" if pa.Codec.is_available("zstd") else None
+    return pa.ipc.IpcWriteOptions(compression=codec)
+
+
+class ArrowWriter:
+    """Writes events as string record batches of ``CHUNK_EVENTS`` rows."""
+
+    def __init__(self, path: Path) -> None:
+        self._schema = _arrow_schema()
+        self._sink = pa.OSFile(str(path), "wb")
+        self._writer = pa.ipc.new_file(
+            self._sink, self._schema, options=_arrow_options()
+        )
+        self._columns: Dict[str, List[Optional[str]]] = {
+            name: [] for name in ARROW_COLUMNS
+        }
+        self._rows = 0
+
+    def write(self, event: Dict) -> None:
+        extra = None
+        for key, value in event.items():
+            column = self._columns.get(key)
+            if (
+                column is not None
+                and key != "extra"
+                and (value is None or value.__class__ is str)
+            ):
+                continue
+            if extra is None:
+                extra = {}
+            extra[key] = value
+        for name, column in self._columns.items():
+            value = event.get(name)
+            column.append(None if extra is not None and name in extra else value)
+        self._columns["extra"][-1] = (
+            json.dumps(extra, ensure_ascii=False) if extra else None
+        )
+        self._rows += 1
+        if self._rows >= CHUNK_EVENTS:
+            self._flush()
+
+    def _flush(self) -> None:
+        if self._rows:
+            arrays = [
+                pa.array(self._columns[name], pa.string()) for name in ARROW_COLUMNS
+            ]
+            self._writer.write_batch(pa.record_batch(arrays, schema=self._schema))
+            self._columns = {name: [] for name in ARROW_COLUMNS}
+            self._rows = 0
+
+    def close(self) -> None:
+        try:
+            self._flush()
+            self._writer.close()
+        finally:
+            self._sink.close()
+
+
+EventWriter = Union[JsonlWriter, MsgpackWriter, ArrowWriter]
+WRITERS: Dict[str, Type[EventWriter]] = {
+    "jsonl": JsonlWriter,
+    "msgpack": MsgpackWriter,
+    "arrow": ArrowWriter,
+}
+
+
+@contextmanager
+def open_writer(path: Path, fmt: str) -> Iterator[EventWriter]:
+    """Open an event writer on ``path``; events are flushed when it exits."""
+    writer = WRITERS[fmt](path)
+    try:
+        yield writer
+    finally:
+        writer.close()
+
+
+def _read_jsonl(path: Path) -> Iterator[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def _read_msgpack(path: Path) -> Iterator[Dict]:
+    decompressor = zstandard.ZstdDecompressor()
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size <= len(MSGPACK_MAGIC):
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                offset = len(MSGPACK_MAGIC)
+                while offset < size:
+                    (length,) = _FRAME.unpack_from(view, offset)
+                    offset += _FRAME.size
+                    chunk = decompressor.decompress(view[offset : offset + length])
+                    offset += length
+                    yield from msgpack.unpackb(chunk, raw=False)
+            finally:
+                view.release()
+
+
+def _read_arrow(path: Path) -> Iterator[Dict]:
+    with pa.memory_map(str(path), "r") as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            for event in reader.get_batch(i).to_pylist():
+                extra = event.pop("extra")
+                if event["change"] is None:
+                    del event["change"]
+                if extra is not None:
+                    event.update(json.loads(extra))
+                yield event
+
+
+READERS = {"jsonl": _read_jsonl, "msgpack": _read_msgpack, "arrow": _read_arrow}
+
+
+def read_events(path) -> Iterator[Dict]:
+    """Yield the events of ``path``, whatever format it was written in."""
+    path = Path(path)
+    fmt = sniff_format(path)
+    if fmt == "msgpack" and msgpack is None:
+        raise RuntimeError(
+            f"{path} is msgpack-encoded but msgpack/zstandard are not installed"
+        )
+    if fmt == "arrow" and pa is None:
+        raise RuntimeError(f"{path} is an Arrow file but pyarrow is not installed")
+    return READERS[fmt](path)
+
+
+def concat(paths: List[Path], output: Path, fmt: str) -> None:
+    """Write the events of ``paths`` to ``output`` in ``fmt``.
+
+    Parts already in ``fmt`` are copied without decoding their events: JSONL
+    bytes and msgpack frames as-is, Arrow batches straight from a memory map.
+    Parts in another format (written before the format was changed) are
+    re-encoded first.
+    """
+    with ExitStack() as stack:
+        if fmt == "arrow":
+            sink = stack.enter_context(pa.OSFile(str(output), "wb"))
+            arrow_out = stack.enter_context(
+                pa.ipc.new_file(sink, _arrow_schema(), options=_arrow_options())
+            )
+        else:
+            out = stack.enter_context(open(output, "wb"))
+            header = MSGPACK_MAGIC if fmt == "msgpack" else b""
+            out.write(header)
+        for path in paths:
+            converted = None
+            if sniff_format(path) != fmt:
+                converted = path.with_name(path.name + ".convert")
+                with open_writer(converted, fmt) as writer:
+                    for event in read_events(path):
+                        writer.write(event)
+                path = converted
+            try:
+                if fmt == "arrow":
+                    with pa.memory_map(str(path), "r") as source:
+                        reader = pa.ipc.open_file(source)
+                        for i in range(reader.num_record_batches):
+                            arrow_out.write_batch(reader.get_batch(i))
+                else:
+                    with open(path, "rb") as f:
+                        f.seek(len(header))
+                        shutil.copyfileobj(f, out, WRITE_BUFFER_BYTES)
+            finally:
+                if converted is not None:
+                    converted.unlink(missing_ok=True)
@@ -0,0 +1,165 @@
+"""
+Pluggable HTML parser backends for the HTML ingestor.
+
+A backend turns a page into one dict of field texts per event item, given a
+set of CSS selectors. Three backends are available:
+
+* ``html.parser``: BeautifulSoup with the pure-Python parser and soupsieve.
+  Always available, but slow on large pages.
+* ``lxml``: libxml2 via `lxml.html`, with selectors translated to XPath once
+  by `cssselect` under HTML rules (case-insensitive element and attribute
+  names), as the other two backends match them.
+* ``selectolax``: the Lexbor engine via `selectolax`, usually the fastest.
+
+`lxml`/`cssselect` and `selectolax` are optional dependencies; ``auto`` picks
+the fastest backend installed. Selectors are compiled once per process and
+backend (see `compile_selectors`), and every backend collapses whitespace the
+same way so a source yields identical events whichever backend parses it.
+
+Pages are given as bytes, with the charset declared by the HTTP response if
+any. Without one, the charset is taken from the page itself or detected by
+BeautifulSoup's `UnicodeDammit`; lxml and selectolax are given the page
+decoded the same way (libxml2 would otherwise assume Latin-1).
+"""
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+try:
+    import lxml.html  # type: ignore
+    from lxml.cssselect import CSSSelector  # type: ignore
+except ImportError:
+    lxml = None  # type: ignore
+    CSSSelector = None  # type: ignore
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None  # type: ignore
+
+import soupsieve
+from bs4 import BeautifulSoup, UnicodeDammit
+
+# Field name -> CSS selector; "item" selects the element wrapping one event.
+DEFAULT_SELECTORS: Dict[str, str] = {
+    "item": ".event-item",
+    "title": ".event-title",
+    "date": ".event-date",
+    "venue": ".event-venue",
+    "buy_in": ".event-buyin",
+}
+
+
+def _clean(text: str) -> str:
+    return " ".join(text.split())
+
+
+class CompiledSelectors:
+    """Item and field selectors compiled for one backend."""
+
+    def __init__(self, item: Any, fields: Dict[str, Any]) -> None:
+        self.item = item
+        self.fields = fields
+
+
+def _decode(content: bytes, encoding: Optional[str]) -> str:
+    """Decode ``content`` as declared, or as BeautifulSoup detects it."""
+    if encoding is not None:
+        return content.decode(encoding, errors="replace")
+    markup = UnicodeDammit(content, is_html=True).unicode_markup
+    return markup if markup is not None else content.decode("utf-8", errors="replace")
+
+
+def _extract_bs4(
+    content: bytes, compiled: CompiledSelectors, encoding: Optional[str]
+) -> Iterator[Dict[str, Optional[str]]]:
+    soup = BeautifulSoup(content, "html.parser", from_encoding=encoding)
+    for item in compiled.item.select(soup):
+        row: Dict[str, Optional[str]] = {}
+        for field, selector in compiled.fields.items():
+            el = selector.select_one(item)
+            row[field] = _clean(el.get_text()) if el is not None else None
+        yield row
+
+
+def _extract_lxml(
+    content: bytes, compiled: CompiledSelectors, encoding: Optional[str]
+) -> Iterator[Dict[str, Optional[str]]]:
+    # As UTF-8 bytes: libxml2 rejects text with an XML encoding declaration.
+    root = lxml.html.fromstring(
+        _decode(content, encoding).encode("utf-8"),
+        parser=lxml.html.HTMLParser(encoding="utf-8"),
+    )
+    for item in compiled.item(root):
+        row: Dict[str, Optional[str]] = {}
+        for field, selector in compiled.fields.items():
+            found = selector(item)
+            row[field] = _clean(found[0].text_content()) if found else None
+        yield row
+
+
+def _extract_selectolax(
+    content: bytes, compiled: CompiledSelectors, encoding: Optional[str]
+) -> Iterator[Dict[str, Optional[str]]]:
+    tree = LexborHTMLParser(_decode(content, encoding))
+    for item in tree.css(compiled.item):
+        row: Dict[str, Optional[str]] = {}
+        for field, selector in compiled.fields.items():
+            el = item.css_first(selector)
+            row[field] = _clean(el.text()) if el is not None else None
+        yield row
+
+
+# backend name -> (selector compiler, extractor, availability)
+BACKENDS: Dict[str, Tuple[Callable[[str], Any], Callable, bool]] = {
+    "html.parser": (soupsieve.compile, _extract_bs4, True),
+    "lxml": (
+        lambda sel: CSSSelector(sel, translator="html"),
+        _extract_lxml,
+        CSSSelector is not None,
+    ),
+    "selectolax": (lambda sel: sel, _extract_selectolax, LexborHTMLParser is not None),
+}
+AUTO_ORDER = ("selectolax", "lxml", "html.parser")
+
+
+def available_backends() -> Tuple[str, ...]:
+    return tuple(name for name, (_, _, ok) in BACKENDS.items() if ok)
+
+
+def resolve_backend(name: Optional[str]) -> str:
+    """Return the backend to use for ``name`` (None or ``auto`` picks the fastest)."""
+    if not name or name == "auto":
+        return next(n for n in AUTO_ORDER if BACKENDS[n][2])
+    if name not in BACKENDS:
+        raise ValueError(
+            f"Unknown HTML parser backend {name!r}; choose from {sorted(BACKENDS)}"
+        )
+    if not BACKENDS[name][2]:
+        raise RuntimeError(f"HTML parser backend {name!r} is not installed")
+    return name
+
+
+@lru_cache(maxsize=None)
+def compile_selectors(
+    backend: str, selectors: Tuple[Tuple[str, str], ...]
+) -> CompiledSelectors:
+    """Compile ``selectors`` (sorted field/selector pairs) for ``backend``, once."""
+    compile_fn = BACKENDS[backend][0]
+    fields = {field: compile_fn(sel) for field, sel in selectors if field != "item"}
+    item = compile_fn(dict(selectors)["item"])
+    return CompiledSelectors(item, fields)
+
+
+def extract(
+    content: bytes,
+    backend: str,
+    compiled: CompiledSelectors,
+    encoding: Optional[str] = None,
+) -> Iterator[Dict[str, Optional[str]]]:
+    """Yield one dict of field texts per item found in ``content``.
+
+    ``encoding`` is the charset declared by the HTTP response, if any.
+    """
+    return BACKENDS[backend][1](content, compiled, encoding)
@@ -1,72 +1,105 @@
 """
-HTML ingestor using BeautifulSoup.
+HTML ingestor driven by CSS selectors.
 
 This ingestor fetches an HTML page containing a list of poker tournaments.
 The page is expected to contain a table or list of events with fields
-identifiable via CSS selectors. For demonstration purposes, selectors are
-hard‑coded but can be customised per source in `sources/catalog.yml`.
+identifiable via CSS selectors. Selectors default to the `.event-item` /
+`.event-title` layout of the demo page and can be customised per source in
+`sources/catalog.yml` (``selectors``, ``date_format`` and ``parser`` keys).
+Pages are parsed by one of the backends of `html_backends.py`.
 """
 from __future__ import annotations
 
-import hashlib
 import logging
 from datetime import datetime
 from typing import Dict, Iterable, Optional
 
-import requests
-from bs4 import BeautifulSoup
+from . import html_backends
+from .fetcher import Fetcher, fetch_conditional, get_fetcher
+from .fingerprint import stamp
+from .http_cache import HttpCache
 
 logger = logging.getLogger(__name__)
 
 
 class HtmlIngestor:
-    def __init__(self, url: str, source_name: str) -> None:
+    def __init__(
+        self,
+        url: str,
+        source_name: str,
+        cache: Optional[HttpCache] = None,
+        fetcher: Optional[Fetcher] = None,
+        selectors: Optional[Dict[str, str]] = None,
+        parser: Optional[str] = None,
+        date_format: str = "%d/%m/%Y %H:%M",
+    ) -> None:
+        """
+        :param selectors: CSS selectors overriding ``html_backends.DEFAULT_SELECTORS``;
+            ``item`` wraps one event, other keys name raw event fields (title,
+            date, venue, buy_in, description, variant, address, city, and
+            external_id for a cell holding the site's own id of the event).
+        :param parser: parser backend name, or None/"auto" for the fastest installed.
+        :param date_format: strptime format of the text matched by the ``date`` selector.
+        """
         self.url = url
         self.source_name = source_name
+        self.cache = cache
+        self.fetcher = fetcher or get_fetcher()
+        self.backend = html_backends.resolve_backend(parser)
+        merged = dict(html_backends.DEFAULT_SELECTORS, **(selectors or {}))
+        self.selectors = html_backends.compile_selectors(self.backend, tuple(sorted(merged.items())))
+        self.date_format = date_format
+        self.stats: Dict[str, float] = {"cache_hits": 0, "cache_misses": 0}
+        # Charset declared by the last response fetched, if any.
+        self.encoding: Optional[str] = None
 
-    def fetch(self) -> str:
+    def fetch(self) -> bytes:
+        """Download the page, conditionally when a cache is configured.
+
+        Raises NotModified on a 304 when the events extracted from the cached
+        page are available for replay; otherwise the cached page is returned.
+        The raw bytes are returned, and the charset declared by the response
+        kept in ``encoding``, so that the backends decode the page alike.
+        """
         logger.info("Fetching HTML page: %s", self.url)
-        response = requests.get(self.url, timeout=30)
-        response.raise_for_status()
-        return response.text
+        body, self.encoding = fetch_conditional(self.fetcher, self.url, self.cache, self.stats)
+        return body
 
     def parse(self) -> Iterable[Dict[str, Optional[str]]]:
-        html = self.fetch()
-        soup = BeautifulSoup(html, "html.parser")
-        # Example: assume each event is in a div.event-item
-        event_items = soup.select(".event-item")
-        for item in event_items:
-            title_el = item.select_one(".event-title")
-            date_el = item.select_one(".event-date")
-            venue_el = item.select_one(".event-venue")
-            buyin_el = item.select_one(".event-buyin")
-            title = title_el.get_text(strip=True) if title_el else ""
-            date_text = date_el.get_text(strip=True) if date_el else ""
+        body = self.fetch()
+        return self.extract(body, self.encoding)
+
+    def extract(self, html: bytes, encoding: Optional[str] = None) -> Iterable[Dict[str, Optional[str]]]:
+        """Yield raw events found in an already downloaded page.
+
+        ``encoding`` is the charset declared by the response, if any.
+        """
+        for row in html_backends.extract(html, self.backend, self.selectors, encoding):
+            date_text = row.get("date")
             start_iso: Optional[str] = None
             if date_text:
                 # naive parsing; rely on normalizer to parse properly
                 try:
-                    start_iso = datetime.strptime(date_text, "%d/%m/%Y %H:%M").isoformat()
+                    start_iso = datetime.strptime(date_text, self.date_format).isoformat()
                 except Exception:
                     start_iso = None
-            venue = venue_el.get_text(strip=True) if venue_el else None
             buy_in = None
-            if buyin_el:
-                digits = ''.join(ch for ch in buyin_el.get_text() if ch.isdigit())
+            buy_in_text = row.get("buy_in")
+            if buy_in_text:
+                digits = ''.join(ch for ch in buy_in_text if ch.isdigit())
                 buy_in = digits or None
             raw_event = {
                 "source_name": self.source_name,
                 "source_url": self.url,
-                "title": title,
-                "description": None,
+                "external_id": row.get("external_id"),
+                "title": row.get("title") or "",
+                "description": row.get("description"),
                 "start": start_iso,
                 "end": None,
                 "buy_in": buy_in,
-                "variant": None,
-                "venue_name": venue,
-                "address": None,
-                "city": None,
+                "variant": row.get("variant"),
+                "venue_name": row.get("venue"),
+                "address": row.get("address"),
+                "city": row.get("city"),
             }
-            raw_event_str = str(raw_event).encode("utf-8", errors="ignore")
-            raw_event["source_hash"] = hashlib.sha1(raw_event_str).hexdigest()
-            yield raw_event
+            yield stamp(raw_event)
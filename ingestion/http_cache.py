@@ -0,0 +1,117 @@
+"""
+On-disk HTTP cache for ingestion sources.
+
+For every source URL the cache keeps the validators returned by the server
+(`ETag`, `Last-Modified`), the last response body and the raw events that were
+extracted from it. Ingestors send the validators back as conditional request
+headers; when the server answers `304 Not Modified` there is nothing new to
+parse and the previously extracted events are replayed as-is.
+
+Entries are stored as plain files named after the SHA-1 of the URL:
+``<key>.meta.json``, ``<key>.body`` and ``<key>.events`` (a copy of the
+source's part file, in whichever intermediate format it was written; see
+`formats.py`). Each file is
+written to a temporary name and atomically renamed, so a crash never leaves a
+half-written entry behind.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+from .formats import read_events
+
+CACHE_DIR = os.environ.get(
+    "INGEST_HTTP_CACHE_DIR", os.path.join(os.path.dirname(__file__), "cache", "http")
+)
+
+
+class NotModified(Exception):
+    """Raised by an ingestor when the server reports the resource unchanged."""
+
+    def __init__(self, url: str) -> None:
+        super().__init__(f"{url} not modified")
+        self.url = url
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class HttpCache:
+    """Persistent validator/body/events cache keyed by source URL."""
+
+    def __init__(self, directory: str = CACHE_DIR) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, url: str, suffix: str) -> Path:
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return self.directory / f"{key}{suffix}"
+
+    def _meta(self, url: str) -> Dict[str, Optional[str]]:
+        try:
+            with open(self._path(url, ".meta.json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def validators(self, url: str) -> Dict[str, str]:
+        """Return the conditional request headers to send for ``url``."""
+        meta = self._meta(url)
+        headers = {}
+        etag, last_modified = meta.get("etag"), meta.get("last_modified")
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        return headers
+
+    def store_response(
+        self,
+        url: str,
+        etag: Optional[str],
+        last_modified: Optional[str],
+        body: bytes,
+        charset: Optional[str] = None,
+    ) -> None:
+        """Record a fresh response; previously extracted events are discarded."""
+        self._path(url, ".events").unlink(missing_ok=True)
+        _atomic_write(self._path(url, ".body"), body)
+        meta = {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "charset": charset,
+        }
+        _atomic_write(self._path(url, ".meta.json"), json.dumps(meta).encode("utf-8"))
+
+    def load_body(self, url: str) -> Optional[bytes]:
+        try:
+            return self._path(url, ".body").read_bytes()
+        except OSError:
+            return None
+
+    def charset(self, url: str) -> Optional[str]:
+        """Return the charset the cached body of ``url`` was served with."""
+        return self._meta(url).get("charset")
+
+    def has_events(self, url: str) -> bool:
+        return self._path(url, ".events").exists()
+
+    def store_events_file(self, url: str, path: Path) -> None:
+        """Record the file of raw events extracted from ``url``."""
+        dest = self._path(url, ".events")
+        tmp = dest.with_name(dest.name + ".tmp")
+        shutil.copyfile(path, tmp)
+        os.replace(tmp, dest)
+
+    def load_events(self, url: str) -> Iterator[Dict]:
+        yield from read_events(self._path(url, ".events"))
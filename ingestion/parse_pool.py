@@ -0,0 +1,81 @@
+"""
+Process pool for the CPU-bound parsing stage of ingestion.
+
+Fetching is I/O-bound and runs on `runner`'s worker threads, but parsing
+HTML (BeautifulSoup/lxml/selectolax) and feeds (feedparser) is CPU-bound and
+the GIL would serialise it across those threads. With a `ParsePool`, HTML and
+RSS sources run as a two-stage pipeline: the I/O thread downloads the raw
+bytes, hands them to a worker process that runs the ingestor's ``extract``,
+and writes the events it gets back.
+
+The hand-off is bounded: at most ``workers + queue_size`` pages are in the
+pool at once (`INGEST_PARSE_WORKERS`, `INGEST_PARSE_QUEUE_SIZE`); further I/O
+threads block until a slot frees up, so downloaded pages never pile up in
+memory. Each call reports how long the page waited for a slot or a worker
+and how long the parse itself took.
+
+Workers are started with the ``spawn`` method: forking a process that is
+running threads (fetchers, loggers) is not safe.
+"""
+from __future__ import annotations
+
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional, Tuple
+
+PARSE_WORKERS = int(os.environ.get("INGEST_PARSE_WORKERS", str(os.cpu_count() or 1)))
+PARSE_QUEUE_SIZE = int(os.environ.get("INGEST_PARSE_QUEUE_SIZE", "4"))
+
+
+def _timed(fn: Callable, *args: Any) -> Tuple[Any, float]:
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+class ParsePool:
+    """Bounded process pool running parse functions off the I/O threads."""
+
+    def __init__(
+        self, workers: int = PARSE_WORKERS, queue_size: int = PARSE_QUEUE_SIZE
+    ) -> None:
+        self.workers = max(1, workers)
+        self._slots = threading.BoundedSemaphore(self.workers + max(0, queue_size))
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Started on first use: runs without HTML/RSS sources spawn no process.
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def run(self, fn: Callable, *args: Any) -> Tuple[Any, float, float]:
+        """Run ``fn(*args)`` in a worker process; block while the pool is full.
+
+        ``fn`` and its arguments must be picklable. Returns the result, the
+        seconds spent waiting (for a slot, then for a worker) and the seconds
+        spent in ``fn``.
+        """
+        start = time.perf_counter()
+        with self._slots:
+            result, busy = self._get_executor().submit(_timed, fn, *args).result()
+        return result, time.perf_counter() - start - busy, busy
+
+    def close(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
+
+    def __enter__(self) -> "ParsePool":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
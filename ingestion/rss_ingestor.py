@@ -7,32 +7,67 @@ a dictionary containing the raw fields expected by the normalisation pipeline.
 """
 from __future__ import annotations
 
-import hashlib
 import logging
 import re
 from datetime import datetime, timezone
 from typing import Dict, Iterable, Optional
+from urllib.parse import urlparse
 
 import feedparser
 
+from .fetcher import Fetcher, fetch_conditional, get_fetcher
+from .fingerprint import stamp
+from .http_cache import HttpCache
+
 logger = logging.getLogger(__name__)
 
 
 class RssIngestor:
     """Parses an RSS/Atom feed and yields raw event dictionaries."""
 
-    def __init__(self, url: str, source_name: str) -> None:
+    def __init__(
+        self,
+        url: str,
+        source_name: str,
+        cache: Optional[HttpCache] = None,
+        fetcher: Optional[Fetcher] = None,
+    ) -> None:
         self.url = url
         self.source_name = source_name
+        self.cache = cache
+        self.fetcher = fetcher or get_fetcher()
+        self.stats: Dict[str, float] = {"cache_hits": 0, "cache_misses": 0}
+        # Charset declared by the last response fetched, if any.
+        self.encoding: Optional[str] = None
+
+    def fetch(self) -> bytes:
+        """Return the raw bytes of the RSS feed.
 
-    def fetch(self) -> feedparser.FeedParserDict:
-        """Download and parse the RSS feed."""
+        Remote feeds are downloaded through the shared fetcher (conditionally
+        when a cache is configured, raising NotModified on a 304 if the cached
+        events can be replayed). Local paths are read from disk. The charset
+        declared by the response is kept in ``encoding``.
+        """
         logger.info("Fetching RSS feed: %s", self.url)
-        return feedparser.parse(self.url)
+        self.encoding = None
+        if urlparse(self.url).scheme not in ("http", "https"):
+            with open(self.url, "rb") as f:
+                return f.read()
+        body, self.encoding = fetch_conditional(self.fetcher, self.url, self.cache, self.stats)
+        return body
 
     def parse(self) -> Iterable[Dict[str, Optional[str]]]:
         """Yield raw event dicts extracted from the feed."""
-        feed = self.fetch()
+        body = self.fetch()
+        return self.extract(body, self.encoding)
+
+    def extract(self, body: bytes, encoding: Optional[str] = None) -> Iterable[Dict[str, Optional[str]]]:
+        """Yield raw event dicts found in an already downloaded feed.
+
+        ``encoding`` is the charset declared by the response, if any.
+        """
+        headers = {"content-type": f"application/xml; charset={encoding}"} if encoding else None
+        feed = feedparser.parse(body, response_headers=headers)
         for entry in feed.entries:
             title = entry.get("title", "").strip()
             description = entry.get("summary", "").strip()
@@ -52,6 +87,7 @@ class RssIngestor:
             raw_event = {
                 "source_name": self.source_name,
                 "source_url": link,
+                "external_id": entry.get("id") or link,
                 "title": title,
                 "description": description,
                 "start": published_parsed.isoformat() if published_parsed else None,
@@ -62,7 +98,5 @@ class RssIngestor:
                 "address": None,
                 "city": None,
             }
-            # Compute a hash of the raw event for deduplication/traceability
-            raw_event_str = str(raw_event).encode("utf-8", errors="ignore")
-            raw_event["source_hash"] = hashlib.sha1(raw_event_str).hexdigest()
-            yield raw_event
+            # Stamp identity key and content hash for deduplication/traceability
+            yield stamp(raw_event)
@@ -1,38 +1,39 @@
 """
 Entry point for all ingestion connectors.
 
-Reads the source catalogue and runs each enabled source. The raw events are
-written to a JSON Lines file (`output/raw_events.jsonl`) for consumption by
-the normalisation pipeline. Metrics about the run (number of events per
-source, duration) are printed to stdout.
+Reads the source catalogue and runs each enabled source concurrently (see
+`runner.py`). The raw events are written to `output/raw_events.<ext>` for
+consumption by the normalisation pipeline, in the intermediate format set by
+`INGEST_FORMAT` (JSON Lines by default, see `formats.py`). Each source writes
+its own part file under `output/parts/`, and the final file is assembled from
+the successful parts through a temporary file renamed once complete. Metrics
+about the run (number of events per source, duration) are printed to stdout.
 """
 from __future__ import annotations
 
-import json
+import argparse
 import logging
 import os
 import time
 from pathlib import Path
-from typing import Dict, Iterable, Type
+from typing import Dict, List, Optional
 
 import yaml
 
-from .csv_ingestor import CsvIngestor
-from .html_ingestor import HtmlIngestor
-from .ics_ingestor import IcsIngestor
-from .rss_ingestor import RssIngestor
+from . import formats
+from .http_cache import HttpCache
+from .parse_pool import PARSE_WORKERS, ParsePool
+from .runner import delta_path_for, log_results, run_sources
+from .state import StateStore, new_run_id, write_run
 
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 logger = logging.getLogger(__name__)
 
 
-INGESTOR_CLASSES: Dict[str, Type] = {
-    "rss": RssIngestor,
-    "html": HtmlIngestor,
-    "csv": CsvIngestor,
-    "ics": IcsIngestor,
-}
+OUTPUT_MODE = os.environ.get("INGEST_OUTPUT_MODE", "full")
+CATALOG_PATH = Path(__file__).parent / "sources" / "catalog.yml"
+OUTPUT_DIR = Path(__file__).parent / "output"
 
 
 def load_catalog(path: str) -> Dict:
@@ -40,44 +41,70 @@ def load_catalog(path: str) -> Dict:
         return yaml.safe_load(f)
 
 
-def run_source(source: Dict) -> Iterable[Dict]:
-    typ = source.get("type")
-    if typ not in INGESTOR_CLASSES:
-        logger.warning("Unknown source type %s", typ)
-        return []
-    klass = INGESTOR_CLASSES[typ]
-    # handle CSV field mapping if provided
-    if typ == "csv":
-        ingestor = klass(source["url"], source["name"], source.get("field_map", {}))
-    else:
-        ingestor = klass(source["url"], source["name"])
-    return list(ingestor.parse())
-
-
-def main() -> None:
-    catalog_path = Path(__file__).parent / "sources" / "catalog.yml"
-    catalog = load_catalog(str(catalog_path))
-    output_dir = Path(__file__).parent / "output"
-    output_dir.mkdir(parents=True, exist_ok=True)
-    output_file = output_dir / "raw_events.jsonl"
-
-    total_events = 0
-    metrics = {}
+def enabled_sources(catalog: Dict) -> List[Dict]:
+    return [s for s in catalog.get("sources", []) if s.get("enabled", True)]
+
+
+def output_path(output_dir: Path, mode: str, fmt: Optional[str] = None) -> Path:
+    """Return the file assembled by a ``full`` or ``delta`` run in format ``fmt``."""
+    stem = "raw_events" if mode == "full" else "raw_events.delta"
+    return output_dir / formats.filename(stem, formats.resolve_format(fmt or formats.FORMAT))
+
+
+def assemble_output(paths: List[Path], output_file: Path, fmt: Optional[str] = None) -> None:
+    """Concatenate part files into ``output_file`` in format ``fmt``, atomically."""
+    tmp = output_file.with_name(output_file.name + ".tmp")
+    try:
+        formats.concat(paths, tmp, formats.resolve_format(fmt or formats.FORMAT))
+        os.replace(tmp, output_file)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def main(mode: str = OUTPUT_MODE, fmt: Optional[str] = None) -> Path:
+    """Run all enabled sources and return the file to hand to the normaliser.
+
+    ``mode`` is ``full`` to write every event to ``raw_events.<ext>``, or
+    ``delta`` to write only new/changed events and tombstones for removed
+    ones to ``raw_events.delta.<ext>``. Either way the run's state is staged,
+    and the run id written next to the file (see `state.write_run`): the
+    normaliser acknowledges it once the file is written to the database.
+    ``fmt`` is the intermediate format (`INGEST_FORMAT` by default).
+    """
+    if mode not in ("full", "delta"):
+        raise ValueError(f"Unknown output mode {mode!r}")
+    fmt = formats.resolve_format(fmt or formats.FORMAT)
+    catalog = load_catalog(str(CATALOG_PATH))
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    output_file = output_path(OUTPUT_DIR, mode, fmt)
+
+    sources = enabled_sources(catalog)
     start_time = time.time()
-    with open(output_file, "w", encoding="utf-8") as f:
-        for source in catalog.get("sources", []):
-            if not source.get("enabled", True):
-                continue
-            events = run_source(source)
-            metrics[source["name"]] = len(events)
-            total_events += len(events)
-            for ev in events:
-                f.write(json.dumps(ev, ensure_ascii=False) + "\n")
-    duration = time.time() - start_time
-    logger.info("Ingestion complete: %d events from %d sources in %.2fs", total_events, len(metrics), duration)
-    for name, count in metrics.items():
-        logger.info("  %s: %d events", name, count)
+    run_id = new_run_id()
+    state = StateStore()
+    parse_pool = ParsePool() if PARSE_WORKERS > 0 else None
+    try:
+        results = run_sources(
+            sources, OUTPUT_DIR / "parts", cache=HttpCache(), state=state, fmt=fmt, parse_pool=parse_pool, run_id=run_id
+        )
+    finally:
+        # Abandoned workers cannot write the state any more (see `run_sources`).
+        state.close()
+        if parse_pool is not None:
+            parse_pool.close()
+    succeeded = [r["path"] for r in results.values() if r["status"] == "ok"]
+    if mode == "delta":
+        succeeded = [delta_path_for(p) for p in succeeded]
+    assemble_output(succeeded, output_file, fmt)
+    write_run(output_file, run_id)
+    log_results(results, time.time() - start_time)
+    return output_file
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Run all ingestion sources.")
+    parser.add_argument("--mode", choices=("full", "delta"), default=OUTPUT_MODE)
+    parser.add_argument("--format", choices=("auto", *formats.EXTENSIONS), default=formats.FORMAT)
+    args = parser.parse_args()
+    main(args.mode, args.format)
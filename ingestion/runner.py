@@ -0,0 +1,460 @@
+"""
+Concurrent runner for the ingestion sources.
+
+`run_sources` runs a batch of sources on worker threads, capped globally
+(`INGEST_MAX_WORKERS`) and per hostname (`INGEST_PER_HOST_LIMIT`). Each
+source streams its events into its own part file through `write_source`, so
+a source that crashes or times out never leaves a truncated file behind.
+HTML/RSS pages go through the HTTP cache and are parsed in the parse pool
+when one is given.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Type
+from urllib.parse import urlparse
+
+from . import formats
+from .csv_ingestor import CsvIngestor
+from .html_ingestor import HtmlIngestor
+from .http_cache import HttpCache, NotModified
+from .ics_ingestor import IcsIngestor
+from .parse_pool import ParsePool
+from .rss_ingestor import RssIngestor
+from .state import SourceDiff, StateStore
+
+logger = logging.getLogger(__name__)
+
+
+INGESTOR_CLASSES: Dict[str, Type] = {
+    "rss": RssIngestor,
+    "html": HtmlIngestor,
+    "csv": CsvIngestor,
+    "ics": IcsIngestor,
+}
+
+# Source types fetched over HTTP through the conditional cache.
+CACHED_TYPES = {"rss", "html"}
+# Source types whose ingestors split fetch() (bytes) from extract(bytes), so
+# that extraction can run in the parse pool.
+POOLED_TYPES = {"rss", "html"}
+
+MAX_WORKERS = int(os.environ.get("INGEST_MAX_WORKERS", "4"))
+PER_HOST_LIMIT = int(os.environ.get("INGEST_PER_HOST_LIMIT", "2"))
+SOURCE_TIMEOUT_SECONDS = float(os.environ.get("INGEST_SOURCE_TIMEOUT_SECONDS", "300"))
+STRAGGLER_GRACE_SECONDS = float(os.environ.get("INGEST_STRAGGLER_GRACE_SECONDS", "30"))
+HTML_PARSER = os.environ.get("INGEST_HTML_PARSER", "auto")
+
+
+class SourceCancelled(Exception):
+    """Raised in a source's worker once `run_sources` has given up on it."""
+
+
+def source_key(source: Dict) -> str:
+    """Return the key of ``source`` in results, part files and the state store."""
+    return source.get("key") or source["name"]
+
+
+def keyed_sources(sources: List[Dict]) -> List[Dict]:
+    """Return copies of ``sources`` with a unique ``key`` each.
+
+    Later sources reusing a key get a ``#2``, ``#3``... suffix.
+    """
+    explicit = {s["key"] for s in sources if s.get("key")}
+    used = set()
+    keyed = []
+    for source in sources:
+        key = base = source_key(source)
+        n = 1
+        while key in used or (n > 1 and key in explicit):
+            n += 1
+            key = f"{base}#{n}"
+        used.add(key)
+        keyed.append(dict(source, key=key))
+    return keyed
+
+
+def source_host(source: Dict) -> Optional[str]:
+    """Return the hostname a source is fetched from, or None for local files."""
+    return urlparse(source.get("url", "")).hostname
+
+
+def build_ingestor(source: Dict, cache: Optional[HttpCache] = None):
+    """Instantiate the ingestor of ``source`` with its catalogue options."""
+    typ = source["type"]
+    kwargs: Dict = {}
+    # handle CSV field mapping if provided
+    if typ == "csv":
+        kwargs["field_map"] = source.get("field_map", {})
+        for option in ("delimiter", "encoding", "engine"):
+            if source.get(option):
+                kwargs[option] = source[option]
+    if typ == "html":
+        kwargs["selectors"] = source.get("selectors")
+        kwargs["parser"] = source.get("parser", HTML_PARSER)
+        if source.get("date_format"):
+            kwargs["date_format"] = source["date_format"]
+    if typ == "ics":
+        for option in ("horizon_days", "engine"):
+            if source.get(option):
+                kwargs[option] = source[option]
+    if typ in CACHED_TYPES and cache is not None:
+        kwargs["cache"] = cache
+    return INGESTOR_CLASSES[typ](source["url"], source["name"], **kwargs)
+
+
+def extract_events(
+    source: Dict, body: bytes, encoding: Optional[str] = None
+) -> List[Dict]:
+    """Extract the raw events of ``source`` from its downloaded ``body``.
+
+    ``encoding`` is the charset declared by the response. Runs in parse pool
+    worker processes.
+    """
+    return list(build_ingestor(source).extract(body, encoding))
+
+
+def run_source(
+    source: Dict,
+    cache: Optional[HttpCache] = None,
+    stats: Optional[Dict] = None,
+    parse_pool: Optional[ParsePool] = None,
+) -> Iterator[Dict]:
+    """Run one source and lazily yield its raw events.
+
+    Unchanged HTML/RSS pages are replayed from ``cache``, and fresh ones are
+    parsed in ``parse_pool`` if given. The ingestor's counters and stage
+    timings are added to ``stats`` once the events have been consumed.
+    """
+    typ = source.get("type")
+    if typ not in INGESTOR_CLASSES:
+        logger.warning("Unknown source type %s", typ)
+        return
+    ingestor = build_ingestor(source, cache)
+    replayed = False
+    try:
+        if parse_pool is not None and typ in POOLED_TYPES:
+            body = ingestor.fetch()
+            events, waited, busy = parse_pool.run(
+                extract_events, source, body, ingestor.encoding
+            )
+            if stats is not None:
+                stats["parse_seconds"] = busy
+                stats["parse_wait_seconds"] = waited
+            yield from events
+        else:
+            yield from ingestor.parse()
+    except NotModified:
+        if cache is None:
+            # Only ingestors given a cache raise it.
+            raise
+        logger.info("Source %s not modified, replaying cached events", source["name"])
+        replayed = True
+        yield from cache.load_events(source["url"])
+    if stats is not None:
+        stats.update(getattr(ingestor, "stats", {}))
+        stats["replayed"] = replayed
+
+
+def part_path(parts_dir: Path, source: Dict, fmt: Optional[str] = None) -> Path:
+    """Return the part file holding the events of ``source`` in format ``fmt``."""
+    stem = re.sub(r"[^\w.#-]", "_", source_key(source))
+    return parts_dir / formats.filename(
+        stem, formats.resolve_format(fmt or formats.FORMAT)
+    )
+
+
+def delta_path_for(path: Path) -> Path:
+    """Return the delta file written next to the part file ``path``."""
+    return path.with_suffix(".delta" + path.suffix)
+
+
+def write_source(
+    source: Dict,
+    path: Path,
+    cache: Optional[HttpCache] = None,
+    stats: Optional[Dict] = None,
+    state: Optional[StateStore] = None,
+    fmt: Optional[str] = None,
+    parse_pool: Optional[ParsePool] = None,
+    sink: Optional[Callable[[Dict], None]] = None,
+    cancel: Optional[threading.Event] = None,
+    run_id: Optional[str] = None,
+) -> int:
+    """Stream the events of ``source`` into ``path`` and return their count.
+
+    ``path`` is only replaced once the source completes. With a ``state``
+    store, new/changed events and tombstones also go to the delta file next
+    to ``path``, and the state is updated (staged under ``run_id`` if given,
+    see `state`). Each written event is passed to ``sink`` if given. Once
+    ``cancel`` is set, the next event raises `SourceCancelled` and nothing
+    is updated.
+    """
+    fmt = formats.resolve_format(fmt or formats.FORMAT)
+    stats = {} if stats is None else stats
+    diff = SourceDiff(state, source_key(source)) if state is not None else None
+    delta_path = delta_path_for(path)
+    tmp = path.with_name(path.name + ".tmp")
+    delta_tmp = delta_path.with_name(delta_path.name + ".tmp")
+    count = 0
+    try:
+        with ExitStack() as stack:
+            f = stack.enter_context(formats.open_writer(tmp, fmt))
+            d = (
+                stack.enter_context(formats.open_writer(delta_tmp, fmt))
+                if diff is not None
+                else None
+            )
+            for ev in run_source(
+                source, cache=cache, stats=stats, parse_pool=parse_pool
+            ):
+                _check_cancelled(source, cancel)
+                f.write(ev)
+                if sink is not None:
+                    sink(ev)
+                count += 1
+                if diff is not None and d is not None:
+                    change = diff.classify(ev)
+                    if change in ("new", "changed"):
+                        d.write(dict(ev, change=change))
+            if diff is not None and d is not None:
+                for tombstone in diff.removed():
+                    d.write(tombstone)
+        _check_cancelled(source, cancel)
+        os.replace(tmp, path)
+        if diff is not None:
+            os.replace(delta_tmp, delta_path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        delta_tmp.unlink(missing_ok=True)
+        raise
+    if diff is not None:
+        diff.commit(run_id)
+        stats.update(diff.counts)
+    if (
+        cache is not None
+        and source.get("type") in CACHED_TYPES
+        and not stats.get("replayed")
+    ):
+        cache.store_events_file(source["url"], path)
+    return count
+
+
+def _check_cancelled(source: Dict, cancel: Optional[threading.Event]) -> None:
+    if cancel is not None and cancel.is_set():
+        raise SourceCancelled(f"Source {source_key(source)} was cancelled")
+
+
+def _run_worker(
+    source: Dict,
+    parts_dir: Path,
+    cache: Optional[HttpCache],
+    state: Optional[StateStore],
+    fmt: str,
+    parse_pool: Optional[ParsePool],
+    sink: Optional[Callable[[Dict], None]],
+    cancel: threading.Event,
+    run_id: Optional[str],
+    done: "queue.Queue",
+) -> None:
+    start = time.perf_counter()
+    stats: Dict = {}
+    count: Optional[int] = None
+    error: Optional[BaseException] = None
+    try:
+        path = part_path(parts_dir, source, fmt)
+        count = write_source(
+            source,
+            path,
+            cache=cache,
+            stats=stats,
+            state=state,
+            fmt=fmt,
+            parse_pool=parse_pool,
+            sink=sink,
+            cancel=cancel,
+            run_id=run_id,
+        )
+    except BaseException as exc:  # noqa: BLE001
+        error = exc
+    finally:
+        # Always report, so that the source's slots are released.
+        done.put((source["key"], count, error, time.perf_counter() - start, stats))
+
+
+def run_sources(
+    sources: List[Dict],
+    parts_dir: Path,
+    max_workers: int = MAX_WORKERS,
+    per_host_limit: int = PER_HOST_LIMIT,
+    timeout: float = SOURCE_TIMEOUT_SECONDS,
+    cache: Optional[HttpCache] = None,
+    state: Optional[StateStore] = None,
+    fmt: Optional[str] = None,
+    parse_pool: Optional[ParsePool] = None,
+    sink: Optional[Callable[[Dict], None]] = None,
+    grace: float = STRAGGLER_GRACE_SECONDS,
+    run_id: Optional[str] = None,
+) -> Dict[str, Dict]:
+    """Run ``sources`` concurrently and return their results by key.
+
+    The other arguments are passed to `write_source`; ``sink`` is called
+    from the worker threads. Results follow the order of ``sources``, keyed
+    by `keyed_sources`, and hold the part file ``path``, the ``events``
+    count (None unless ``status`` is ``ok``), the ``status`` (``ok``,
+    ``error`` or ``timeout``), the ``duration`` and the ingestor's ``stats``.
+
+    A source exceeding ``timeout`` is cancelled but keeps its slots until its
+    worker stops. Threads cannot be killed, so a worker still running
+    ``grace`` seconds later is abandoned and its slots released.
+    """
+    parts_dir.mkdir(parents=True, exist_ok=True)
+    fmt = formats.resolve_format(fmt or formats.FORMAT)
+    max_workers = max(1, max_workers)
+    per_host_limit = max(1, per_host_limit)
+    sources = keyed_sources(sources)
+    results: Dict[str, Dict] = {}
+    pending = list(sources)
+    # source key -> deadline, then end of grace once cancelled
+    running: Dict[str, float] = {}
+    cancels: Dict[str, threading.Event] = {}
+    hosts: Dict[str, Optional[str]] = {s["key"]: source_host(s) for s in sources}
+    host_load: Counter = Counter()
+    done: "queue.Queue" = queue.Queue()
+
+    def release(key: str) -> None:
+        del running[key]
+        host_load[hosts[key]] -= 1
+
+    while pending or running:
+        for source in list(pending):
+            if len(running) >= max_workers:
+                break
+            host = hosts[source["key"]]
+            if host is not None and host_load[host] >= per_host_limit:
+                continue
+            pending.remove(source)
+            host_load[host] += 1
+            running[source["key"]] = time.monotonic() + timeout
+            cancels[source["key"]] = threading.Event()
+            worker = threading.Thread(
+                target=_run_worker,
+                args=(
+                    source,
+                    parts_dir,
+                    cache,
+                    state,
+                    fmt,
+                    parse_pool,
+                    sink,
+                    cancels[source["key"]],
+                    run_id,
+                    done,
+                ),
+                name=f"ingest-{source['key']}",
+                daemon=True,
+            )
+            worker.start()
+
+        wait = max(0.0, min(running.values()) - time.monotonic())
+        try:
+            key, count, exc, duration, stats = done.get(timeout=wait)
+        except queue.Empty:
+            now = time.monotonic()
+            for key, deadline in list(running.items()):
+                if deadline > now:
+                    continue
+                if cancels[key].is_set():
+                    logger.error(
+                        "Source %s still running %.0fs after its timeout, abandoning its thread",
+                        key,
+                        grace,
+                    )
+                    release(key)
+                else:
+                    logger.error("Source %s timed out after %.0fs", key, timeout)
+                    results[key] = {
+                        "events": None,
+                        "status": "timeout",
+                        "duration": timeout,
+                        "stats": {},
+                    }
+                    cancels[key].set()
+                    running[key] = now + grace
+            continue
+        if key not in running:
+            # Late result from an abandoned source.
+            continue
+        release(key)
+        if cancels[key].is_set():
+            # Cancelled after its timeout, already reported.
+            continue
+        if exc is not None:
+            logger.error("Source %s failed: %s", key, exc)
+            results[key] = {
+                "events": None,
+                "status": "error",
+                "duration": duration,
+                "stats": stats,
+            }
+        else:
+            results[key] = {
+                "events": count,
+                "status": "ok",
+                "duration": duration,
+                "stats": stats,
+            }
+
+    ordered = {}
+    for source in sources:
+        ordered[source["key"]] = dict(
+            results[source["key"]], path=part_path(parts_dir, source, fmt)
+        )
+    return ordered
+
+
+def log_results(results: Dict[str, Dict], duration: float) -> None:
+    """Log the totals and per-source metrics of a `run_sources` call."""
+    total_events = sum(r["events"] or 0 for r in results.values())
+    logger.info(
+        "Ingestion complete: %d events from %d sources in %.2fs",
+        total_events,
+        len(results),
+        duration,
+    )
+    stage_totals: Counter = Counter()
+    for result in results.values():
+        for key in ("fetch_seconds", "parse_seconds", "parse_wait_seconds"):
+            stage_totals[key] += result["stats"].get(key, 0.0)
+    logger.info(
+        "Stages: fetch %.2fs, parse %.2fs in the parse pool (%.2fs waiting for it)",
+        stage_totals["fetch_seconds"],
+        stage_totals["parse_seconds"],
+        stage_totals["parse_wait_seconds"],
+    )
+    for name, result in results.items():
+        m = result["stats"]
+        logger.info(
+            "  %s: %d events (%s, %.2fs, %d bytes fetched in %.2fs, parsed in %.2fs, cache %d hit / %d miss, "
+            "%d new / %d changed / %d removed)",
+            name,
+            result["events"] or 0,
+            result["status"],
+            result["duration"],
+            m.get("bytes", 0),
+            m.get("fetch_seconds", 0.0),
+            m.get("parse_seconds", 0.0),
+            m.get("cache_hits", 0),
+            m.get("cache_misses", 0),
+            m.get("new", 0),
+            m.get("changed", 0),
+            m.get("removed", 0),
+        )
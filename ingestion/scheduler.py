@@ -0,0 +1,280 @@
+"""
+Long-running ingestion scheduler.
+
+`run_all.main()` runs every source once, whenever cron or `/admin/ingest`
+calls it. The scheduler instead keeps running and refreshes each source on
+its own interval, declared in the catalogue as ``refresh_interval`` (seconds,
+or a duration such as ``15m``, ``6h`` or ``2d``; `INGEST_DEFAULT_REFRESH`
+otherwise). Fast-changing feeds can thus be polled often and static CSV
+exports rarely.
+
+Next-due times are kept in a priority queue. Sources that are due together
+are run as one batch through `runner.run_sources`, so the global and
+per-host concurrency limits still apply, and the output file is re-assembled
+after every batch:
+
+* in ``full`` mode, the `raw_events` file is rebuilt from the latest complete
+  part file of every source, so a source that just failed keeps its previous
+  events;
+* in ``delta`` mode, the `raw_events.delta` file holds the changes of the last
+  batch only (``--normalize`` runs the normaliser on it after each batch).
+  The state of a batch is only acknowledged once the normaliser has
+  consumed its file (see `state`): a delta overwritten before that is
+  emitted again, against the last acknowledged state, by the next run of
+  its sources.
+
+Every next run is jittered by ±`INGEST_SCHEDULER_JITTER` (a fraction of the
+interval) so that sources sharing an interval drift apart. A failing source
+is retried after `INGEST_FAILURE_BACKOFF_SECONDS`, doubled on each
+consecutive failure up to `INGEST_MAX_BACKOFF_SECONDS`. Next-due times and
+failure counts are persisted in the state store, so a restarted scheduler
+does not refetch every source at once.
+
+Usage:
+    python -m ingestion.scheduler [--mode full|delta] [--format FORMAT] [--normalize]
+"""
+from __future__ import annotations
+
+import argparse
+import heapq
+import itertools
+import logging
+import os
+import random
+import re
+import signal
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from . import formats
+from .http_cache import HttpCache
+from .parse_pool import PARSE_WORKERS, ParsePool
+from .run_all import (
+    CATALOG_PATH,
+    OUTPUT_DIR,
+    OUTPUT_MODE,
+    assemble_output,
+    enabled_sources,
+    load_catalog,
+    output_path,
+)
+from .runner import (
+    delta_path_for,
+    keyed_sources,
+    log_results,
+    part_path,
+    run_sources,
+)
+from .state import StateStore, new_run_id, write_run
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REFRESH = os.environ.get("INGEST_DEFAULT_REFRESH", "1d")
+JITTER = float(os.environ.get("INGEST_SCHEDULER_JITTER", "0.1"))
+FAILURE_BACKOFF_SECONDS = float(os.environ.get("INGEST_FAILURE_BACKOFF_SECONDS", "300"))
+MAX_BACKOFF_SECONDS = float(os.environ.get("INGEST_MAX_BACKOFF_SECONDS", "86400"))
+
+INTERVAL_RE = re.compile(r"^(\d+(?:\.\d+)?)\s*([smhdw]?)$")
+INTERVAL_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def parse_interval(value) -> float:
+    """Return ``value`` (seconds, or a duration such as ``15m``) in seconds."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        seconds = float(value)
+    else:
+        match = INTERVAL_RE.match(str(value).strip().lower())
+        if not match:
+            raise ValueError(f"Invalid refresh interval {value!r}")
+        seconds = float(match.group(1)) * INTERVAL_UNITS[match.group(2)]
+    if seconds <= 0:
+        raise ValueError(f"Refresh interval must be positive, got {value!r}")
+    return seconds
+
+
+class Scheduler:
+    """Runs catalogue sources as they fall due, each on its own interval."""
+
+    def __init__(
+        self,
+        sources: List[Dict],
+        output_dir: Path,
+        mode: str = OUTPUT_MODE,
+        fmt: Optional[str] = None,
+        cache: Optional[HttpCache] = None,
+        state: Optional[StateStore] = None,
+        on_batch: Optional[Callable[[Path], None]] = None,
+        parse_pool: Optional[ParsePool] = None,
+        jitter: float = JITTER,
+        clock: Callable[[], float] = time.time,
+        rng: Callable[[], float] = random.random,
+    ) -> None:
+        """
+        :param on_batch: called with the output file after every batch.
+        :param clock: returns the current Unix time (injectable for tests).
+        :param rng: returns a float in [0, 1) used for jitter.
+        """
+        if mode not in ("full", "delta"):
+            raise ValueError(f"Unknown output mode {mode!r}")
+        self.sources = {s["key"]: s for s in keyed_sources(sources)}
+        self.intervals = {
+            name: parse_interval(s.get("refresh_interval", DEFAULT_REFRESH))
+            for name, s in self.sources.items()
+        }
+        self.parts_dir = output_dir / "parts"
+        self.fmt = formats.resolve_format(fmt or formats.FORMAT)
+        self.output_file = output_path(output_dir, mode, self.fmt)
+        self.mode = mode
+        self.cache = cache
+        self.state = state
+        self.on_batch = on_batch
+        self.parse_pool = parse_pool
+        self.jitter = jitter
+        self.clock = clock
+        self.rng = rng
+        self.failures: Dict[str, int] = {}
+        self._queue: List[Tuple[float, int, str]] = []
+        self._seq = itertools.count()
+
+        persisted = state.load_schedule() if state is not None else {}
+        now = clock()
+        for name in self.sources:
+            next_run, failures = persisted.get(name, (now, 0))
+            self.failures[name] = failures
+            # Honour an interval shortened in the catalogue since the last run.
+            self._push(name, min(next_run, now + self.intervals[name]))
+
+    def _push(self, name: str, due: float) -> None:
+        heapq.heappush(self._queue, (due, next(self._seq), name))
+
+    def next_due(self) -> float:
+        """Return the Unix time at which the next source falls due."""
+        return self._queue[0][0]
+
+    def delay(self, name: str) -> float:
+        """Return the jittered delay before the next run of ``name``."""
+        failures = self.failures[name]
+        if failures:
+            base = min(
+                FAILURE_BACKOFF_SECONDS * 2 ** (failures - 1), MAX_BACKOFF_SECONDS
+            )
+        else:
+            base = self.intervals[name]
+        return base * (1 + self.jitter * (2 * self.rng() - 1))
+
+    def run_due(self) -> Dict[str, Dict]:
+        """Run every source that is due, reschedule them and return their results."""
+        now = self.clock()
+        batch = []
+        while self._queue and self._queue[0][0] <= now:
+            batch.append(self.sources[heapq.heappop(self._queue)[2]])
+        if not batch:
+            return {}
+        start = time.time()
+        run_id = new_run_id()
+        results = run_sources(
+            batch,
+            self.parts_dir,
+            cache=self.cache,
+            state=self.state,
+            fmt=self.fmt,
+            parse_pool=self.parse_pool,
+            run_id=run_id,
+        )
+        now = self.clock()
+        for name, result in results.items():
+            self.failures[name] = (
+                0 if result["status"] == "ok" else self.failures[name] + 1
+            )
+            due = now + self.delay(name)
+            self._push(name, due)
+            if self.state is not None:
+                self.state.save_schedule(name, due, self.failures[name])
+        self._assemble(results)
+        write_run(self.output_file, run_id)
+        log_results(results, time.time() - start)
+        if self.on_batch is not None:
+            try:
+                self.on_batch(self.output_file)
+            except Exception:  # noqa: BLE001
+                logger.exception("Post-batch hook failed for %s", self.output_file)
+        return results
+
+    def _assemble(self, results: Dict[str, Dict]) -> None:
+        if self.mode == "full":
+            paths = [
+                part_path(self.parts_dir, s, self.fmt) for s in self.sources.values()
+            ]
+            paths = [p for p in paths if p.exists()]
+        else:
+            paths = [
+                delta_path_for(r["path"])
+                for r in results.values()
+                if r["status"] == "ok"
+            ]
+        assemble_output(paths, self.output_file, self.fmt)
+
+    def run_forever(self, stop: threading.Event) -> None:
+        """Run sources as they fall due until ``stop`` is set."""
+        while self._queue and not stop.is_set():
+            wait = max(0.0, self.next_due() - self.clock())
+            if wait:
+                logger.info("Next source due in %.0fs", wait)
+            if stop.wait(wait):
+                break
+            self.run_due()
+
+
+def main(
+    mode: str = OUTPUT_MODE, fmt: Optional[str] = None, normalize: bool = False
+) -> None:
+    on_batch = None
+    if normalize:
+        from normalize.normalizer import normalize_and_upsert
+
+        def on_batch(path: Path) -> None:
+            normalize_and_upsert(str(path))
+
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+    state = StateStore()
+    parse_pool = ParsePool() if PARSE_WORKERS > 0 else None
+    try:
+        sources = enabled_sources(load_catalog(str(CATALOG_PATH)))
+        scheduler = Scheduler(
+            sources,
+            OUTPUT_DIR,
+            mode=mode,
+            fmt=fmt,
+            cache=HttpCache(),
+            state=state,
+            on_batch=on_batch,
+            parse_pool=parse_pool,
+        )
+        scheduler.run_forever(stop)
+    finally:
+        state.close()
+        if parse_pool is not None:
+            parse_pool.close()
+    logger.info("Scheduler stopped")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Refresh ingestion sources on their own intervals."
+    )
+    parser.add_argument("--mode", choices=("full", "delta"), default=OUTPUT_MODE)
+    parser.add_argument(
+        "--format", choices=("auto", *formats.EXTENSIONS), default=formats.FORMAT
+    )
+    parser.add_argument(
+        "--normalize",
+        action="store_true",
+        help="normalise and upsert the output after every batch",
+    )
+    args = parser.parse_args()
+    main(args.mode, args.format, args.normalize)
@@ -0,0 +1,278 @@
+"""
+Persistent ingestion state used for incremental runs.
+
+The state store remembers, for every source, which events were seen on the
+last successful run and the `source_hash` each one had. Comparing a new run
+against it tells which events are new, which changed and which disappeared,
+so `run_all` can emit a delta file and the normaliser only has to process
+what actually changed. The store also keeps the scheduler's next-due time and
+consecutive failure count of each source (see `scheduler.py`).
+
+Events are identified by their `source_id` identity key and compared by
+their `source_hash` content hash (see `fingerprint.py`). State lives in a
+local SQLite database (`INGEST_STATE_PATH`) in WAL mode.
+
+A run's state only becomes the reference once the normaliser has consumed
+its output. `run_all` stages it as pending under a run id, and writes that id
+next to the output file (`write_run`, ``raw_events.delta.jsonl.run``); the
+normaliser promotes the pending state (`acknowledge_run`) once it has
+written the whole file. Until then every run is compared with the last
+acknowledged state, so a delta file that was overwritten before being
+normalised loses nothing: its changes and tombstones are emitted again.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+from .fingerprint import identity_key
+
+logger = logging.getLogger(__name__)
+
+STATE_PATH = os.environ.get(
+    "INGEST_STATE_PATH", os.path.join(os.path.dirname(__file__), "state.sqlite")
+)
+RUN_SUFFIX = ".run"
+
+
+class StateStore:
+    """SQLite store of the (event key -> source_hash) map of each source."""
+
+    def __init__(self, path: str = STATE_PATH) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS seen_events (
+                source_name TEXT NOT NULL,
+                event_key TEXT NOT NULL,
+                source_hash TEXT NOT NULL,
+                PRIMARY KEY (source_name, event_key)
+            )
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pending_events (
+                source_name TEXT NOT NULL,
+                event_key TEXT NOT NULL,
+                source_hash TEXT NOT NULL,
+                PRIMARY KEY (source_name, event_key)
+            )
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pending_runs (
+                source_name TEXT PRIMARY KEY,
+                run_id TEXT NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schedule (
+                source_name TEXT PRIMARY KEY,
+                next_run REAL NOT NULL,
+                failures INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        self._conn.commit()
+
+    def load(self, source_name: str) -> Dict[str, str]:
+        """Return the event key -> source_hash map recorded for ``source_name``."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT event_key, source_hash FROM seen_events WHERE source_name = ?",
+                (source_name,),
+            ).fetchall()
+        return dict(rows)
+
+    def replace(self, source_name: str, seen: Iterable[Tuple[str, str]]) -> None:
+        """Atomically replace the state of ``source_name`` with ``seen``."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM seen_events WHERE source_name = ?", (source_name,)
+            )
+            self._conn.executemany(
+                "INSERT INTO seen_events (source_name, event_key, source_hash) VALUES (?, ?, ?)",
+                ((source_name, key, h) for key, h in seen),
+            )
+
+    def stage(
+        self, source_name: str, run_id: str, seen: Iterable[Tuple[str, str]]
+    ) -> None:
+        """Record ``seen`` as the pending state of ``source_name`` from run ``run_id``.
+
+        It replaces any pending state of the source from an earlier run.
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM pending_events WHERE source_name = ?", (source_name,)
+            )
+            self._conn.executemany(
+                "INSERT INTO pending_events (source_name, event_key, source_hash) VALUES (?, ?, ?)",
+                ((source_name, key, h) for key, h in seen),
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pending_runs (source_name, run_id) VALUES (?, ?)",
+                (source_name, run_id),
+            )
+
+    def acknowledge(self, run_id: str) -> int:
+        """Make the pending state of run ``run_id`` the state of its sources.
+
+        Sources staged again by a later run since are left pending. Returns
+        the number of sources acknowledged.
+        """
+        with self._lock, self._conn:
+            names = [
+                name
+                for (name,) in self._conn.execute(
+                    "SELECT source_name FROM pending_runs WHERE run_id = ?", (run_id,)
+                )
+            ]
+            for name in names:
+                self._conn.execute(
+                    "DELETE FROM seen_events WHERE source_name = ?", (name,)
+                )
+                self._conn.execute(
+                    "INSERT INTO seen_events (source_name, event_key, source_hash) "
+                    "SELECT source_name, event_key, source_hash FROM pending_events WHERE source_name = ?",
+                    (name,),
+                )
+                self._conn.execute(
+                    "DELETE FROM pending_events WHERE source_name = ?", (name,)
+                )
+                self._conn.execute(
+                    "DELETE FROM pending_runs WHERE source_name = ?", (name,)
+                )
+        return len(names)
+
+    def load_schedule(self) -> Dict[str, Tuple[float, int]]:
+        """Return the source name -> (next run as a Unix time, failures) map."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT source_name, next_run, failures FROM schedule"
+            ).fetchall()
+        return {name: (next_run, failures) for name, next_run, failures in rows}
+
+    def save_schedule(self, source_name: str, next_run: float, failures: int) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO schedule (source_name, next_run, failures) VALUES (?, ?, ?)",
+                (source_name, next_run, failures),
+            )
+
+    def close(self) -> None:
+        # Waits for a write in progress on a worker thread.
+        with self._lock:
+            self._conn.close()
+
+
+class SourceDiff:
+    """Streams the events of one source run against its previous state."""
+
+    def __init__(self, store: StateStore, source_name: str) -> None:
+        self.store = store
+        self.source_name = source_name
+        self.previous = store.load(source_name)
+        self.current: Dict[str, str] = {}
+        self.counts = {"new": 0, "changed": 0, "unchanged": 0, "removed": 0}
+
+    def classify(self, raw_event: Dict) -> str:
+        """Return ``new``, ``changed``, ``unchanged`` or ``duplicate`` for an event."""
+        key = raw_event.get("source_id") or identity_key(raw_event)
+        if key in self.current:
+            return "duplicate"
+        h = raw_event.get("source_hash") or ""
+        self.current[key] = h
+        previous = self.previous.get(key)
+        change = (
+            "new" if previous is None else ("unchanged" if previous == h else "changed")
+        )
+        self.counts[change] += 1
+        return change
+
+    def removed(self) -> Iterable[Dict]:
+        """Yield tombstones for the events that disappeared since the last run."""
+        for key, h in self.previous.items():
+            if key not in self.current:
+                self.counts["removed"] += 1
+                yield {
+                    "source_name": self.source_name,
+                    "source_id": key,
+                    "source_hash": h,
+                    "change": "removed",
+                }
+
+    def commit(self, run_id: Optional[str] = None) -> None:
+        """Record the current run as the new state of the source.
+
+        With a ``run_id``, the state is only staged, until the run is
+        acknowledged (see `StateStore.acknowledge`).
+        """
+        if run_id is None:
+            self.store.replace(self.source_name, self.current.items())
+        else:
+            self.store.stage(self.source_name, run_id, self.current.items())
+
+
+def new_run_id() -> str:
+    return uuid.uuid4().hex
+
+
+def _file_identity(path: Path) -> Dict[str, int]:
+    stat = path.stat()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def run_marker_path(output_file: Path) -> Path:
+    return output_file.with_name(output_file.name + RUN_SUFFIX)
+
+
+def write_run(output_file: Path, run_id: str) -> None:
+    """Record next to ``output_file`` that it holds the events of run ``run_id``."""
+    marker = run_marker_path(output_file)
+    tmp = marker.with_name(marker.name + ".tmp")
+    tmp.write_text(
+        json.dumps(dict(_file_identity(output_file), run_id=run_id)), encoding="utf-8"
+    )
+    os.replace(tmp, marker)
+
+
+def read_run(path: Path) -> Optional[str]:
+    """Return the run whose events the file ``path`` holds, or None if unknown.
+
+    Called before reading the file: a marker left by an older version of the
+    file does not apply.
+    """
+    try:
+        marker = json.loads(run_marker_path(path).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+    except ValueError:
+        logger.warning("Ignoring unreadable run marker of %s", path)
+        return None
+    if any(marker.get(key) != value for key, value in _file_identity(path).items()):
+        logger.warning("Ignoring run marker of %s: the file has changed since", path)
+        return None
+    return marker.get("run_id")
+
+
+def acknowledge_run(run_id: str, path: str = STATE_PATH) -> int:
+    """Acknowledge run ``run_id`` in the state store at ``path`` (see `StateStore.acknowledge`)."""
+    store = StateStore(path)
+    try:
+        return store.acknowledge(run_id)
+    finally:
+        store.close()
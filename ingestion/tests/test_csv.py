@@ -0,0 +1,92 @@
+import gzip
+import io
+import zipfile
+from contextlib import contextmanager
+
+import pytest
+
+from ingestion import csv_ingestor
+from ingestion.csv_ingestor import CsvIngestor
+
+CSV = "Nom;Date;Prix;Ville\nMain Event;01/10/2025 19:30;150 €;Lyon\nTurbo;02/10/2025 20:00;50 €\n"
+FIELD_MAP = {
+    "Nom": "title",
+    "Date": "start",
+    "Prix": "buy_in",
+    "Ville": "city",
+    "Lieu": "venue_name",
+}
+
+
+def parse(path, **kwargs):
+    return list(
+        CsvIngestor(str(path), "fede", FIELD_MAP, delimiter=";", **kwargs).parse()
+    )
+
+
+def test_maps_columns_by_index(tmp_path):
+    path = tmp_path / "planning.csv"
+    path.write_text(CSV, encoding="utf-8")
+    events = parse(path)
+    assert [e["title"] for e in events] == ["Main Event", "Turbo"]
+    assert events[0]["city"] == "Lyon"
+    assert events[1]["city"] is None
+    assert events[0]["venue_name"] is None
+    assert events[0]["source_hash"] and events[0]["source_id"]
+
+
+def test_decompresses_gzip_and_zip(tmp_path):
+    plain = tmp_path / "planning.csv"
+    plain.write_text(CSV, encoding="utf-8")
+    gz = tmp_path / "planning.csv.gz"
+    gz.write_bytes(gzip.compress(CSV.encode("utf-8")))
+    zipped = tmp_path / "planning.zip"
+    with zipfile.ZipFile(zipped, "w") as archive:
+        archive.writestr("README.txt", "export")
+        archive.writestr("planning.csv", CSV)
+    expected = [
+        {
+            k: v
+            for k, v in e.items()
+            if k not in ("source_url", "source_id", "source_hash")
+        }
+        for e in parse(plain)
+    ]
+    for path in (gz, zipped):
+        events = [
+            {
+                k: v
+                for k, v in e.items()
+                if k not in ("source_url", "source_id", "source_hash")
+            }
+            for e in parse(path)
+        ]
+        assert events == expected
+
+
+def test_streams_remote_file_through_fetcher():
+    class FakeStream:
+        raw = io.BytesIO(gzip.compress(CSV.encode("utf-8")))
+        wire_bytes = 42
+
+    class FakeFetcher:
+        @contextmanager
+        def open_stream(self, url, headers=None):
+            yield FakeStream()
+
+    ingestor = CsvIngestor(
+        "https://fede.example/planning.csv.gz",
+        "fede",
+        FIELD_MAP,
+        fetcher=FakeFetcher(),
+        delimiter=";",
+    )
+    assert len(list(ingestor.parse())) == 2
+    assert ingestor.stats["wire_bytes"] == 42
+
+
+@pytest.mark.skipif(csv_ingestor.pa_csv is None, reason="pyarrow not installed")
+def test_pyarrow_engine_matches_python_engine(tmp_path):
+    path = tmp_path / "planning.csv"
+    path.write_text("﻿" + CSV.replace("50 €\n", "50 €;Paris\n"), encoding="utf-8")
+    assert parse(path, engine="pyarrow") == parse(path)
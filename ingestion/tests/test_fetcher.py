@@ -0,0 +1,105 @@
+import pytest
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from ingestion import fetcher as fetcher_module
+from ingestion.fetcher import Fetcher, ResponseTooLarge, declared_charset
+
+
+class FakeRaw:
+    def __init__(self, wire):
+        self.wire = wire
+
+    def tell(self):
+        return self.wire
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=b"", headers=None, wire=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = CaseInsensitiveDict(headers or {})
+        self.raw = FakeRaw(len(body) if wire is None else wire)
+        self.url = "https://casino.example/"
+        self.encoding = "utf-8"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def close(self):
+        pass
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(str(self.status_code))
+
+    def iter_content(self, size):
+        for i in range(0, len(self.body), size):
+            yield self.body[i : i + size]
+
+
+def make_fetcher(monkeypatch, responses, **kwargs):
+    sleeps = []
+    monkeypatch.setattr(fetcher_module.time, "sleep", sleeps.append)
+    f = Fetcher(**kwargs)
+    queue = list(responses)
+
+    def fake_get(url, **kw):
+        item = queue.pop(0)
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    monkeypatch.setattr(f.session, "get", fake_get)
+    return f, sleeps
+
+
+def test_retries_transient_failures_with_backoff(monkeypatch):
+    body = b"<html></html>"
+    f, sleeps = make_fetcher(
+        monkeypatch,
+        [
+            requests.ConnectionError("reset"),
+            FakeResponse(503, headers={"Retry-After": "2"}),
+            FakeResponse(200, body, wire=7),
+        ],
+        max_retries=3,
+        backoff=0.5,
+    )
+    result = f.get("https://casino.example/")
+    assert result.content == body
+    assert result.attempts == 3
+    assert result.wire_bytes == 7
+    assert 0 <= sleeps[0] <= 0.5 and sleeps[1] == 2
+
+
+def test_gives_up_after_max_retries(monkeypatch):
+    f, _ = make_fetcher(
+        monkeypatch, [FakeResponse(500), FakeResponse(500)], max_retries=1
+    )
+    with pytest.raises(requests.HTTPError):
+        f.get("https://casino.example/")
+
+
+def test_caps_response_size(monkeypatch):
+    f, _ = make_fetcher(monkeypatch, [FakeResponse(200, b"x" * 100)], max_bytes=10)
+    with pytest.raises(ResponseTooLarge):
+        f.get("https://casino.example/")
+
+
+def test_advertises_compression():
+    assert "gzip" in Fetcher().session.headers["Accept-Encoding"]
+
+
+def test_declared_charset_is_only_the_one_of_the_content_type():
+    assert (
+        declared_charset({"Content-Type": "text/html; charset=ISO-8859-1"})
+        == "iso8859-1"
+    )
+    assert declared_charset({"Content-Type": 'text/html; charset="utf-8"'}) == "utf-8"
+    assert declared_charset({"Content-Type": "text/html"}) is None
+    assert declared_charset({"Content-Type": "text/html; charset=bogus"}) is None
+    assert declared_charset({}) is None
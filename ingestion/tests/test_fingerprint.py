@@ -0,0 +1,61 @@
+from ingestion.fingerprint import content_hash, identity_key, stamp
+
+
+def make_event(**overrides):
+    event = {
+        "source_name": "demo",
+        "source_url": "https://casino.example/agenda",
+        "title": "Main Event",
+        "description": None,
+        "start": "2025-10-01T19:30:00",
+        "end": None,
+        "buy_in": "150",
+        "variant": None,
+        "venue_name": "Casino Test",
+        "address": None,
+        "city": "Lyon",
+    }
+    event.update(overrides)
+    return event
+
+
+def test_hash_does_not_depend_on_key_order():
+    event = make_event(status="scheduled")
+    reordered = dict(reversed(list(event.items())))
+    assert content_hash(event) == content_hash(reordered)
+    assert identity_key(event) == identity_key(reordered)
+
+
+def test_identity_survives_content_change():
+    before = stamp(make_event())
+    after = stamp(make_event(buy_in="200"))
+    assert before["source_id"] == after["source_id"]
+    assert before["source_hash"] != after["source_hash"]
+
+
+def test_identity_survives_title_and_start_change_with_an_external_id():
+    before = stamp(make_event(external_id="evt-42"))
+    after = stamp(
+        make_event(
+            external_id="evt-42", title="Main Event 150", start="2025-10-01T20:00:00"
+        )
+    )
+    assert before["source_id"] == after["source_id"]
+    assert before["source_hash"] != after["source_hash"]
+    assert stamp(make_event(external_id="evt-43"))["source_id"] != before["source_id"]
+
+
+def test_events_without_external_id_are_told_apart_by_title_and_start():
+    main, turbo = stamp(make_event()), stamp(make_event(title="Turbo"))
+    assert main["source_id"] != turbo["source_id"]
+
+
+def test_none_and_empty_string_differ():
+    assert content_hash(make_event(description=None)) != content_hash(
+        make_event(description="")
+    )
+
+
+def test_restamping_is_stable():
+    event = stamp(make_event())
+    assert stamp(dict(event)) == event
@@ -0,0 +1,52 @@
+import pytest
+
+from ingestion import formats
+
+EVENTS = [
+    {
+        "source_name": "demo",
+        "title": "Main Event",
+        "start": "2025-10-01T20:00:00",
+        "buy_in": None,
+        "source_hash": "h1",
+    },
+    {"source_name": "demo", "title": "Turbo €", "change": "new", "rank": 3},
+    {"source_name": "demo", "source_id": "k", "source_hash": "h2", "change": "removed"},
+]
+
+
+def normalised(events):
+    # Arrow files return every raw event field, absent ones as None.
+    return [{k: v for k, v in ev.items() if v is not None} for ev in events]
+
+
+@pytest.mark.parametrize("fmt", formats.available_formats())
+def test_round_trip_and_sniffing(tmp_path, fmt):
+    path = tmp_path / formats.filename("events", fmt)
+    with formats.open_writer(path, fmt) as writer:
+        for ev in EVENTS:
+            writer.write(ev)
+    assert formats.sniff_format(path) == fmt
+    assert normalised(formats.read_events(path)) == normalised(EVENTS)
+
+
+@pytest.mark.parametrize("fmt", formats.available_formats())
+def test_concat_mixes_formats(tmp_path, fmt):
+    parts = []
+    for i, part_fmt in enumerate(formats.available_formats()):
+        path = tmp_path / formats.filename(f"part{i}", part_fmt)
+        with formats.open_writer(path, part_fmt) as writer:
+            writer.write(EVENTS[0])
+        parts.append(path)
+    output = tmp_path / formats.filename("out", fmt)
+    formats.concat(parts, output, fmt)
+    assert formats.sniff_format(output) == fmt
+    assert normalised(formats.read_events(output)) == normalised(
+        [EVENTS[0]] * len(parts)
+    )
+
+
+def test_jsonl_is_the_default_and_binary_formats_are_opt_in():
+    assert formats.resolve_format(None) == "jsonl"
+    fastest = [f for f in formats.AUTO_ORDER if f in formats.available_formats()][0]
+    assert formats.resolve_format("auto") == fastest
@@ -1,5 +1,6 @@
 from pathlib import Path
 
+from ingestion import html_backends
 from ingestion.html_ingestor import HtmlIngestor
 
 
@@ -15,3 +16,66 @@ def test_html_ingestor_parses_events(tmp_path):
         assert ev["title"]
         assert ev["venue_name"] is not None
         assert ev["source_hash"]
+
+
+def test_html_backends_extract_identical_events():
+    fixture_path = Path(__file__).parent / "fixtures" / "demo_html.html"
+    page = fixture_path.read_bytes()
+    results = []
+    for backend in html_backends.available_backends():
+        ingestor = HtmlIngestor("https://casino.example/", "test_html", parser=backend)
+        results.append(list(ingestor.extract(page)))
+    assert all(r == results[0] for r in results)
+    assert results[0][0]["title"] == "Deepstack Demo"
+    assert results[0][0]["buy_in"] == "100"
+
+
+def test_html_backends_decode_pages_without_meta_charset():
+    fixture_path = Path(__file__).parent / "fixtures" / "accents_no_charset.html"
+    page = fixture_path.read_bytes()
+    # UTF-8 detected from the bytes, then Latin-1 declared by the response.
+    for content, encoding in (
+        (page, None),
+        (page.decode("utf-8").encode("cp1252"), "cp1252"),
+    ):
+        results = []
+        for backend in html_backends.available_backends():
+            ingestor = HtmlIngestor(
+                "https://casino.example/", "test_html", parser=backend
+            )
+            results.append(list(ingestor.extract(content, encoding)))
+        assert all(r == results[0] for r in results)
+        assert results[0][0]["title"] == "Tournoi Barrière Évian"
+        assert results[0][0]["venue_name"] == "Casino d'Évian"
+
+
+def test_html_ingestor_uses_custom_selectors():
+    page = b"""<table><tr class="row"><td class="t">Main Event</td><td class="d">2025-10-01 19:30</td>
+        <td class="c">Lyon</td></tr></table>"""
+    ingestor = HtmlIngestor(
+        "https://casino.example/",
+        "test_html",
+        selectors={"item": "tr.row", "title": ".t", "date": ".d", "city": ".c"},
+        date_format="%Y-%m-%d %H:%M",
+    )
+    (event,) = ingestor.extract(page)
+    assert event["title"] == "Main Event"
+    assert event["start"] == "2025-10-01T19:30:00"
+    assert event["city"] == "Lyon"
+
+
+def test_html_backends_match_selectors_with_html_rules():
+    page = b"""<div class="event-item" data-kind="mtt"><h2 class="event-title">Main Event</h2>
+        <span class="event-date">2025-10-01 19:30</span></div>"""
+    selectors = {
+        "item": "DIV.event-item[Data-Kind=mtt]",
+        "title": "H2",
+        "date": ".event-date",
+    }
+    results = []
+    for backend in html_backends.available_backends():
+        ingestor = HtmlIngestor(
+            "https://casino.example/", "test_html", selectors=selectors, parser=backend
+        )
+        results.append([event["title"] for event in ingestor.extract(page)])
+    assert results == [["Main Event"]] * len(results)
@@ -0,0 +1,77 @@
+from pathlib import Path
+
+from ingestion.fetcher import FetchResult
+from ingestion.formats import read_events
+from ingestion.html_ingestor import HtmlIngestor
+from ingestion.http_cache import HttpCache
+from ingestion.runner import write_source
+
+PAGE = (Path(__file__).parent / "fixtures" / "demo_html.html").read_bytes()
+
+
+class FakeFetcher:
+    def __init__(self):
+        self.sent_headers = []
+
+    def get(self, url, headers=None):
+        self.sent_headers.append(headers or {})
+        if headers and headers.get("If-None-Match") == '"v1"':
+            return FetchResult(url, 304, b"", {}, 0.01, 0, 1)
+        return FetchResult(url, 200, PAGE, {"ETag": '"v1"'}, 0.01, len(PAGE), 1)
+
+
+def test_not_modified_replays_cached_events(tmp_path, monkeypatch):
+    fetcher = FakeFetcher()
+    monkeypatch.setattr("ingestion.html_ingestor.get_fetcher", lambda: fetcher)
+    cache = HttpCache(str(tmp_path / "cache"))
+    source = {
+        "name": "demo_html",
+        "type": "html",
+        "url": "https://casino.example/agenda",
+    }
+
+    first_stats, second_stats = {}, {}
+    first = write_source(
+        source, tmp_path / "first.jsonl", cache=cache, stats=first_stats
+    )
+    second = write_source(
+        source, tmp_path / "second.jsonl", cache=cache, stats=second_stats
+    )
+
+    assert fetcher.sent_headers[1] == {"If-None-Match": '"v1"'}
+    assert first == second == 2
+    assert list(read_events(tmp_path / "first.jsonl")) == list(
+        read_events(tmp_path / "second.jsonl")
+    )
+    assert (
+        first_stats["cache_hits"],
+        first_stats["cache_misses"],
+        first_stats["replayed"],
+    ) == (0, 1, False)
+    assert (
+        second_stats["cache_hits"],
+        second_stats["cache_misses"],
+        second_stats["replayed"],
+    ) == (1, 0, True)
+    assert first_stats["bytes"] == len(PAGE)
+
+
+def test_not_modified_without_events_reparses_cached_body(tmp_path):
+    cache = HttpCache(str(tmp_path))
+    url = "https://casino.example/agenda"
+    cache.store_response(url, '"v1"', None, PAGE)
+    events = list(
+        HtmlIngestor(url, "demo_html", cache=cache, fetcher=FakeFetcher()).parse()
+    )
+    assert len(events) == 2
+
+
+def test_cached_body_is_decoded_with_its_declared_charset(tmp_path):
+    cache = HttpCache(str(tmp_path))
+    url = "https://casino.example/agenda"
+    page = PAGE.replace(b"Deepstack Demo", "Deepstack Évian".encode("cp1252"))
+    cache.store_response(url, '"v1"', None, page, "cp1252")
+    ingestor = HtmlIngestor(url, "demo_html", cache=cache, fetcher=FakeFetcher())
+    events = list(ingestor.parse())
+    assert ingestor.encoding == "cp1252"
+    assert events[0]["title"] == "Deepstack Évian"
@@ -0,0 +1,94 @@
+from datetime import datetime
+from pathlib import Path
+
+from ingestion import ics_ingestor
+from ingestion.ics_ingestor import IcsIngestor, unfold
+
+FIXTURE = Path(__file__).parent / "fixtures" / "demo_calendar.ics"
+
+
+class FrozenDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return datetime(2025, 9, 8, 12, 0, tzinfo=tz)
+
+
+def test_unfold_joins_continuation_lines():
+    assert list(unfold(["SUMMARY:Main\r\n", "  Event\r\n", "END:VEVENT\r\n"])) == [
+        "SUMMARY:Main Event",
+        "END:VEVENT",
+    ]
+
+
+def test_streaming_parser_expands_recurrences_within_horizon(monkeypatch):
+    monkeypatch.setattr(ics_ingestor, "datetime", FrozenDatetime)
+    events = list(
+        IcsIngestor(FIXTURE.as_posix(), "casino_demo", horizon_days=21).parse()
+    )
+
+    main = events[0]
+    assert main["title"] == "Main Event"
+    assert main["description"] == "Buy-in 150 €, structure 40 min\nRe-entry illimitée"
+    assert main["start"] == "2025-09-27T19:00:00+02:00"
+
+    weekly = [e["start"] for e in events[1:]]
+    # 2025-09-02 is before "now" and 2025-09-16 is excluded by EXDATE.
+    assert weekly == ["2025-09-09T20:00:00+02:00", "2025-09-23T20:00:00+02:00"]
+    assert events[1]["end"] == "2025-09-10T01:00:00+02:00"
+    assert len({e["source_id"] for e in events}) == len(events)
+
+
+def test_overridden_occurrences_replace_expanded_ones(monkeypatch, tmp_path):
+    monkeypatch.setattr(ics_ingestor, "datetime", FrozenDatetime)
+    path = tmp_path / "calendar.ics"
+    path.write_text(
+        "\n".join(
+            [
+                "BEGIN:VCALENDAR",
+                # An override may come before its recurring event, here with a UTC RECURRENCE-ID.
+                "BEGIN:VEVENT",
+                "UID:weekly@casino-demo",
+                "RECURRENCE-ID:20250923T180000Z",
+                "SUMMARY:Deepstack du mardi (spécial)",
+                "DTSTART;TZID=Europe/Paris:20250923T203000",
+                "END:VEVENT",
+                "BEGIN:VEVENT",
+                "UID:weekly@casino-demo",
+                "SUMMARY:Deepstack du mardi",
+                "DTSTART;TZID=Europe/Paris:20250909T200000",
+                "RRULE:FREQ=WEEKLY;BYDAY=TU;COUNT=4",
+                "END:VEVENT",
+                "BEGIN:VEVENT",
+                "UID:weekly@casino-demo",
+                "RECURRENCE-ID;TZID=Europe/Paris:20250916T200000",
+                "SUMMARY:Deepstack du mardi",
+                "DTSTART;TZID=Europe/Paris:20250916T210000",
+                "END:VEVENT",
+                "BEGIN:VEVENT",
+                "UID:other@casino-demo",
+                "RECURRENCE-ID;TZID=Europe/Paris:20250930T200000",
+                "SUMMARY:Unrelated override",
+                "DTSTART;TZID=Europe/Paris:20250930T200000",
+                "END:VEVENT",
+                "END:VCALENDAR",
+            ]
+        ),
+        encoding="utf-8",
+    )
+    events = list(IcsIngestor(path.as_posix(), "casino_demo", horizon_days=60).parse())
+    starts = sorted(e["start"] for e in events if e["title"].startswith("Deepstack"))
+    assert starts == [
+        "2025-09-09T20:00:00+02:00",
+        "2025-09-16T21:00:00+02:00",
+        "2025-09-23T20:30:00+02:00",
+        "2025-09-30T20:00:00+02:00",
+    ]
+    # Overrides keep the id of the occurrence they replace, in UTC.
+    ids = {
+        e["start"]: e["external_id"]
+        for e in events
+        if e["title"].startswith("Deepstack")
+    }
+    assert ids["2025-09-16T21:00:00+02:00"] == "weekly@casino-demo/20250916T180000"
+    assert ids["2025-09-23T20:30:00+02:00"] == "weekly@casino-demo/20250923T180000"
+    assert ids["2025-09-30T20:00:00+02:00"] == "weekly@casino-demo/20250930T180000"
@@ -0,0 +1,41 @@
+from pathlib import Path
+
+from ingestion import runner
+from ingestion.formats import read_events
+from ingestion.parse_pool import ParsePool
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def test_pooled_parsing_matches_in_thread_parsing(tmp_path):
+    sources = [
+        {
+            "name": "demo_rss",
+            "type": "rss",
+            "url": (FIXTURES / "demo_rss.xml").as_posix(),
+        },
+        {
+            "name": "demo_html",
+            "type": "html",
+            "url": "https://casino.example/agenda",
+            "parser": "html.parser",
+        },
+    ]
+    body = (FIXTURES / "demo_html.html").read_bytes()
+    expected = list(runner.build_ingestor(sources[0]).parse()) + list(
+        runner.build_ingestor(sources[1]).extract(body)
+    )
+
+    with ParsePool(workers=1, queue_size=0) as pool:
+        events = runner.extract_events(
+            sources[0], (FIXTURES / "demo_rss.xml").read_bytes()
+        )
+        html_events, waited, busy = pool.run(runner.extract_events, sources[1], body)
+        stats = {}
+        path = tmp_path / "demo_rss.jsonl"
+        runner.write_source(sources[0], path, stats=stats, fmt="jsonl", parse_pool=pool)
+
+    assert events + html_events == expected
+    assert busy > 0 and waited >= 0
+    assert list(read_events(path)) == expected[: len(events)]
+    assert stats["parse_seconds"] > 0
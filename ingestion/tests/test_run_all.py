@@ -0,0 +1,172 @@
+import threading
+import time
+
+from ingestion import run_all, runner
+from ingestion.formats import read_events
+from ingestion.state import StateStore
+
+
+def test_run_sources_keeps_catalog_order_and_limits_hosts(tmp_path, monkeypatch):
+    lock = threading.Lock()
+    in_flight = {"n": 0, "max": 0}
+
+    def fake_run_source(source, **kwargs):
+        with lock:
+            in_flight["n"] += 1
+            in_flight["max"] = max(in_flight["max"], in_flight["n"])
+        time.sleep(source["delay"])
+        with lock:
+            in_flight["n"] -= 1
+        if source["name"] == "broken":
+            raise ValueError("boom")
+        return [{"title": source["name"]}]
+
+    monkeypatch.setattr(runner, "run_source", fake_run_source)
+    sources = [
+        {"name": "slow", "url": "https://casino.example/a", "delay": 0.2},
+        {"name": "fast", "url": "https://casino.example/b", "delay": 0.0},
+        {"name": "broken", "url": "https://casino.example/c", "delay": 0.0},
+    ]
+    results = runner.run_sources(
+        sources, tmp_path, max_workers=4, per_host_limit=1, timeout=5
+    )
+    assert list(results) == ["slow", "fast", "broken"]
+    assert results["slow"]["events"] == 1
+    assert results["broken"]["status"] == "error"
+    assert in_flight["max"] == 1
+
+    output = tmp_path / "raw_events.jsonl"
+    run_all.assemble_output(
+        [r["path"] for r in results.values() if r["status"] == "ok"], output
+    )
+    assert [ev["title"] for ev in read_events(output)] == ["slow", "fast"]
+
+
+def test_run_sources_times_out_slow_source(tmp_path, monkeypatch):
+    def fake_run_source(source, **kwargs):
+        time.sleep(source["delay"])
+        return []
+
+    monkeypatch.setattr(runner, "run_source", fake_run_source)
+    sources = [
+        {"name": "stuck", "url": "https://a.example/", "delay": 2},
+        {"name": "ok", "url": "https://b.example/", "delay": 0},
+    ]
+    results = runner.run_sources(
+        sources, tmp_path, max_workers=2, per_host_limit=1, timeout=0.2
+    )
+    assert results["stuck"]["status"] == "timeout"
+    assert results["ok"]["status"] == "ok"
+
+
+def test_write_source_leaves_no_partial_file_on_crash(tmp_path, monkeypatch):
+    def crashing_run_source(source, **kwargs):
+        yield {"title": "first"}
+        raise RuntimeError("parser crashed")
+
+    path = tmp_path / "demo.jsonl"
+    path.write_text('{"title": "previous run"}\n', encoding="utf-8")
+    monkeypatch.setattr(runner, "run_source", crashing_run_source)
+    try:
+        runner.write_source({"name": "demo", "type": "csv"}, path)
+    except RuntimeError:
+        pass
+    assert path.read_text(encoding="utf-8") == '{"title": "previous run"}\n'
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_run_sources_passes_events_to_sink(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        runner,
+        "run_source",
+        lambda source, **kwargs: [{"title": source["name"] + str(i)} for i in range(2)],
+    )
+    seen = []
+    lock = threading.Lock()
+
+    def sink(event):
+        with lock:
+            seen.append(event["title"])
+
+    sources = [
+        {"name": "a", "url": "https://a.example/"},
+        {"name": "b", "url": "https://b.example/"},
+    ]
+    results = runner.run_sources(sources, tmp_path, max_workers=2, timeout=5, sink=sink)
+    assert sorted(seen) == ["a0", "a1", "b0", "b1"]
+    assert [ev["title"] for ev in read_events(results["a"]["path"])] == ["a0", "a1"]
+
+
+def test_run_sources_keeps_sources_sharing_a_name_apart(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        runner, "run_source", lambda source, **kwargs: [{"title": source["url"]}]
+    )
+    sources = [
+        {"name": "club", "url": "https://a.example/"},
+        {"name": "club", "url": "https://b.example/"},
+        {"name": "other", "key": "club#2", "url": "https://c.example/"},
+    ]
+    results = runner.run_sources(sources, tmp_path, max_workers=2, timeout=5)
+    assert list(results) == ["club", "club#3", "club#2"]
+    assert [next(read_events(r["path"]))["title"] for r in results.values()] == [
+        s["url"] for s in sources
+    ]
+
+
+def test_timed_out_source_keeps_its_slot_until_it_stops(tmp_path, monkeypatch):
+    started = {}
+    lock = threading.Lock()
+
+    def fake_run_source(source, **kwargs):
+        with lock:
+            started[source["name"]] = time.monotonic()
+        for i in range(source["events"]):
+            time.sleep(0.05)
+            yield {"title": f"{source['name']}{i}", "source_hash": str(i)}
+
+    monkeypatch.setattr(runner, "run_source", fake_run_source)
+    state = StateStore(str(tmp_path / "state.sqlite"))
+    seen = []
+    sources = [
+        {"name": "slow", "url": "https://casino.example/a", "events": 10},
+        {"name": "next", "url": "https://casino.example/b", "events": 1},
+    ]
+    start = time.monotonic()
+    results = runner.run_sources(
+        sources,
+        tmp_path,
+        per_host_limit=1,
+        timeout=0.12,
+        state=state,
+        sink=lambda ev: seen.append(ev["title"]),
+        grace=5,
+    )
+    assert results["slow"]["status"] == "timeout" and results["next"]["status"] == "ok"
+    # "next" waited for the cancelled worker to stop, which it did at its next event.
+    assert 0.12 <= started["next"] - start < 1
+    assert not results["slow"]["path"].exists()
+    assert state.load("slow") == {} and len(state.load("next")) == 1
+    assert 0 < len([title for title in seen if title.startswith("slow")]) < 10
+    state.close()
+
+
+def test_stuck_source_is_abandoned_after_grace(tmp_path, monkeypatch):
+    release = threading.Event()
+
+    def fake_run_source(source, **kwargs):
+        if source["name"] == "stuck":
+            release.wait(5)
+        return [{"title": source["name"]}]
+
+    monkeypatch.setattr(runner, "run_source", fake_run_source)
+    sources = [
+        {"name": "stuck", "url": "https://casino.example/a"},
+        {"name": "next", "url": "https://casino.example/b"},
+    ]
+    try:
+        results = runner.run_sources(
+            sources, tmp_path, per_host_limit=1, timeout=0.1, grace=0.1
+        )
+    finally:
+        release.set()
+    assert results["stuck"]["status"] == "timeout" and results["next"]["status"] == "ok"
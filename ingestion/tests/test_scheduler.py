@@ -0,0 +1,70 @@
+import pytest
+
+from ingestion import runner, scheduler
+from ingestion.formats import read_events
+from ingestion.scheduler import Scheduler, parse_interval
+from ingestion.state import StateStore
+
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_parse_interval():
+    assert parse_interval(90) == 90
+    assert parse_interval("15m") == 900
+    assert parse_interval("6h") == 6 * 3600
+    assert parse_interval("2d") == 2 * 86400
+    with pytest.raises(ValueError):
+        parse_interval("soon")
+
+
+def test_sources_refresh_on_their_own_intervals_with_backoff(tmp_path, monkeypatch):
+    calls = []
+    failing = {"csv"}
+
+    def fake_run_source(source, **kwargs):
+        calls.append(source["name"])
+        if source["name"] in failing:
+            raise ValueError("boom")
+        return [{"title": source["name"]}]
+
+    monkeypatch.setattr(runner, "run_source", fake_run_source)
+    monkeypatch.setattr(scheduler, "FAILURE_BACKOFF_SECONDS", 60)
+    sources = [
+        {"name": "rss", "url": "https://a.example/rss", "refresh_interval": "15m"},
+        {
+            "name": "csv",
+            "url": "https://b.example/export.csv",
+            "refresh_interval": "1d",
+        },
+    ]
+    clock = FakeClock()
+    state = StateStore(str(tmp_path / "state.sqlite"))
+    sched = Scheduler(sources, tmp_path, cache=None, state=state, jitter=0, clock=clock)
+
+    results = sched.run_due()
+    assert [r["status"] for r in results.values()] == ["ok", "error"]
+    assert [ev["title"] for ev in read_events(sched.output_file)] == ["rss"]
+
+    # The failing CSV is retried after 60s, then 120s; the feed every 15 minutes.
+    clock.now += 60
+    sched.run_due()
+    clock.now += 120
+    failing.clear()
+    sched.run_due()
+    assert sorted(calls[:2]) == ["csv", "rss"] and calls[2:] == ["csv", "csv"]
+    clock.now += 900 - 180
+    sched.run_due()
+    assert calls[-1] == "rss"
+    assert [ev["title"] for ev in read_events(sched.output_file)] == ["rss", "csv"]
+
+    # A restarted scheduler resumes from the persisted next-due times.
+    restarted = Scheduler(sources, tmp_path, state=state, jitter=0, clock=clock)
+    assert restarted.next_due() == clock.now + 900
+    assert restarted.run_due() == {}
+    state.close()
@@ -0,0 +1,99 @@
+from ingestion import runner
+from ingestion.formats import read_events
+from ingestion.state import StateStore, read_run, write_run
+
+
+def test_write_source_emits_delta_against_previous_run(tmp_path, monkeypatch):
+    runs = [
+        [
+            {
+                "source_url": "u",
+                "title": "Main Event",
+                "start": "2025-10-01",
+                "source_hash": "h1",
+            },
+            {
+                "source_url": "u",
+                "title": "Side Event",
+                "start": "2025-10-02",
+                "source_hash": "h2",
+            },
+        ],
+        [
+            {
+                "source_url": "u",
+                "title": "Main Event",
+                "start": "2025-10-01",
+                "source_hash": "h1-bis",
+            },
+            {
+                "source_url": "u",
+                "title": "Turbo",
+                "start": "2025-10-03",
+                "source_hash": "h3",
+            },
+        ],
+    ]
+    monkeypatch.setattr(runner, "run_source", lambda source, **kw: iter(runs.pop(0)))
+    state = StateStore(str(tmp_path / "state.sqlite"))
+    source = {"name": "demo", "type": "csv"}
+    path = tmp_path / "demo.jsonl"
+
+    first = {}
+    runner.write_source(source, path, stats=first, state=state)
+    assert (first["new"], first["changed"], first["removed"]) == (2, 0, 0)
+
+    second = {}
+    runner.write_source(source, path, stats=second, state=state)
+    assert (
+        second["new"],
+        second["changed"],
+        second["unchanged"],
+        second["removed"],
+    ) == (1, 1, 0, 1)
+    delta = list(read_events(runner.delta_path_for(path)))
+    assert [(d["change"], d["source_hash"]) for d in delta] == [
+        ("changed", "h1-bis"),
+        ("new", "h3"),
+        ("removed", "h2"),
+    ]
+    assert len(list(read_events(path))) == 2
+
+
+def test_state_advances_only_once_the_run_is_acknowledged(tmp_path, monkeypatch):
+    runs = [
+        [
+            {"title": "Main Event", "source_hash": "h1"},
+            {"title": "Side Event", "source_hash": "h2"},
+        ],
+        [{"title": "Main Event", "source_hash": "h1-bis"}],
+        [{"title": "Main Event", "source_hash": "h1-bis"}],
+    ]
+    monkeypatch.setattr(runner, "run_source", lambda source, **kw: iter(runs.pop(0)))
+    state = StateStore(str(tmp_path / "state.sqlite"))
+    source = {"name": "demo", "type": "csv"}
+    path = tmp_path / "demo.jsonl"
+
+    runner.write_source(source, path, state=state, run_id="r1")
+    # The delta of r1 was never normalised: r2 is still compared with the empty state.
+    second = {}
+    runner.write_source(source, path, stats=second, state=state, run_id="r2")
+    assert (second["new"], second["removed"]) == (1, 0)
+    assert state.acknowledge("r1") == 0
+    assert state.acknowledge("r2") == 1
+    assert len(state.load("demo")) == 1
+
+    third = {}
+    runner.write_source(source, path, stats=third, state=state, run_id="r3")
+    assert (third["new"], third["unchanged"]) == (0, 1)
+    state.close()
+
+
+def test_run_marker_applies_to_the_file_it_was_written_for(tmp_path):
+    output = tmp_path / "raw_events.delta.jsonl"
+    output.write_text('{"title": "Main Event"}\n', encoding="utf-8")
+    write_run(output, "r1")
+    assert read_run(output) == "r1"
+    output.write_text('{"title": "Main Event"}\n{"title": "Turbo"}\n', encoding="utf-8")
+    assert read_run(output) is None
+    assert read_run(tmp_path / "missing.jsonl") is None
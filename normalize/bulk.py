@@ -0,0 +1,350 @@
+"""
+Set-based bulk writer for normalised events.
+
+The per-row path of `normalizer.py` needs one or two round-trips per event
+(`upsert_venue` then `upsert_tournament`); against a remote Postgres the
+network latency dominates the run. `BulkWriter` instead buffers normalised
+rows and, every ``batch_size`` events (`NORMALIZE_BATCH_SIZE`):
+
+1. matches the batch with the tournaments already stored for its sources,
+   which are updated in place (see `matching`), and deletes the duplicates
+   this merges;
+2. COPYs the batch into a temporary staging table;
+3. inserts the venues of the batch that do not exist yet, in one statement;
+4. resolves the venue id of the rows staged without one, with one
+   UPDATE ... FROM;
+5. merges the tournaments with one INSERT ... ON CONFLICT DO UPDATE, which
+   leaves alone the tournaments whose ``source_hash`` has not changed (nor
+   their status, so a cancelled tournament listed again is rescheduled);
+6. applies the tombstones of the batch (see `matching.remove_tournament`).
+
+That is a handful of statements per batch instead of two per event. With a
+`VenueResolver`, known venue ids (including those of venues matched under
+another spelling) are filled in before the COPY and the venues created in
+step 3 are added to the resolver, so steps 3 and 4 are skipped altogether for
+batches of already known venues; variants of a new venue's name are staged
+under the first one, so that the venue is created once. Venues
+have no unique constraint to conflict on, so step 3 is an
+INSERT ... SELECT ... WHERE NOT EXISTS; unlike the per-row lookup it matches
+a NULL city to an existing venue with a NULL city. When an event appears
+several times in a batch the last occurrence wins, as with the per-row path.
+
+Unchanged tournaments are not rewritten at all (no dead tuple, no WAL, and
+``updated_at`` keeps the time of the last real change); the merge reports
+how many rows it inserted, updated and left unchanged, told apart with
+``xmax = 0`` (true for rows the statement inserted).
+
+COPY goes through the DB-API driver (psycopg2 ``copy_expert`` or psycopg 3
+``cursor.copy``); other drivers fall back to a multi-row INSERT into the
+staging table.
+"""
+from __future__ import annotations
+
+import csv
+import io
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from .dedup import event_origins
+from .matching import (
+    DELETE_STORED_SQL,
+    array_literal,
+    match_stored,
+    remove_tournament,
+    source_ids,
+)
+from .venues import VenueResolver
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = int(os.environ.get("NORMALIZE_BATCH_SIZE", "5000"))
+
+STAGING_COLUMNS = (
+    "seq",
+    "venue_name",
+    "address",
+    "city",
+    "department",
+    "region",
+    "lat",
+    "lon",
+    "title",
+    "description",
+    "start_datetime_local",
+    "end_datetime_local",
+    "timezone",
+    "buy_in_cents",
+    "currency",
+    "variant",
+    "status",
+    "source_url",
+    "source_hash",
+    "source_ids",
+    "origins",
+    "venue_id",
+)
+
+CREATE_STAGING_SQL = """
+CREATE TEMP TABLE IF NOT EXISTS staging_events (
+    seq INTEGER NOT NULL,
+    venue_name TEXT NOT NULL,
+    address TEXT,
+    city TEXT,
+    department TEXT,
+    region TEXT,
+    lat DOUBLE PRECISION,
+    lon DOUBLE PRECISION,
+    title TEXT NOT NULL,
+    description TEXT,
+    start_datetime_local TIMESTAMPTZ NOT NULL,
+    end_datetime_local TIMESTAMPTZ,
+    timezone TEXT,
+    buy_in_cents INTEGER,
+    currency TEXT,
+    variant TEXT,
+    status TEXT,
+    source_url TEXT,
+    source_hash TEXT,
+    source_ids TEXT[],
+    origins TEXT,
+    venue_id INTEGER
+)
+"""
+
+INSERT_VENUES_SQL = """
+INSERT INTO venues (name, address, city, department, region, latitude, longitude, geom)
+SELECT DISTINCT ON (s.venue_name, s.city)
+       s.venue_name, s.address, s.city, s.department, s.region, s.lat, s.lon,
+       CASE WHEN s.lat IS NOT NULL AND s.lon IS NOT NULL
+            THEN ST_SetSRID(ST_MakePoint(s.lon, s.lat), 4326) END
+FROM staging_events s
+WHERE s.venue_id IS NULL AND NOT EXISTS (
+    SELECT 1 FROM venues v WHERE v.name = s.venue_name AND v.city IS NOT DISTINCT FROM s.city
+)
+ORDER BY s.venue_name, s.city, s.seq
+RETURNING id, name, city, address, latitude, longitude
+"""
+
+RESOLVE_VENUES_SQL = """
+UPDATE staging_events s
+SET venue_id = v.id
+FROM (SELECT name, city, MIN(id) AS id FROM venues GROUP BY name, city) v
+WHERE s.venue_id IS NULL AND v.name = s.venue_name AND v.city IS NOT DISTINCT FROM s.city
+"""
+
+MERGE_TOURNAMENTS_SQL = """
+WITH batch AS (
+    SELECT DISTINCT ON (venue_id, title, start_datetime_local)
+           venue_id, title, description, start_datetime_local, end_datetime_local, timezone, buy_in_cents,
+           currency, variant, status::event_status AS status, source_url, source_hash, source_ids, origins::jsonb AS origins
+    FROM staging_events
+    ORDER BY venue_id, title, start_datetime_local, seq DESC
+), merged AS (
+    INSERT INTO tournaments (venue_id, title, description, start_datetime_local, end_datetime_local, timezone, buy_in_cents, currency, variant, status, source_url, source_hash, source_ids, origins)
+    SELECT * FROM batch
+    ON CONFLICT (venue_id, title, start_datetime_local) DO UPDATE
+    SET description = EXCLUDED.description,
+        end_datetime_local = EXCLUDED.end_datetime_local,
+        buy_in_cents = EXCLUDED.buy_in_cents,
+        variant = EXCLUDED.variant,
+        status = EXCLUDED.status,
+        source_url = EXCLUDED.source_url,
+        source_hash = EXCLUDED.source_hash,
+        source_ids = EXCLUDED.source_ids,
+        origins = EXCLUDED.origins,
+        updated_at = NOW()
+    WHERE tournaments.source_hash IS DISTINCT FROM EXCLUDED.source_hash
+       OR tournaments.status IS DISTINCT FROM EXCLUDED.status
+    RETURNING (xmax = 0) AS inserted
+)
+SELECT (SELECT COUNT(*) FROM batch) AS total,
+       COUNT(*) FILTER (WHERE inserted) AS inserted,
+       COUNT(*) FILTER (WHERE NOT inserted) AS updated
+FROM merged
+"""
+
+COPY_SQL = f"COPY staging_events ({', '.join(STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+
+
+def _csv_value(value) -> str:
+    if value is None:
+        return "\\N"
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+class BulkWriter:
+    """Buffers normalised events and writes them to Postgres batch by batch."""
+
+    def __init__(
+        self,
+        conn,
+        batch_size: int = BATCH_SIZE,
+        resolver: Optional[VenueResolver] = None,
+    ) -> None:
+        """
+        :param conn: SQLAlchemy connection inside an open transaction.
+        :param batch_size: events per COPY/merge round.
+        :param resolver: venue map shared with the rest of the run, if any.
+        """
+        self.conn = conn
+        self.batch_size = max(1, batch_size)
+        self.resolver = resolver
+        self._pending: List[Tuple[Dict, Dict, Optional[int]]] = []
+        self._tombstones: List[Dict] = []
+        self._seq = 0
+        self._staging_ready = False
+        self.stats: Dict[str, float] = {
+            "events": 0,
+            "batches": 0,
+            "venues_inserted": 0,
+            "duplicates_deleted": 0,
+            "inserted": 0,
+            "updated": 0,
+            "unchanged": 0,
+            "cancelled": 0,
+            "copy_seconds": 0.0,
+            "merge_seconds": 0.0,
+        }
+
+    def add(self, venue: Dict, event: Dict) -> Optional[int]:
+        """Queue one event and the venue fields it belongs to.
+
+        ``venue`` holds name, address, city, department, region, lat and lon;
+        ``event`` is the output of `normalize_event`. Returns the venue's
+        reference in the resolver (see `VenueResolver.stage`), if any.
+        """
+        ref = venue_id = None
+        if self.resolver is not None:
+            # Variants of a known venue's name get its id; those of a new venue its first name.
+            ref, venue = self.resolver.stage(venue)
+            venue_id = ref if ref >= 0 else None
+        self._pending.append((venue, event, venue_id))
+        if len(self._pending) + len(self._tombstones) >= self.batch_size:
+            self.flush()
+        return ref
+
+    def remove(self, tombstone: Dict) -> None:
+        """Queue the tombstone of a raw event removed from its source."""
+        self._tombstones.append(tombstone)
+        if len(self._pending) + len(self._tombstones) >= self.batch_size:
+            self.flush()
+
+    def _row(self, venue: Dict, event: Dict, venue_id: Optional[int]) -> tuple:
+        self._seq += 1
+        origins = event_origins(event)
+        return (
+            self._seq,
+            venue["name"],
+            venue.get("address"),
+            venue.get("city"),
+            venue.get("department"),
+            venue.get("region"),
+            venue.get("lat"),
+            venue.get("lon"),
+            event["title"],
+            event.get("description"),
+            event["start"],
+            event.get("end"),
+            event.get("timezone", "{{TIMEZONE}}"),
+            event.get("buy_in_cents"),
+            "EUR",
+            event.get("variant"),
+            event.get("status", "scheduled"),
+            event.get("source_url"),
+            event.get("source_hash"),
+            array_literal(source_ids(origins)),
+            json.dumps(origins),
+            venue_id,
+        )
+
+    def flush(self) -> None:
+        """Write the buffered events and tombstones, if any."""
+        if not self._pending and not self._tombstones:
+            return
+        if self._pending:
+            self._write_pending()
+        for tombstone in self._tombstones:
+            self.stats[remove_tournament(self.conn, tombstone)] += 1
+        self.stats["events"] += len(self._pending) + len(self._tombstones)
+        self.stats["batches"] += 1
+        self._pending = []
+        self._tombstones = []
+
+    def _write_pending(self) -> None:
+        if not self._staging_ready:
+            self.conn.execute(text(CREATE_STAGING_SQL))
+            self._staging_ready = True
+        start = time.perf_counter()
+        matched, deleted = match_stored(
+            self.conn, [(event, venue_id) for _, event, venue_id in self._pending]
+        )
+        if deleted:
+            self.conn.execute(text(DELETE_STORED_SQL), {"ids": deleted})
+            self.stats["duplicates_deleted"] += len(deleted)
+        rows = [
+            self._row(venue, *item)
+            for (venue, _, _), item in zip(self._pending, matched)
+            if item is not None
+        ]
+        self._copy(rows)
+        copied = time.perf_counter()
+        if any(row[-1] is None for row in rows):
+            created = self.conn.execute(text(INSERT_VENUES_SQL)).fetchall()
+            if self.resolver is not None:
+                for row in created:
+                    self.resolver.add(
+                        row.name,
+                        row.city,
+                        row.id,
+                        row.latitude,
+                        row.longitude,
+                        row.address,
+                    )
+            self.conn.execute(text(RESOLVE_VENUES_SQL))
+            self.stats["venues_inserted"] += len(created)
+        merged = self.conn.execute(text(MERGE_TOURNAMENTS_SQL)).one()
+        self.stats["inserted"] += merged.inserted
+        self.stats["updated"] += merged.updated
+        self.stats["unchanged"] += merged.total - merged.inserted - merged.updated
+        self.conn.execute(text("TRUNCATE staging_events"))
+        self.stats["copy_seconds"] += copied - start
+        self.stats["merge_seconds"] += time.perf_counter() - copied
+
+    def _copy(self, rows: List[tuple]) -> None:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([_csv_value(v) for v in row])
+        data = buffer.getvalue()
+        cursor = self.conn.connection.cursor()
+        try:
+            if hasattr(cursor, "copy_expert"):  # psycopg2
+                cursor.copy_expert(COPY_SQL, io.StringIO(data))
+            elif hasattr(cursor, "copy"):  # psycopg 3
+                with cursor.copy(COPY_SQL) as copy:
+                    copy.write(data)
+            else:
+                self._insert_staging(rows)
+        finally:
+            cursor.close()
+
+    def _insert_staging(self, rows: List[tuple]) -> None:
+        placeholders = ", ".join(f":{name}" for name in STAGING_COLUMNS)
+        self.conn.execute(
+            text(
+                f"INSERT INTO staging_events ({', '.join(STAGING_COLUMNS)}) VALUES ({placeholders})"
+            ),
+            [dict(zip(STAGING_COLUMNS, row)) for row in rows],
+        )
+
+    def close(self) -> Dict[str, float]:
+        """Flush the last batch and return the writer's stats."""
+        self.flush()
+        return self.stats
@@ -0,0 +1,83 @@
+"""
+Checkpoints of partially normalised input files.
+
+`normalize_and_upsert` commits every `NORMALIZE_COMMIT_SIZE` events instead
+of holding one transaction over the whole file. After each commit it records
+in a `Checkpoint`, next to the input (``raw_events.jsonl.checkpoint``), how
+many raw records of the input are fully written. A run interrupted by a crash
+or a lost connection leaves the checkpoint behind, and the next run on the
+same file skips those records instead of writing them again; a run that
+completes removes it.
+
+The position is a raw record count rather than a byte offset because the
+Arrow and msgpack formats are not line-oriented. The checkpoint also stores
+the size and modification time of the input: when the file has been
+rewritten since (a new ingestion run), the checkpoint no longer applies and
+the file is processed from the start.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+COMMIT_SIZE = int(os.environ.get("NORMALIZE_COMMIT_SIZE", "5000"))
+SUFFIX = ".checkpoint"
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class Checkpoint:
+    """Number of raw records of an input file already committed to the database."""
+
+    def __init__(self, input_path: str) -> None:
+        self.input_path = Path(input_path)
+        self.path = self.input_path.with_name(self.input_path.name + SUFFIX)
+
+    def _identity(self) -> Dict[str, int]:
+        stat = self.input_path.stat()
+        return {"input_size": stat.st_size, "input_mtime_ns": stat.st_mtime_ns}
+
+    def load(self) -> int:
+        """Return the number of records to skip: 0 without a checkpoint valid for the input."""
+        try:
+            state = json.loads(self.path.read_bytes())
+        except FileNotFoundError:
+            return 0
+        except ValueError:
+            logger.warning("Ignoring unreadable checkpoint %s", self.path)
+            return 0
+        if any(state.get(key) != value for key, value in self._identity().items()):
+            logger.warning(
+                "Ignoring checkpoint %s: %s has changed since",
+                self.path,
+                self.input_path.name,
+            )
+            return 0
+        return int(state.get("records", 0))
+
+    def save(self, records: int) -> None:
+        """Record that the first ``records`` raw records are committed."""
+        state = dict(
+            self._identity(),
+            records=records,
+            updated_at=datetime.now(timezone.utc).isoformat(),
+        )
+        _atomic_write(self.path, json.dumps(state).encode())
+
+    def clear(self) -> None:
+        """Remove the checkpoint, once the whole input is committed (or to start over)."""
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,181 @@
+"""
+Fast datetime parsing for raw event dates.
+
+`dateutil.parser.parse` handles almost anything but costs tens of
+microseconds per value, and it cannot read French dates such as
+"samedi 12 mars 2025 à 19h30". `DatetimeParser` tries precompiled fast paths
+first:
+
+* ``iso``: ISO 8601 through `datetime.fromisoformat`;
+* ``dmy``: day-first numeric dates, ``12/03/2025 19:30``, ``12-03-2025``,
+  ``12.03.2025 19h30``;
+* ``fr_long``: French long dates, with an optional weekday, ``1er``, full or
+  abbreviated month names and times such as ``à 19h30`` or ``19:30``;
+
+and only falls back to dateutil (``isoparse`` then ``parse``) for values none
+of them reads. A source usually writes every date the same way, so the parser
+remembers which path last worked for each source and tries it first. Parsed
+strings are memoised in an LRU of `NORMALIZE_DATETIME_CACHE_SIZE` entries,
+since recurring tournaments repeat the same start times.
+
+Values without a UTC offset are returned naive, as dateutil does.
+"""
+from __future__ import annotations
+
+import os
+import re
+from datetime import datetime
+from functools import lru_cache
+from typing import Callable, Dict, Optional, Tuple
+
+from dateutil import parser as dateutil_parser  # type: ignore
+
+CACHE_SIZE = int(os.environ.get("NORMALIZE_DATETIME_CACHE_SIZE", "65536"))
+
+FRENCH_MONTHS = {
+    "janvier": 1, "janv": 1, "jan": 1,
+    "fevrier": 2, "février": 2, "fevr": 2, "févr": 2, "fev": 2, "fév": 2,
+    "mars": 3, "mar": 3,
+    "avril": 4, "avr": 4,
+    "mai": 5,
+    "juin": 6,
+    "juillet": 7, "juil": 7,
+    "aout": 8, "août": 8,
+    "septembre": 9, "sept": 9, "sep": 9,
+    "octobre": 10, "oct": 10,
+    "novembre": 11, "nov": 11,
+    "decembre": 12, "décembre": 12, "dec": 12, "déc": 12,
+}  # fmt: skip
+
+_TIME = r"(?:\s*(?:à|a|,|-)?\s*(\d{1,2})\s*[h:]\s*(\d{2})?(?::(\d{2}))?)?"
+DMY_RE = re.compile(
+    r"\s*(\d{1,2})[/.-](\d{1,2})[/.-](\d{4})(?:[\sT]+|$)" + _TIME + r"\s*$",
+    re.IGNORECASE,
+)
+FR_LONG_RE = re.compile(
+    r"\s*(?:(?:lundi|mardi|mercredi|jeudi|vendredi|samedi|dimanche)\.?,?\s+)?"
+    r"(\d{1,2})(?:er)?\s+([a-zéû]+)\.?\s+(\d{4})" + _TIME + r"\s*$",
+    re.IGNORECASE,
+)
+
+
+def _build(
+    year: str,
+    month: int,
+    day: str,
+    hour: Optional[str],
+    minute: Optional[str],
+    second: Optional[str],
+) -> datetime:
+    return datetime(
+        int(year), month, int(day), int(hour or 0), int(minute or 0), int(second or 0)
+    )
+
+
+def parse_iso(value: str) -> Optional[datetime]:
+    if not value[:4].isdigit():
+        return None
+    try:
+        return datetime.fromisoformat(value.strip())
+    except ValueError:
+        return None
+
+
+def parse_dmy(value: str) -> Optional[datetime]:
+    match = DMY_RE.match(value)
+    if not match:
+        return None
+    day, month, year, hour, minute, second = match.groups()
+    try:
+        return _build(year, int(month), day, hour, minute, second)
+    except ValueError:
+        return None
+
+
+def parse_fr_long(value: str) -> Optional[datetime]:
+    match = FR_LONG_RE.match(value)
+    if not match:
+        return None
+    day, month_name, year, hour, minute, second = match.groups()
+    month = FRENCH_MONTHS.get(month_name.lower())
+    if month is None:
+        return None
+    try:
+        return _build(year, month, day, hour, minute, second)
+    except ValueError:
+        return None
+
+
+def parse_dateutil(value: str) -> Optional[datetime]:
+    try:
+        return dateutil_parser.isoparse(value)
+    except Exception:
+        try:
+            return dateutil_parser.parse(value)
+        except Exception:
+            return None
+
+
+FAST_PATHS: Dict[str, Callable[[str], Optional[datetime]]] = {
+    "iso": parse_iso,
+    "dmy": parse_dmy,
+    "fr_long": parse_fr_long,
+}
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _parse(
+    value: str, first: Optional[str]
+) -> Tuple[Optional[datetime], Optional[str]]:
+    """Return the parsed value and the name of the path that read it."""
+    if first is not None:
+        result = FAST_PATHS[first](value)
+        if result is not None:
+            return result, first
+    for name, fn in FAST_PATHS.items():
+        if name != first:
+            result = fn(value)
+            if result is not None:
+                return result, name
+    result = parse_dateutil(value)
+    return result, "dateutil" if result is not None else None
+
+
+class DatetimeParser:
+    """Parses date strings, learning the fast path that works for each source."""
+
+    def __init__(self) -> None:
+        self._formats: Dict[Optional[str], str] = {}
+        self.stats: Dict[str, int] = {
+            name: 0 for name in (*FAST_PATHS, "dateutil", "failed")
+        }
+
+    def parse(
+        self, value: Optional[str], source: Optional[str] = None
+    ) -> Optional[datetime]:
+        """Parse ``value``; ``source`` (e.g. the source name) selects the learned format."""
+        if not value:
+            return None
+        result, name = _parse(value, self._formats.get(source))
+        if name is None:
+            self.stats["failed"] += 1
+            return None
+        self.stats[name] += 1
+        if name in FAST_PATHS:
+            self._formats[source] = name
+        return result
+
+    def learned_formats(self) -> Dict[Optional[str], str]:
+        return dict(self._formats)
+
+
+_default = DatetimeParser()
+
+
+def parse(value: Optional[str], source: Optional[str] = None) -> Optional[datetime]:
+    """Parse ``value`` with the process-wide `DatetimeParser`."""
+    return _default.parse(value, source)
+
+
+def cache_info():
+    return _parse.cache_info()
@@ -0,0 +1,266 @@
+"""
+Cross-source deduplication of normalised events.
+
+The same tournament often comes from several sources (a casino's RSS feed
+and its HTML agenda) with slightly different titles, e.g. "Main Event 150€"
+and "MAIN EVENT - 150 €". The ``unique_event`` constraint only catches exact
+(venue, title, start) matches, so `Deduplicator` merges such events before
+they are written.
+
+Comparing every pair of events is quadratic. Events are instead indexed by
+a blocking key, the venue (its identifying name tokens, see
+`venues.venue_tokens`, and folded city) and a 2-hour bucket
+of the start time; an event is only compared with the clusters of its own
+bucket and of the two neighbouring ones, whose start is at most
+`NORMALIZE_DEDUP_WINDOW_MINUTES` away. Blocks hold a handful of events, so the
+work grows linearly with the number of events.
+
+Inside a block two events are duplicates when they come from different
+sources, their titles are similar (Dice coefficient on folded title tokens,
+then difflib's ratio for near misses), the numbers in their titles agree
+("#12" is not "#13") and their buy-ins do not contradict each other. Each
+cluster is merged into one canonical event: the most complete record (ties
+broken by source name, so the result does not depend on input order), its
+missing fields filled from the others, and an ``origins`` list naming every
+source, URL, title, identity key and content hash it was built from. Its
+``source_hash`` is derived from the hashes of all its origins.
+
+Events without a venue name are passed through unchanged.
+
+Deduplication only sees one run, and holds all its normalised events in
+memory, so it is off by default (`NORMALIZE_DEDUP`). Merges are kept across
+runs by the writers, which update the tournament already stored for any of
+a cluster's sources in place (see `matching`).
+"""
+from __future__ import annotations
+
+import os
+import re
+from datetime import datetime
+from difflib import SequenceMatcher
+from functools import lru_cache
+from hashlib import blake2b
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .gazetteer import fold
+from .venues import venue_tokens
+
+ENABLED = os.environ.get("NORMALIZE_DEDUP", "0").lower() not in ("0", "false", "no")
+WINDOW_MINUTES = int(os.environ.get("NORMALIZE_DEDUP_WINDOW_MINUTES", "120"))
+TITLE_THRESHOLD = float(os.environ.get("NORMALIZE_DEDUP_TITLE_THRESHOLD", "0.6"))
+# Titles below the threshold but with at least this Dice coefficient match
+# when difflib's ratio of their concatenated tokens reaches SEQUENCE_THRESHOLD.
+NEAR_MISS = 0.3
+SEQUENCE_THRESHOLD = 0.8
+
+STOPWORDS = frozenset(
+    (
+        "de",
+        "du",
+        "des",
+        "le",
+        "la",
+        "les",
+        "l",
+        "d",
+        "au",
+        "aux",
+        "the",
+        "of",
+        "et",
+        "and",
+    )
+)
+MERGED_FIELDS = (
+    "description",
+    "end",
+    "buy_in_cents",
+    "variant",
+    "address",
+    "city",
+    "source_url",
+)
+_NUMBER_RE = re.compile(r"\d+")
+_NON_ALNUM_RE = re.compile(r"[^0-9a-z]+")
+
+BlockKey = Tuple[str, str, int]
+
+
+def title_tokens(title: str) -> List[str]:
+    """Folded title tokens, in order, without articles and currency signs."""
+    folded = _NON_ALNUM_RE.sub(" ", fold(title))
+    return [token for token in folded.split() if token not in STOPWORDS]
+
+
+@lru_cache(maxsize=4096)
+def venue_key(name: str, city: str) -> Tuple[str, str]:
+    # The tokens `VenueResolver` matches venues on, so that spellings of one venue share blocks.
+    return " ".join(sorted(venue_tokens(name, city))) or fold(name), fold(city)
+
+
+def completeness(event: Dict) -> int:
+    return sum(1 for field in MERGED_FIELDS if event.get(field) not in (None, ""))
+
+
+class _Member:
+    __slots__ = ("event", "tokens", "numbers", "title")
+
+    def __init__(self, event: Dict) -> None:
+        self.event = event
+        tokens = title_tokens(event["title"])
+        self.tokens = frozenset(tokens)
+        self.numbers = frozenset(_NUMBER_RE.findall(" ".join(tokens)))
+        # Compared without spaces, "deep stack" and "deepstack" are the same.
+        self.title = "".join(tokens)
+
+
+class _Cluster:
+    __slots__ = ("members", "sources", "start", "order")
+
+    def __init__(self, member: _Member, order: int) -> None:
+        self.members = [member]
+        self.sources = {member.event.get("source_name")}
+        self.start: datetime = member.event["start"]
+        self.order = order
+
+
+class Deduplicator:
+    """Clusters duplicate events through a (venue, start bucket) blocking index."""
+
+    def __init__(
+        self, window_minutes: int = WINDOW_MINUTES, threshold: float = TITLE_THRESHOLD
+    ) -> None:
+        self.window = window_minutes * 60
+        self.threshold = threshold
+        self._blocks: Dict[BlockKey, List[_Cluster]] = {}
+        self._clusters: List[_Cluster] = []
+        self._passthrough: List[Tuple[int, Dict]] = []
+        self._count = 0
+        self.stats: Dict[str, int] = {"events": 0, "merged": 0, "comparisons": 0}
+
+    def _block(self, event: Dict, bucket: int) -> BlockKey:
+        return (*venue_key(event["venue_name"], event.get("city") or ""), bucket)
+
+    def add(self, event: Dict) -> None:
+        """Add a normalised event (the output of `normalize_event`)."""
+        self._count += 1
+        self.stats["events"] += 1
+        if not event.get("venue_name"):
+            self._passthrough.append((self._count, event))
+            return
+        member = _Member(event)
+        timestamp = event["start"].timestamp()
+        bucket = int(timestamp // self.window)
+        for neighbour in (bucket, bucket - 1, bucket + 1):
+            for cluster in self._blocks.get(self._block(event, neighbour), ()):
+                if abs(
+                    cluster.start.timestamp() - timestamp
+                ) <= self.window and self._matches(cluster, member):
+                    cluster.members.append(member)
+                    cluster.sources.add(event.get("source_name"))
+                    self.stats["merged"] += 1
+                    return
+        cluster = _Cluster(member, self._count)
+        self._clusters.append(cluster)
+        self._blocks.setdefault(self._block(event, bucket), []).append(cluster)
+
+    def _matches(self, cluster: _Cluster, member: _Member) -> bool:
+        if member.event.get("source_name") in cluster.sources:
+            # Two events of one source are distinct (e.g. Day 1A and Day 1B).
+            return False
+        buy_in = member.event.get("buy_in_cents")
+        for other in cluster.members:
+            self.stats["comparisons"] += 1
+            other_buy_in = other.event.get("buy_in_cents")
+            if (
+                buy_in is not None
+                and other_buy_in is not None
+                and buy_in != other_buy_in
+            ):
+                continue
+            if member.numbers != other.numbers and member.numbers and other.numbers:
+                continue
+            if similar_titles(member, other, self.threshold):
+                return True
+        return False
+
+    def results(self) -> List[Dict]:
+        """Return the canonical events, in the order their first event was added."""
+        merged = [
+            (cluster.order, merge_cluster([m.event for m in cluster.members]))
+            for cluster in self._clusters
+        ]
+        merged.extend(self._passthrough)
+        merged.sort(key=lambda item: item[0])
+        return [event for _, event in merged]
+
+
+def similar_titles(a: _Member, b: _Member, threshold: float = TITLE_THRESHOLD) -> bool:
+    if not a.tokens or not b.tokens:
+        return False
+    dice = 2 * len(a.tokens & b.tokens) / (len(a.tokens) + len(b.tokens))
+    if dice >= threshold:
+        return True
+    # Token sets miss spelling variants ("deepstack" / "deep stack").
+    return (
+        dice >= NEAR_MISS
+        and SequenceMatcher(None, a.title, b.title).ratio() >= SEQUENCE_THRESHOLD
+    )
+
+
+def event_origins(event: Dict) -> List[Dict]:
+    """Return the ``origins`` of ``event``: its own source unless it was merged from several."""
+    if event.get("origins"):
+        return event["origins"]
+    return [
+        {
+            "source_name": event.get("source_name"),
+            "source_url": event.get("source_url"),
+            "title": event["title"],
+            "source_id": event.get("source_id"),
+            "source_hash": event.get("source_hash"),
+        }
+    ]
+
+
+def origins_hash(origins: List[Dict]) -> Optional[str]:
+    """Return the ``source_hash`` of an event built from ``origins``."""
+    if len(origins) == 1:
+        return origins[0].get("source_hash")
+    hashes = sorted(o.get("source_hash") or "" for o in origins)
+    return blake2b("\x1f".join(hashes).encode(), digest_size=16).hexdigest()
+
+
+def merge_cluster(events: List[Dict]) -> Dict:
+    """Merge duplicate events into one canonical event with ``origins``."""
+    ranked = sorted(
+        events, key=lambda e: (-completeness(e), e.get("source_name") or "", e["title"])
+    )
+    canonical = dict(ranked[0])
+    for other in ranked[1:]:
+        for field in MERGED_FIELDS:
+            if canonical.get(field) in (None, "") and other.get(field) not in (
+                None,
+                "",
+            ):
+                canonical[field] = other[field]
+    canonical["origins"] = [origin for e in ranked for origin in event_origins(e)]
+    positions = [e["position"] for e in events if "position" in e]
+    if positions:
+        # Input position of the cluster's first event (see `checkpoint`).
+        canonical["position"] = min(positions)
+    if len(events) > 1:
+        canonical["source_hash"] = origins_hash(canonical["origins"])
+    return canonical
+
+
+def dedupe(
+    events: Iterable[Dict],
+    window_minutes: int = WINDOW_MINUTES,
+    threshold: float = TITLE_THRESHOLD,
+) -> Tuple[List[Dict], Dict[str, int]]:
+    """Return the deduplicated ``events`` and the deduplicator's stats."""
+    dedup = Deduplicator(window_minutes, threshold)
+    for event in events:
+        dedup.add(event)
+    return dedup.results(), dedup.stats
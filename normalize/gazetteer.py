@@ -0,0 +1,398 @@
+"""
+Offline gazetteer of French communes.
+
+Most venues only need commune-level coordinates, and Nominatim answers one
+request per second. `Gazetteer` loads a communes/postcodes table into memory
+and answers those lookups locally:
+
+* names are indexed accent- and case-insensitively ("Evian les bains",
+  "ÉVIAN-LES-BAINS" and "St-Malo" all match), together with the postcodes
+  of each commune;
+* `locate` finds the commune of a free-form geocoding query such as
+  "Casino Barrière, 14800 Deauville, France";
+* `nearest` is a reverse lookup (coordinates to commune) backed by a k-d
+  tree, used to fill in the department and region of coordinates that come
+  without them.
+
+A commune may have coordinates per postcode: the arrondissements of Paris,
+Lyon and Marseille each get their own centre, and the commune's own row
+(without a postcode) gives the centre used when no postcode is known.
+
+The bundled ``data/communes.csv`` is a small excerpt (large cities and
+casino towns). To cover every commune, build the full table from the
+official API (geo.api.gouv.fr, about 35,000 communes) and point
+`GEOCODE_GAZETTEER_PATH` at it::
+
+    python -m normalize.gazetteer build normalize/data/communes-full.csv.gz
+
+Any file with the same columns (name, postcode, lat, lon, department,
+region; one row per postcode, optionally gzipped) works as well.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import gzip
+import io
+import logging
+import math
+import os
+import re
+import threading
+import unicodedata
+from array import array
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+GAZETTEER_PATH = os.environ.get(
+    "GEOCODE_GAZETTEER_PATH",
+    os.path.join(os.path.dirname(__file__), "data", "communes.csv"),
+)
+GEO_API_URL = "https://geo.api.gouv.fr/communes"
+COLUMNS = ("name", "postcode", "lat", "lon", "department", "region")
+_ARRONDISSEMENT_RE = re.compile(r"\s+\d+(?:er|e)\s+arrondissement$", re.IGNORECASE)
+# Reverse lookups farther than this from any commune centre return nothing.
+MAX_REVERSE_KM = 30.0
+EARTH_RADIUS_KM = 6371.0
+
+POSTCODE_RE = re.compile(r"\b(\d{5})\b")
+_CEDEX_RE = re.compile(r"\bcedex\b.*$", re.IGNORECASE)
+_SEPARATORS_RE = re.compile(r"[\s\-'’.]+")
+_ABBREVIATIONS = {"st": "saint", "ste": "sainte"}
+
+
+def fold(name: str) -> str:
+    """Return the index key of a commune name: no accents, case, hyphens or abbreviations."""
+    decomposed = unicodedata.normalize("NFKD", name)
+    ascii_name = "".join(
+        ch for ch in decomposed if not unicodedata.combining(ch)
+    ).lower()
+    tokens = _SEPARATORS_RE.split(ascii_name.strip())
+    return " ".join(_ABBREVIATIONS.get(token, token) for token in tokens if token)
+
+
+@dataclass(frozen=True)
+class Commune:
+    name: str
+    postcodes: Tuple[str, ...]
+    lat: float
+    lon: float
+    department: Optional[str]
+    region: Optional[str]
+
+
+def _unit_vector(lat: float, lon: float) -> Tuple[float, float, float]:
+    # Euclidean distance between unit vectors grows with the great-circle distance.
+    phi, lam = math.radians(lat), math.radians(lon)
+    return math.cos(phi) * math.cos(lam), math.cos(phi) * math.sin(lam), math.sin(phi)
+
+
+class KDTree:
+    """Static 3-d tree over points, stored implicitly in one index array.
+
+    The median of each range sits at its middle position, its lower half
+    before it and its upper half after it, so no node objects are needed.
+    """
+
+    def __init__(self, points: Sequence[Tuple[float, float, float]]) -> None:
+        self._points = points
+        self._order = array("i", range(len(points)))
+        self._build(0, len(points), 0)
+
+    def _build(self, lo: int, hi: int, axis: int) -> None:
+        if hi - lo <= 1:
+            return
+        self._order[lo:hi] = array(
+            "i", sorted(self._order[lo:hi], key=lambda i: self._points[i][axis])
+        )
+        mid = (lo + hi) // 2
+        self._build(lo, mid, (axis + 1) % 3)
+        self._build(mid + 1, hi, (axis + 1) % 3)
+
+    def nearest(self, query: Tuple[float, float, float]) -> Tuple[int, float]:
+        """Return the index of the point nearest to ``query`` and its squared distance."""
+        best_index, best_dist = -1, math.inf
+        points, order = self._points, self._order
+
+        def search(lo: int, hi: int, axis: int) -> None:
+            nonlocal best_index, best_dist
+            if lo >= hi:
+                return
+            mid = (lo + hi) // 2
+            i = order[mid]
+            p = points[i]
+            dist = (
+                (p[0] - query[0]) ** 2 + (p[1] - query[1]) ** 2 + (p[2] - query[2]) ** 2
+            )
+            if dist < best_dist:
+                best_index, best_dist = i, dist
+            diff = query[axis] - p[axis]
+            near, far = (
+                ((lo, mid), (mid + 1, hi)) if diff < 0 else ((mid + 1, hi), (lo, mid))
+            )
+            search(near[0], near[1], (axis + 1) % 3)
+            if diff * diff < best_dist:
+                search(far[0], far[1], (axis + 1) % 3)
+
+        search(0, len(order), 0)
+        return best_index, best_dist
+
+
+class Gazetteer:
+    """In-memory communes table with name, postcode and spatial indexes."""
+
+    def __init__(self, rows: Sequence[Dict[str, str]]) -> None:
+        """
+        :param rows: one dict per (commune, postcode) with the name, postcode,
+            lat, lon, department and region columns.
+        """
+        self._names: List[str] = []
+        self._lat = array("d")
+        self._lon = array("d")
+        self._department: List[Optional[str]] = []
+        self._region: List[Optional[str]] = []
+        self._postcodes: List[List[str]] = []
+        self._by_name: Dict[str, List[int]] = {}
+        self._by_postcode: Dict[str, List[int]] = {}
+        # (commune, postcode) -> centre, for postcodes away from the commune's centre.
+        self._postcode_coords: Dict[Tuple[int, str], Tuple[float, float]] = {}
+        labels: Dict[str, str] = {}  # interned department/region names
+        communes: Dict[Tuple[str, Optional[str]], int] = {}
+        for row in rows:
+            name = row["name"].strip()
+            department = (
+                labels.setdefault(
+                    row.get("department") or "", row.get("department") or ""
+                )
+                or None
+            )
+            key = (fold(name), department)
+            index = communes.get(key)
+            if index is None:
+                index = communes[key] = len(self._names)
+                self._names.append(name)
+                self._lat.append(float(row["lat"]))
+                self._lon.append(float(row["lon"]))
+                self._department.append(department)
+                self._region.append(
+                    labels.setdefault(row.get("region") or "", row.get("region") or "")
+                    or None
+                )
+                self._postcodes.append([])
+                self._by_name.setdefault(key[0], []).append(index)
+            postcode = (row.get("postcode") or "").strip()
+            if postcode and postcode not in self._postcodes[index]:
+                self._postcodes[index].append(postcode)
+                self._by_postcode.setdefault(postcode, []).append(index)
+                coords = (float(row["lat"]), float(row["lon"]))
+                if coords != (self._lat[index], self._lon[index]):
+                    self._postcode_coords[(index, postcode)] = coords
+        self._tree: Optional[KDTree] = None
+        self._tree_lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str = GAZETTEER_PATH) -> "Gazetteer":
+        """Load a communes CSV (plain or gzipped)."""
+        with open(path, "rb") as raw:
+            stream = gzip.GzipFile(fileobj=raw) if path.endswith(".gz") else raw
+            text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+            return cls(list(csv.DictReader(text)))
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def _commune(self, index: int, postcode: Optional[str] = None) -> Commune:
+        lat, lon = self._lat[index], self._lon[index]
+        if postcode:
+            lat, lon = self._postcode_coords.get((index, postcode), (lat, lon))
+        return Commune(
+            name=self._names[index],
+            postcodes=tuple(self._postcodes[index]),
+            lat=lat,
+            lon=lon,
+            department=self._department[index],
+            region=self._region[index],
+        )
+
+    def lookup(
+        self, name: Optional[str] = None, postcode: Optional[str] = None
+    ) -> Optional[Commune]:
+        """Return the commune called ``name`` and/or with ``postcode``.
+
+        Returns None when nothing matches or when several communes do (e.g. a
+        common name without a postcode to tell them apart). With a
+        ``postcode``, the commune has the coordinates of that postcode.
+        """
+        candidates: Optional[List[int]] = None
+        if name:
+            candidates = self._by_name.get(fold(name), [])
+        if postcode:
+            postcode = postcode.strip()
+            by_postcode = self._by_postcode.get(postcode, [])
+            candidates = (
+                by_postcode
+                if candidates is None
+                else [i for i in candidates if i in by_postcode]
+            )
+        if not candidates or len(candidates) > 1:
+            return None
+        return self._commune(candidates[0], postcode)
+
+    def locate(self, query: str) -> Optional[Commune]:
+        """Return the commune of a comma-separated geocoding query, if one is named.
+
+        Components naming a commune are tried from the last one (where the
+        city usually is) back to the first, with each postcode of the query
+        to disambiguate homonyms. Failing that, a postcode identifies the
+        commune on its own, then a component naming a single commune does.
+        """
+        postcodes = POSTCODE_RE.findall(query)
+        names = []
+        for component in reversed(query.split(",")):
+            name = _CEDEX_RE.sub("", POSTCODE_RE.sub(" ", component)).strip()
+            if name and fold(name) != "france" and fold(name) in self._by_name:
+                names.append(name)
+        for name in names:
+            for postcode in postcodes or [None]:
+                commune = self.lookup(name, postcode)
+                if commune is not None:
+                    return commune
+        for postcode in postcodes:
+            commune = self.lookup(postcode=postcode)
+            if commune is not None:
+                return commune
+        if postcodes:
+            # The postcodes are unknown (a CEDEX) or name another commune.
+            for name in names:
+                commune = self.lookup(name)
+                if commune is not None:
+                    return commune
+        return None
+
+    def nearest(
+        self, lat: float, lon: float, max_km: float = MAX_REVERSE_KM
+    ) -> Optional[Commune]:
+        """Return the commune whose centre is nearest to (lat, lon), within ``max_km``."""
+        if not self._names:
+            return None
+        with self._tree_lock:
+            if self._tree is None:
+                # Built on first use: most runs only need the name index.
+                self._tree = KDTree(
+                    [_unit_vector(la, lo) for la, lo in zip(self._lat, self._lon)]
+                )
+        index, chord2 = self._tree.nearest(_unit_vector(lat, lon))
+        distance_km = 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(chord2) / 2))
+        if distance_km > max_km:
+            return None
+        return self._commune(index)
+
+
+_gazetteer: Optional[Gazetteer] = None
+_gazetteer_lock = threading.Lock()
+
+
+def get_gazetteer() -> Gazetteer:
+    """Return the process-wide gazetteer, loading `GEOCODE_GAZETTEER_PATH` on first use."""
+    global _gazetteer
+    with _gazetteer_lock:
+        if _gazetteer is None:
+            _gazetteer = Gazetteer.load(GAZETTEER_PATH)
+        return _gazetteer
+
+
+def _geo_api_rows(communes: Iterable[Dict]) -> Iterator[Dict[str, str]]:
+    """Turn geo.api.gouv.fr communes and municipal arrondissements into gazetteer rows."""
+    arrondissements: Dict[Tuple[str, str], List[Dict]] = {}
+    towns = []
+    for commune in communes:
+        if commune.get("centre") is None:
+            continue
+        name = commune["nom"]
+        parent = _ARRONDISSEMENT_RE.sub("", name)
+        if parent != name:
+            arrondissements.setdefault(
+                (parent, commune["departement"]["nom"]), []
+            ).append(commune)
+        else:
+            towns.append(commune)
+
+    def row(name: str, postcode: str, commune: Dict) -> Dict[str, str]:
+        lon, lat = commune["centre"]["coordinates"]
+        return {
+            "name": name,
+            "postcode": postcode,
+            "lat": f"{lat:.4f}",
+            "lon": f"{lon:.4f}",
+            "department": commune["departement"]["nom"],
+            "region": commune["region"]["nom"],
+        }
+
+    for town in towns:
+        parts = arrondissements.get((town["nom"], town["departement"]["nom"]))
+        if not parts:
+            for postcode in town.get("codesPostaux") or [""]:
+                yield row(town["nom"], postcode, town)
+            continue
+        # The commune's centre first, then that of each arrondissement.
+        yield row(town["nom"], "", town)
+        for part in sorted(parts, key=lambda c: c["code"]):
+            for postcode in part.get("codesPostaux") or []:
+                yield row(town["nom"], postcode, part)
+
+
+def build(output: str, url: str = GEO_API_URL, timeout: float = 120) -> int:
+    """Download every commune from geo.api.gouv.fr into the CSV ``output``; return its row count."""
+    params = {
+        "fields": "nom,code,codesPostaux,centre,departement,region",
+        "type": "commune-actuelle,arrondissement-municipal",
+        "format": "json",
+    }
+    response = requests.get(url, params=params, timeout=timeout)
+    response.raise_for_status()
+    rows = sorted(
+        _geo_api_rows(response.json()),
+        key=lambda r: (r["department"], r["name"], r["postcode"]),
+    )
+    tmp = output + ".tmp"
+    with open(tmp, "wb") as raw:
+        stream = (
+            gzip.GzipFile(fileobj=raw, mode="wb") if output.endswith(".gz") else raw
+        )
+        with io.TextIOWrapper(stream, encoding="utf-8", newline="") as text:
+            writer = csv.DictWriter(text, fieldnames=COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+    os.replace(tmp, output)
+    return len(rows)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Maintain the communes gazetteer.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build_parser = sub.add_parser(
+        "build", help="download every commune from geo.api.gouv.fr"
+    )
+    build_parser.add_argument(
+        "output", help="CSV file to write (gzipped if it ends with .gz)"
+    )
+    build_parser.add_argument("--url", default=GEO_API_URL)
+    args = parser.parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s"
+    )
+    count = build(args.output, args.url)
+    logger.info(
+        "Wrote %d rows to %s; set GEOCODE_GAZETTEER_PATH=%s to use it",
+        count,
+        args.output,
+        args.output,
+    )
+
+
+if __name__ == "__main__":
+    main()
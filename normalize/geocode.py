@@ -5,19 +5,71 @@ This module wraps the geopy Nominatim geocoder with a RateLimiter to respect
 the usage policy of Nominatim (max 1 request per second, valid user agent,
 and caching)【512638780003458†L27-L47】. Results are cached in a local SQLite database to
 avoid repeated calls for the same address【512638780003458†L49-L65】.
+
+`GeocoderService` is meant to live for a whole run (see `get_geocoder`):
+
+* it keeps one SQLite connection, in WAL mode so that several processes can
+  read the cache while another one writes to it;
+* an in-memory LRU (`GEOCODE_LRU_SIZE` entries) sits in front of SQLite;
+* `geocode_many` answers every address already in the cache with one query
+  per few hundred addresses before going to Nominatim for the rest;
+* a single RateLimiter is shared by all lookups, so the delay between
+  Nominatim requests holds across calls;
+* lookups are counted in ``stats`` (see `hit_rate`).
+
+The cache also records the addresses Nominatim did not find, so that a bad
+address costs one request per `GEOCODE_NEGATIVE_TTL_DAYS` instead of one per
+run. Found addresses are refreshed after `GEOCODE_REFRESH_DAYS`; the previous
+coordinates are kept if the refresh finds nothing. `lookup_many` tells for
+each address whether it was a ``hit``, a ``negative_hit`` (known not to be
+found) or a ``miss`` (sent to Nominatim). The LRU keeps that outcome and the
+expiry of each entry alongside its result, so an address answered from
+memory is counted and expires as it would from SQLite. Expired entries are
+removed by ``python -m normalize.geocode prune``.
+
+Addresses missing from the cache are first looked up in the offline
+`gazetteer` of French communes: with ``GEOCODE_PRECISION=commune`` (the
+default) a venue gets the coordinates of its commune without any Nominatim
+request, and only addresses naming no known commune go to Nominatim. With
+``street`` every new address goes to Nominatim, and the gazetteer only
+answers those Nominatim does not find. Either way, Nominatim results without
+a department or region get those of the nearest commune.
 """
 from __future__ import annotations
 
+import argparse
+import logging
+import math
 import os
 import sqlite3
+import threading
+import time
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Optional, Tuple
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
 
+from geopy.exc import GeopyError  # type: ignore
 from geopy.extra.rate_limiter import RateLimiter
 from geopy.geocoders import Nominatim
 
+from .gazetteer import Commune, Gazetteer, get_gazetteer
+
+logger = logging.getLogger(__name__)
+
 DB_PATH = os.environ.get("GEOCODE_CACHE_PATH", os.path.join(os.path.dirname(__file__), "geocode_cache.sqlite"))
+USER_AGENT = os.environ.get("GEOCODER_USER_AGENT", "poker-fr-tournaments/1.0")
+MIN_DELAY_SECONDS = float(os.environ.get("GEOCODER_MIN_DELAY_SECONDS", "1"))
+LRU_SIZE = int(os.environ.get("GEOCODE_LRU_SIZE", "4096"))
+PRECISION = os.environ.get("GEOCODE_PRECISION", "commune")
+NEGATIVE_TTL_DAYS = float(os.environ.get("GEOCODE_NEGATIVE_TTL_DAYS", "30"))
+REFRESH_DAYS = float(os.environ.get("GEOCODE_REFRESH_DAYS", "365"))
+# SQLite caps the number of bound parameters per statement (999 on old builds).
+MAX_QUERY_PARAMS = 900
+DAY_SECONDS = 86400
 
+HIT = "hit"
+NEGATIVE_HIT = "negative_hit"
+MISS = "miss"
 
 @dataclass
 class GeocodeResult:
@@ -26,6 +78,21 @@ class GeocodeResult:
     department: Optional[str]
     region: Optional[str]
 
+    @classmethod
+    def from_commune(cls, commune: Commune) -> "GeocodeResult":
+        return cls(lat=commune.lat, lon=commune.lon, department=commune.department, region=commune.region)
+
+
+class Lookup(NamedTuple):
+    outcome: str  # HIT, NEGATIVE_HIT or MISS
+    result: Optional[GeocodeResult]
+
+
+class _Cached(NamedTuple):
+    outcome: str  # HIT or NEGATIVE_HIT
+    result: Optional[GeocodeResult]
+    expires_at: float
+
 
 def _init_db(conn: sqlite3.Connection) -> None:
     conn.execute(
@@ -35,13 +102,302 @@ def _init_db(conn: sqlite3.Connection) -> None:
             lat REAL,
             lon REAL,
             department TEXT,
-            region TEXT
+            region TEXT,
+            status TEXT NOT NULL DEFAULT 'found',
+            fetched_at REAL
         )
         """
     )
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(cache)")}
+    if "status" not in columns:
+        # Caches created before negative entries only hold found addresses.
+        conn.execute("ALTER TABLE cache ADD COLUMN status TEXT NOT NULL DEFAULT 'found'")
+    if "fetched_at" not in columns:
+        conn.execute("ALTER TABLE cache ADD COLUMN fetched_at REAL")
+        conn.execute("UPDATE cache SET fetched_at = ?", (time.time(),))
+    conn.execute("CREATE INDEX IF NOT EXISTS cache_status_fetched_at ON cache (status, fetched_at)")
     conn.commit()
 
 
+class GeocoderService:
+    """Long-lived geocoder: SQLite cache, LRU front and a shared rate limiter."""
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        user_agent: Optional[str] = None,
+        min_delay: Optional[float] = None,
+        lru_size: int = LRU_SIZE,
+        geolocator=None,
+        precision: str = PRECISION,
+        gazetteer: Optional[Gazetteer] = None,
+        negative_ttl_days: float = NEGATIVE_TTL_DAYS,
+        refresh_days: float = REFRESH_DAYS,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """
+        :param db_path: SQLite cache file (`GEOCODE_CACHE_PATH` by default).
+        :param min_delay: seconds between Nominatim requests (`GEOCODER_MIN_DELAY_SECONDS`).
+        :param lru_size: addresses kept in memory, 0 to disable the LRU.
+        :param geolocator: geopy geocoder to use instead of Nominatim.
+        :param precision: "commune" (gazetteer first) or "street" (Nominatim first).
+        :param gazetteer: communes table; the bundled one by default.
+        :param negative_ttl_days: how long an address Nominatim did not find is not retried.
+        :param refresh_days: age after which found addresses are geocoded again.
+        """
+        if precision not in ("commune", "street"):
+            raise ValueError(f"Unknown geocoding precision {precision!r}")
+        self.precision = precision
+        if gazetteer is None:
+            try:
+                gazetteer = get_gazetteer()
+            except OSError as exc:
+                logger.warning("Gazetteer unavailable, geocoding with Nominatim only: %s", exc)
+        self.gazetteer = gazetteer
+        self.negative_ttl = negative_ttl_days * DAY_SECONDS
+        self.refresh_ttl = refresh_days * DAY_SECONDS
+        self.clock = clock
+        self.db_path = db_path or DB_PATH
+        self.lru_size = max(0, lru_size)
+        self._lock = threading.Lock()
+        self._lru: "OrderedDict[str, _Cached]" = OrderedDict()
+        self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        _init_db(self._conn)
+        self.geolocator = geolocator or Nominatim(user_agent=user_agent or USER_AGENT)
+        delay = MIN_DELAY_SECONDS if min_delay is None else min_delay
+        # Errors are raised rather than swallowed: they must not be cached as "not found".
+        self._geocode_fn = RateLimiter(self.geolocator.geocode, min_delay_seconds=delay, swallow_exceptions=False)
+        self.stats: Dict[str, int] = {
+            "lookups": 0,
+            "lru_hits": 0,
+            "db_hits": 0,
+            "negative_hits": 0,
+            "gazetteer_hits": 0,
+            "stale": 0,
+            "remote": 0,
+            "not_found": 0,
+            "errors": 0,
+        }
+
+    @property
+    def hit_rate(self) -> float:
+        """Share of lookups answered without calling Nominatim."""
+        lookups = self.stats["lookups"]
+        local = self.stats["lru_hits"] + self.stats["db_hits"] + self.stats["negative_hits"] + self.stats["gazetteer_hits"]
+        return local / lookups if lookups else 0.0
+
+    def geocode(self, address: str) -> Optional[GeocodeResult]:
+        """
+        Geocode an address using Nominatim with caching.
+
+        Returns a GeocodeResult or None if not found.
+        """
+        if not address:
+            return None
+        return self.geocode_many([address])[address]
+
+    def geocode_many(self, addresses: Iterable[str], remote: bool = True) -> Dict[str, Optional[GeocodeResult]]:
+        """Geocode several addresses, querying the cache for all of them at once.
+
+        Returns a dict mapping each (non-empty) address to its result or None.
+        Addresses missing from the cache are sent to Nominatim one by one, at
+        the allowed rate; with ``remote=False`` they are left out of the dict.
+        """
+        return {address: lookup.result for address, lookup in self.lookup_many(addresses, remote).items()}
+
+    def lookup(self, address: str) -> Lookup:
+        """Geocode one address and tell how it was answered."""
+        return self.lookup_many([address])[address]
+
+    def lookup_many(self, addresses: Iterable[str], remote: bool = True) -> Dict[str, Lookup]:
+        """Like `geocode_many`, with the outcome (hit, negative hit, miss) of each address."""
+        results: Dict[str, Lookup] = {}
+        pending: List[str] = []
+        stale: Dict[str, GeocodeResult] = {}
+        with self._lock:
+            now = self.clock()
+            unique = list(dict.fromkeys(a for a in addresses if a))
+            for address in unique:
+                cached = self._lru_get(address, now)
+                if cached is None:
+                    pending.append(address)
+                else:
+                    self.stats["lru_hits" if cached.outcome == HIT else "negative_hits"] += 1
+                    results[address] = Lookup(cached.outcome, cached.result)
+            for i in range(0, len(pending), MAX_QUERY_PARAMS):
+                chunk = pending[i : i + MAX_QUERY_PARAMS]
+                rows = self._conn.execute(
+                    "SELECT address, lat, lon, department, region, status, fetched_at FROM cache"
+                    f" WHERE address IN ({', '.join('?' * len(chunk))})",
+                    chunk,
+                )
+                for address, lat, lon, department, region, status, fetched_at in rows:
+                    fetched_at = fetched_at or 0
+                    if status == "not_found":
+                        if now - fetched_at < self.negative_ttl:
+                            self.stats["negative_hits"] += 1
+                            result = self._fallback(address)
+                            self._lru_put(address, NEGATIVE_HIT, result, fetched_at + self.negative_ttl)
+                            results[address] = Lookup(NEGATIVE_HIT, result)
+                        continue
+                    result = GeocodeResult(lat=lat, lon=lon, department=department, region=region)
+                    if now - fetched_at < self.refresh_ttl:
+                        self.stats["db_hits"] += 1
+                        self._lru_put(address, HIT, result, fetched_at + self.refresh_ttl)
+                        results[address] = Lookup(HIT, result)
+                    else:
+                        stale[address] = result
+            if self.precision == "commune" and self.gazetteer is not None:
+                for address in pending:
+                    if address not in results:
+                        commune = self.gazetteer.locate(address)
+                        if commune is not None:
+                            result = GeocodeResult.from_commune(commune)
+                            self.stats["gazetteer_hits"] += 1
+                            self._lru_put(address, HIT, result, math.inf)
+                            results[address] = Lookup(HIT, result)
+            # Addresses left for a later remote lookup are counted then.
+            self.stats["lookups"] += len(unique) if remote else len(results)
+        if not remote:
+            return results
+        for address in pending:
+            if address not in results:
+                if address in stale:
+                    with self._lock:
+                        self.stats["stale"] += 1
+                results[address] = Lookup(MISS, self._geocode_remote(address, stale.get(address)))
+        return results
+
+    def _fallback(self, address: str) -> Optional[GeocodeResult]:
+        """Commune-level result for an address Nominatim does not find (street precision)."""
+        if self.precision == "street" and self.gazetteer is not None:
+            commune = self.gazetteer.locate(address)
+            if commune is not None:
+                self.stats["gazetteer_hits"] += 1
+                return GeocodeResult.from_commune(commune)
+        return None
+
+    def _geocode_remote(self, address: str, stale: Optional[GeocodeResult] = None) -> Optional[GeocodeResult]:
+        # Outside the lock: the rate limiter is what makes concurrent callers wait.
+        try:
+            location = self._geocode_fn(address)
+        except GeopyError as exc:
+            logger.warning("Geocoding %r failed: %s", address, exc)
+            with self._lock:
+                self.stats["remote"] += 1
+                self.stats["errors"] += 1
+            return stale
+        result = None
+        if location:
+            # Attempt to extract department and region from address details
+            address_raw = location.raw.get("address", {})
+            result = GeocodeResult(
+                lat=location.latitude,
+                lon=location.longitude,
+                department=address_raw.get("county") or address_raw.get("state_district"),
+                region=address_raw.get("state"),
+            )
+            if (result.department is None or result.region is None) and self.gazetteer is not None:
+                commune = self.gazetteer.nearest(result.lat, result.lon)
+                if commune is not None:
+                    result.department = result.department or commune.department
+                    result.region = result.region or commune.region
+        with self._lock:
+            self.stats["remote"] += 1
+            now = self.clock()
+            if result is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO cache (address, lat, lon, department, region, status, fetched_at)"
+                    " VALUES (?, ?, ?, ?, ?, 'found', ?)",
+                    (address, result.lat, result.lon, result.department, result.region, now),
+                )
+                self._lru_put(address, HIT, result, now + self.refresh_ttl)
+            elif stale is not None:
+                # A refresh that finds nothing keeps the previous coordinates.
+                self._conn.execute("UPDATE cache SET fetched_at = ? WHERE address = ?", (now, address))
+                result = stale
+                self._lru_put(address, HIT, result, now + self.refresh_ttl)
+            else:
+                self.stats["not_found"] += 1
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO cache (address, status, fetched_at) VALUES (?, 'not_found', ?)",
+                    (address, now),
+                )
+                result = self._fallback(address)
+                self._lru_put(address, NEGATIVE_HIT, result, now + self.negative_ttl)
+            self._conn.commit()
+        return result
+
+    def _lru_get(self, address: str, now: float) -> Optional[_Cached]:
+        cached = self._lru.get(address)
+        if cached is None:
+            return None
+        if cached.expires_at <= now:
+            del self._lru[address]
+            return None
+        self._lru.move_to_end(address)
+        return cached
+
+    def _lru_put(self, address: str, outcome: str, result: Optional[GeocodeResult], expires_at: float) -> None:
+        if not self.lru_size:
+            return
+        self._lru[address] = _Cached(outcome, result, expires_at)
+        self._lru.move_to_end(address)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def cache_stats(self) -> Dict[str, int]:
+        """Count the cache entries: found, not found, and how many of each have expired."""
+        now = self.clock()
+        with self._lock:
+            row = self._conn.execute(
+                """
+                SELECT SUM(status = 'found'), SUM(status = 'found' AND fetched_at < ?),
+                       SUM(status = 'not_found'), SUM(status = 'not_found' AND fetched_at < ?)
+                FROM cache
+                """,
+                (now - self.refresh_ttl, now - self.negative_ttl),
+            ).fetchone()
+        return dict(zip(("found", "found_stale", "not_found", "not_found_expired"), (n or 0 for n in row)))
+
+    def prune(self, drop_stale: bool = False) -> Dict[str, int]:
+        """Delete expired negative entries (and stale found ones if asked), then compact the file."""
+        now = self.clock()
+        with self._lock:
+            negative = self._conn.execute(
+                "DELETE FROM cache WHERE status = 'not_found' AND fetched_at < ?", (now - self.negative_ttl,)
+            ).rowcount
+            stale = 0
+            if drop_stale:
+                stale = self._conn.execute(
+                    "DELETE FROM cache WHERE status = 'found' AND fetched_at < ?", (now - self.refresh_ttl,)
+                ).rowcount
+            self._conn.commit()
+            self._lru.clear()
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._conn.execute("VACUUM")
+        return {"not_found_deleted": negative, "stale_deleted": stale}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_service: Optional[GeocoderService] = None
+_service_lock = threading.Lock()
+
+
+def get_geocoder() -> GeocoderService:
+    """Return the process-wide `GeocoderService`, creating it on first use."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = GeocoderService()
+        return _service
+
+
 def geocode(address: str) -> Optional[GeocodeResult]:
     """
     Geocode an address using Nominatim with caching.
@@ -50,29 +406,33 @@ def geocode(address: str) -> Optional[GeocodeResult]:
     """
     if not address:
         return None
-    conn = sqlite3.connect(DB_PATH)
-    _init_db(conn)
-    cur = conn.cursor()
-    row = cur.execute("SELECT lat, lon, department, region FROM cache WHERE address = ?", (address,)).fetchone()
-    if row:
-        return GeocodeResult(lat=row[0], lon=row[1], department=row[2], region=row[3])
-    # Not cached; query geocoding service
-    user_agent = os.environ.get("GEOCODER_USER_AGENT", "poker-fr-tournaments/1.0")
-    geolocator = Nominatim(user_agent=user_agent)
-    min_delay = float(os.environ.get("GEOCODER_MIN_DELAY_SECONDS", "1"))
-    geocode_fn = RateLimiter(geolocator.geocode, min_delay_seconds=min_delay)
-    location = geocode_fn(address)
-    if not location:
-        return None
-    lat = location.latitude
-    lon = location.longitude
-    # Attempt to extract department and region from address details
-    address_raw = location.raw.get("address", {})
-    department = address_raw.get("county") or address_raw.get("state_district")
-    region = address_raw.get("state")
-    cur.execute(
-        "INSERT OR REPLACE INTO cache (address, lat, lon, department, region) VALUES (?, ?, ?, ?, ?)",
-        (address, lat, lon, department, region),
-    )
-    conn.commit()
-    return GeocodeResult(lat=lat, lon=lon, department=department, region=region)
+    return get_geocoder().geocode(address)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Maintain the geocoding cache.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="count cache entries")
+    prune = sub.add_parser("prune", help="delete expired entries and compact the cache")
+    prune.add_argument("--stale", action="store_true", help="also delete found entries due for a refresh")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    service = GeocoderService()
+    try:
+        if args.command == "prune":
+            size = os.path.getsize(service.db_path)
+            deleted = service.prune(drop_stale=args.stale)
+            logger.info(
+                "Pruned %d expired negative and %d stale entries; cache %d -> %d bytes",
+                deleted["not_found_deleted"],
+                deleted["stale_deleted"],
+                size,
+                os.path.getsize(service.db_path),
+            )
+        logger.info("Cache entries: %s", service.cache_stats())
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+Matching of normalised events with the tournaments already stored.
+
+The ``unique_event`` constraint identifies a tournament by (venue, title,
+start), which is not stable for a tournament announced by several sources:
+its canonical title is that of the most complete record of the run (see
+`dedup`), and a delta run, or a run where one of the sources failed, only
+sees some of them. Every tournament therefore records in ``source_ids`` the
+identity keys (``source_id``, see `ingestion.fingerprint`) of the raw events
+it was built from.
+
+Before `bulk.BulkWriter` writes a batch, `match_stored` looks up, in one
+query, the tournaments sharing a source id, or the unique key, with its
+events (the per-row upserts only match events merged from several sources,
+saving a query per row). Each tournament found is updated in place rather
+than joined by a new row:
+
+* the event written keeps the tournament's venue, title and start, so the
+  writers' ON CONFLICT lands on that row;
+* events of the batch matching the same tournament are merged into one
+  (`dedup.merge_cluster`);
+* the tournament's origins from sources that are not in the batch are kept,
+  and its ``source_hash`` is derived from the hashes of all its origins, so
+  an unchanged source leaves it unchanged;
+* other tournaments matched by the same events (duplicates written by
+  earlier runs) are merged into it and deleted.
+
+Tournaments stored before ``source_ids`` existed are only matched by key.
+
+Tombstones of a delta run (raw events gone from their source, see
+`ingestion.state`) go through `remove_tournament`: the origin is removed
+from the tournaments built from it, and a future tournament left without
+any origin is cancelled. Past tournaments are left alone, since sources
+routinely drop them from their listings.
+"""
+from __future__ import annotations
+
+import json
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import text
+
+from .dedup import event_origins, merge_cluster, origins_hash
+
+FIND_STORED_SQL = """
+SELECT id, venue_id, title, start_datetime_local, source_ids, origins
+FROM tournaments
+WHERE source_ids && CAST(:source_ids AS TEXT[])
+   OR (venue_id, title, start_datetime_local) IN (
+       SELECT * FROM unnest(CAST(:venue_ids AS INTEGER[]), CAST(:titles AS TEXT[]), CAST(:starts AS TIMESTAMPTZ[]))
+   )
+"""
+
+DELETE_STORED_SQL = "DELETE FROM tournaments WHERE id = ANY(CAST(:ids AS INTEGER[]))"
+
+FIND_REMOVED_SQL = """
+SELECT id, start_datetime_local, status, origins
+FROM tournaments
+WHERE source_ids @> ARRAY[CAST(:source_id AS TEXT)]
+   OR (source_ids IS NULL AND source_hash = :source_hash)
+"""
+
+REMOVE_ORIGIN_SQL = """
+UPDATE tournaments
+SET origins = CAST(:origins AS JSONB), source_ids = CAST(:source_ids AS TEXT[]), source_hash = :source_hash, updated_at = NOW()
+WHERE id = :id
+"""
+
+# Its origins stay, so that the tournament is matched again if its source lists it again.
+CANCEL_SQL = (
+    "UPDATE tournaments SET status = 'cancelled', updated_at = NOW() WHERE id = :id"
+)
+
+# (event, venue id) pairs; the venue id is None for venues not created yet.
+Item = Tuple[Dict, Optional[int]]
+
+
+def source_ids(origins: List[Dict]) -> List[str]:
+    """Return the sorted identity keys of ``origins``."""
+    return sorted({o["source_id"] for o in origins if o.get("source_id")})
+
+
+def array_literal(values: List[str]) -> str:
+    """Return ``values`` (identity keys, hex digests) as a Postgres array literal."""
+    return "{" + ",".join(values) + "}"
+
+
+def _kept_origins(incoming: List[Dict], stored: List[Dict]) -> List[Dict]:
+    # A tournament has one event per source (see `dedup`): the stored origins
+    # of the sources in the batch are replaced by the incoming ones.
+    names = {o.get("source_name") for o in incoming}
+    seen: Set[Optional[str]] = set()
+    kept = []
+    for origin in stored:
+        if origin.get("source_name") in names or (
+            origin.get("source_id") and origin["source_id"] in seen
+        ):
+            continue
+        seen.add(origin.get("source_id"))
+        kept.append(origin)
+    return kept
+
+
+def match_stored(conn, items: List[Item]) -> Tuple[List[Optional[Item]], List[int]]:
+    """Match ``items`` with the stored tournaments.
+
+    Returns the items to write, aligned with ``items``: a matched item is
+    replaced by the event that updates its tournament in place, or by None
+    when an earlier item of the batch already carries it. Also returns the
+    ids of the duplicate tournaments to delete.
+    """
+    ids = sorted(
+        {key for event, _ in items for key in source_ids(event_origins(event))}
+    )
+    keyed = [
+        (venue_id, event["title"], event["start"])
+        for event, venue_id in items
+        if venue_id is not None
+    ]
+    if not ids and not keyed:
+        return list(items), []
+    rows = {
+        row.id: row
+        for row in conn.execute(
+            text(FIND_STORED_SQL),
+            {
+                "source_ids": ids,
+                "venue_ids": [key[0] for key in keyed],
+                "titles": [key[1] for key in keyed],
+                "starts": [key[2] for key in keyed],
+            },
+        )
+    }
+    if not rows:
+        return list(items), []
+    by_source: Dict[str, Set[int]] = {}
+    by_key: Dict[Tuple, int] = {}
+    for row in rows.values():
+        for key in row.source_ids or ():
+            by_source.setdefault(key, set()).add(row.id)
+        by_key[(row.venue_id, row.title, row.start_datetime_local)] = row.id
+
+    # Tournaments matched by one event, or by events of one cluster, become one.
+    parent = {row_id: row_id for row_id in rows}
+
+    def find(row_id: int) -> int:
+        while parent[row_id] != row_id:
+            parent[row_id] = parent[parent[row_id]]
+            row_id = parent[row_id]
+        return row_id
+
+    matched: List[List[int]] = []
+    for event, venue_id in items:
+        found = {
+            row_id
+            for key in source_ids(event_origins(event))
+            for row_id in by_source.get(key, ())
+        }
+        if (
+            venue_id is not None
+            and (venue_id, event["title"], event["start"]) in by_key
+        ):
+            found.add(by_key[(venue_id, event["title"], event["start"])])
+        found_ids = sorted(found)
+        for row_id in found_ids[1:]:
+            parent[find(row_id)] = find(found_ids[0])
+        matched.append(found_ids)
+    groups: Dict[int, List[int]] = {}
+    for index, found_ids in enumerate(matched):
+        if found_ids:
+            groups.setdefault(find(found_ids[0]), []).append(index)
+    members: Dict[int, List[int]] = {}
+    for row_id in sorted(rows):
+        members.setdefault(find(row_id), []).append(row_id)
+
+    result: List[Optional[Item]] = list(items)
+    deleted: List[int] = []
+    for root, indices in groups.items():
+        stored = [rows[row_id] for row_id in members[root]]
+        target = stored[0]
+        deleted.extend(row.id for row in stored[1:])
+        canonical = merge_cluster([items[i][0] for i in indices])
+        incoming = canonical["origins"]
+        origins = incoming + _kept_origins(
+            incoming, [o for row in stored for o in row.origins or ()]
+        )
+        canonical.update(
+            title=target.title,
+            start=target.start_datetime_local,
+            origins=origins,
+            source_hash=origins_hash(origins),
+        )
+        result[indices[0]] = (canonical, target.venue_id)
+        for index in indices[1:]:
+            result[index] = None
+    return result, deleted
+
+
+def remove_tournament(conn, tombstone: Dict, now: Optional[datetime] = None) -> str:
+    """Apply the tombstone of a raw event to the tournaments built from it.
+
+    Returns "updated" when the origin was removed from a tournament that has
+    others, "cancelled" when a future tournament lost its last origin, or
+    "unchanged".
+    """
+    now = now or datetime.now(timezone.utc)
+    outcome = "unchanged"
+    key = tombstone.get("source_id")
+    rows = list(
+        conn.execute(
+            text(FIND_REMOVED_SQL),
+            {"source_id": key, "source_hash": tombstone.get("source_hash")},
+        )
+    )
+    for row in rows:
+        # Origins written before they had a source_id are told apart by source.
+        origins = [
+            o
+            for o in row.origins or ()
+            if not (
+                o.get("source_id") == key
+                if o.get("source_id")
+                else o.get("source_name") == tombstone.get("source_name")
+            )
+        ]
+        if origins:
+            conn.execute(
+                text(REMOVE_ORIGIN_SQL),
+                {
+                    "id": row.id,
+                    "origins": json.dumps(origins),
+                    "source_ids": source_ids(origins),
+                    "source_hash": origins_hash(origins),
+                },
+            )
+            outcome = "updated"
+        elif row.start_datetime_local > now and row.status != "cancelled":
+            conn.execute(text(CANCEL_SQL), {"id": row.id})
+            outcome = "cancelled"
+    return outcome
@@ -8,18 +8,31 @@ variants, geocoding of venues, deduplication and validation.
 """
 from __future__ import annotations
 
+import argparse
 import json
 import logging
 import os
+import time
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, Iterable, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 from sqlalchemy import create_engine, text
 from sqlalchemy.engine import Engine
 
-from .geocode import geocode as geocode_address
+from ingestion.fingerprint import identity_key
+from ingestion.formats import find_latest, read_events
+from ingestion.state import acknowledge_run, read_run
+
+from .bulk import BATCH_SIZE as BULK_BATCH_SIZE, BulkWriter
+from .checkpoint import COMMIT_SIZE, Checkpoint
+from .dedup import ENABLED as DEDUP_ENABLED, dedupe, event_origins
+from .geocode import GeocodeResult, geocode as geocode_address, get_geocoder
+from .matching import DELETE_STORED_SQL, match_stored, remove_tournament, source_ids
+from .parallel import CHUNK_SIZE as NORMALIZE_CHUNK_SIZE, WORKERS as NORMALIZE_WORKERS, map_chunks
+from .prefetch import LOOKAHEAD as GEOCODE_LOOKAHEAD, GeocodePrefetcher, VenueBackfill
 from .utils import normalize_variant, parse_buy_in, parse_datetime
+from .venues import VenueResolver, insert_venue
 
 
 logger = logging.getLogger(__name__)
@@ -27,9 +40,8 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(mess
 
 
 def load_raw_events(path: str) -> Iterable[Dict]:
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            yield json.loads(line)
+    # The intermediate format (JSONL, msgpack or Arrow) is detected from the file.
+    return read_events(path)
 
 
 def get_engine() -> Engine:
@@ -49,51 +61,30 @@ def upsert_venue(conn, name: str, address: Optional[str], city: Optional[str], d
     ).fetchone()
     if row:
         return row.id
-    # Insert new venue
-    geom_expr = "ST_SetSRID(ST_MakePoint(:lon, :lat), 4326)" if lat and lon else None
-    if geom_expr:
-        insert_sql = text(
-            """
-            INSERT INTO venues (name, address, city, department, region, postcode, latitude, longitude, geom)
-            VALUES (:name, :address, :city, :department, :region, NULL, :lat, :lon, ST_SetSRID(ST_MakePoint(:lon, :lat), 4326))
-            RETURNING id
-            """
-        )
-        params = {
-            "name": name,
-            "address": address,
-            "city": city,
-            "department": department,
-            "region": region,
-            "lat": lat,
-            "lon": lon,
-        }
-    else:
-        insert_sql = text(
-            """
-            INSERT INTO venues (name, address, city, department, region)
-            VALUES (:name, :address, :city, :department, :region)
-            RETURNING id
-            """
-        )
-        params = {
-            "name": name,
-            "address": address,
-            "city": city,
-            "department": department,
-            "region": region,
-        }
-    res = conn.execute(insert_sql, params)
-    vid = res.scalar()
-    return vid
-
-
-def upsert_tournament(conn, venue_id: int, event: Dict) -> None:
-    """Insert or update a tournament based on unique constraint."""
+    return insert_venue(conn, name, address, city, department, region, lat, lon)
+
+
+def upsert_tournament(conn, venue_id: int, event: Dict) -> str:
+    """Insert or update a tournament based on unique constraint.
+
+    An event merged from several sources updates in place the tournament
+    already stored for any of them (see `matching`); other events are only
+    matched by the unique key, which saves a query per row (`BulkWriter`
+    matches every event, once per batch). A tournament whose ``source_hash``
+    has not changed is left untouched. Returns "inserted", "updated" or
+    "unchanged".
+    """
+    if len(event.get("origins") or ()) > 1:
+        (item,), deleted = match_stored(conn, [(event, venue_id)])
+        if item is not None:
+            event, venue_id = item[0], item[1] or venue_id
+        if deleted:
+            conn.execute(text(DELETE_STORED_SQL), {"ids": deleted})
+    origins = event_origins(event)
     insert_sql = text(
         """
-        INSERT INTO tournaments (venue_id, title, description, start_datetime_local, end_datetime_local, timezone, buy_in_cents, currency, variant, status, source_url, source_hash)
-        VALUES (:venue_id, :title, :description, :start, :end, :tz, :buy_in_cents, :currency, :variant, :status, :source_url, :source_hash)
+        INSERT INTO tournaments (venue_id, title, description, start_datetime_local, end_datetime_local, timezone, buy_in_cents, currency, variant, status, source_url, source_hash, source_ids, origins)
+        VALUES (:venue_id, :title, :description, :start, :end, :tz, :buy_in_cents, :currency, :variant, :status, :source_url, :source_hash, CAST(:source_ids AS TEXT[]), CAST(:origins AS JSONB))
         ON CONFLICT (venue_id, title, start_datetime_local) DO UPDATE
         SET description = EXCLUDED.description,
             end_datetime_local = EXCLUDED.end_datetime_local,
@@ -102,11 +93,16 @@ def upsert_tournament(conn, venue_id: int, event: Dict) -> None:
             status = EXCLUDED.status,
             source_url = EXCLUDED.source_url,
             source_hash = EXCLUDED.source_hash,
+            source_ids = EXCLUDED.source_ids,
+            origins = EXCLUDED.origins,
             updated_at = NOW()
+        WHERE tournaments.source_hash IS DISTINCT FROM EXCLUDED.source_hash
+           OR tournaments.status IS DISTINCT FROM EXCLUDED.status
+        RETURNING (xmax = 0) AS inserted
         ;
         """
     )
-    conn.execute(insert_sql, {
+    row = conn.execute(insert_sql, {
         "venue_id": venue_id,
         "title": event["title"],
         "description": event.get("description"),
@@ -119,7 +115,12 @@ def upsert_tournament(conn, venue_id: int, event: Dict) -> None:
         "status": event.get("status", "scheduled"),
         "source_url": event.get("source_url"),
         "source_hash": event.get("source_hash"),
-    })
+        "source_ids": source_ids(origins),
+        "origins": json.dumps(origins),
+    }).fetchone()
+    if row is None:
+        return "unchanged"
+    return "inserted" if row.inserted else "updated"
 
 
 def normalize_event(raw: Dict) -> Optional[Dict]:
@@ -130,11 +131,12 @@ def normalize_event(raw: Dict) -> Optional[Dict]:
     title = raw.get("title")
     if not title:
         return None
-    start_dt = parse_datetime(raw.get("start"))
+    source = raw.get("source_name")
+    start_dt = parse_datetime(raw.get("start"), source)
     if not start_dt:
         # Without a valid start date we cannot insert
         return None
-    end_dt = parse_datetime(raw.get("end"))
+    end_dt = parse_datetime(raw.get("end"), source)
     buy_in_cents = parse_buy_in(raw.get("buy_in"))
     variant = normalize_variant(raw.get("variant"))
     return {
@@ -147,42 +149,342 @@ def normalize_event(raw: Dict) -> Optional[Dict]:
         "venue_name": raw.get("venue_name"),
         "address": raw.get("address"),
         "city": raw.get("city"),
+        "source_name": raw.get("source_name"),
         "source_url": raw.get("source_url"),
+        "source_id": raw.get("source_id") or identity_key(raw),
         "source_hash": raw.get("source_hash"),
         "status": raw.get("status", "scheduled"),
         "timezone": "{{TIMEZONE}}",
     }
 
 
-def normalize_and_upsert(raw_events_path: Optional[str] = None) -> None:
-    """Main entry point: normalise all events from the given file and upsert them."""
+def geocode_query(ev: Dict) -> Optional[str]:
+    """Return the string geocoded for the venue of ``ev``, or None without address or city."""
+    address = ev.get("address")
+    city = ev.get("city")
+    if not (address or city):
+        return None
+    return ", ".join(filter(None, [ev.get("venue_name") or "Unknown Venue", address, city, "France"]))
+
+
+def venue_fields(ev: Dict, geo: Optional[GeocodeResult] = None, lookup: bool = True) -> Dict:
+    """Return the venue fields of a normalised event.
+
+    Its address is geocoded unless ``lookup`` is False, in which case the
+    coordinates of ``geo`` (if any) are used.
+    """
+    if lookup:
+        query = geocode_query(ev)
+        geo = geocode_address(query) if query else None
+    return {
+        "name": ev.get("venue_name") or "Unknown Venue",
+        "address": ev.get("address"),
+        "city": ev.get("city"),
+        "department": geo.department if geo else None,
+        "region": geo.region if geo else None,
+        "lat": geo.lat if geo else None,
+        "lon": geo.lon if geo else None,
+    }
+
+
+def is_tombstone(ev: Dict) -> bool:
+    """Return whether ``ev`` is the tombstone of an event removed from its source."""
+    return ev.get("change") == "removed"
+
+
+def iter_normalized(raw_events: Iterable[Dict]) -> Iterator[Dict]:
+    """Yield the normalised events of ``raw_events``, skipping invalid ones.
+
+    Tombstones from an incremental (delta) ingestion run are passed through
+    (see `is_tombstone`). The input position set by `numbered`, if any, is
+    kept in ``position``.
+    """
+    for raw in raw_events:
+        if is_tombstone(raw):
+            tombstone = {key: raw.get(key) for key in ("source_name", "source_id", "source_hash", "change")}
+            if "_position" in raw:
+                tombstone["position"] = raw["_position"]
+            yield tombstone
+            continue
+        ev = normalize_event(raw)
+        if ev:
+            if "_position" in raw:
+                ev["position"] = raw["_position"]
+            yield ev
+
+
+def numbered(raw_events: Iterable[Dict]) -> Iterator[Dict]:
+    """Yield ``raw_events`` with their index in the input under ``_position``."""
+    for position, raw in enumerate(raw_events):
+        raw["_position"] = position
+        yield raw
+
+
+def normalize_chunk(raw_events: List[Dict]) -> List[Dict]:
+    """Normalise a chunk of raw events in a worker process (see `parallel`)."""
+    return list(iter_normalized(raw_events))
+
+
+def normalize_and_upsert(
+    raw_events_path: Optional[str] = None,
+    batch_size: int = BULK_BATCH_SIZE,
+    lookahead: int = GEOCODE_LOOKAHEAD,
+    workers: int = NORMALIZE_WORKERS,
+    chunk_size: int = NORMALIZE_CHUNK_SIZE,
+    dedup: bool = DEDUP_ENABLED,
+    commit_size: int = COMMIT_SIZE,
+    from_scratch: bool = False,
+) -> Dict[str, int]:
+    """Main entry point: normalise all events from the given file and upsert them.
+
+    The run commits every ``commit_size`` events (0 commits once, at the
+    end) and records after each commit how many input records are written in
+    a checkpoint next to the input. If a previous run on the same file was
+    interrupted, those records are skipped, unless ``from_scratch`` is set.
+    Once the whole file is written, the ingestion run that produced it is
+    acknowledged, so that the next delta is taken against it (see
+    `ingestion.state`). See `upsert_events` for the other options; returns
+    its counts.
+    """
     if raw_events_path is None:
-        raw_events_path = str(Path(__file__).parents[1] / "ingestion" / "output" / "raw_events.jsonl")
+        raw_events_path = str(find_latest(Path(__file__).parents[1] / "ingestion" / "output", "raw_events"))
+    # Read before the file: a run marker written later belongs to a newer file.
+    run_id = read_run(Path(raw_events_path))
+    checkpoint = Checkpoint(raw_events_path)
+    if from_scratch:
+        checkpoint.clear()
+    skip = checkpoint.load()
+    if skip:
+        logger.info("Resuming %s: skipping %d records committed by an interrupted run", raw_events_path, skip)
+    counts = upsert_events(
+        numbered(load_raw_events(raw_events_path)), batch_size, lookahead, workers, chunk_size, dedup, commit_size, checkpoint, skip
+    )
+    checkpoint.clear()
+    if run_id is not None:
+        acknowledged = acknowledge_run(run_id)
+        logger.info("Ingestion run %s acknowledged for %d sources", run_id, acknowledged)
+    return counts
+
+
+def upsert_events(
+    raw_events: Iterable[Dict],
+    batch_size: int = BULK_BATCH_SIZE,
+    lookahead: int = GEOCODE_LOOKAHEAD,
+    workers: int = NORMALIZE_WORKERS,
+    chunk_size: int = NORMALIZE_CHUNK_SIZE,
+    dedup: bool = DEDUP_ENABLED,
+    commit_size: int = COMMIT_SIZE,
+    checkpoint: Optional[Checkpoint] = None,
+    skip: int = 0,
+) -> Dict[str, int]:
+    """Normalise ``raw_events`` and upsert them, committing every ``commit_size`` events.
+
+    On Postgres, events are written in batches of ``batch_size`` through the
+    set-based `BulkWriter`; ``batch_size=0`` (or another database) uses the
+    per-row upserts. With ``lookahead`` > 0 addresses are geocoded in the
+    background that many events ahead of the writer (see `prefetch`);
+    ``lookahead=0`` geocodes each event before writing it. With
+    ``workers`` > 0 raw events are normalised on that many processes, in
+    chunks of ``chunk_size`` (see `parallel`), and written in input order.
+    With ``dedup``, the same tournament announced by several sources is
+    merged into one canonical event before writing (see `dedup`); the
+    normalised events are then held in memory. The bulk writer writes every
+    event over the tournament already stored for its sources (see
+    `matching`); the per-row upserts only do so for merged events.
+
+    With a ``checkpoint``, the input position (see `numbered`) reached is
+    saved after each commit; events before position ``skip`` are not
+    written. Tombstones (see `is_tombstone`) remove their source from the
+    tournaments built from it, cancelling those left without any (see
+    `matching.remove_tournament`). Returns the number of events written and
+    the inserted, updated, unchanged and cancelled counts.
+    """
     engine = get_engine()
+    geocoder = get_geocoder()
+    prefetcher = GeocodePrefetcher(geocoder, lookahead) if lookahead > 0 else None
+    backfill = VenueBackfill()
     count = 0
-    with engine.begin() as conn:
-        for raw in load_raw_events(raw_events_path):
-            ev = normalize_event(raw)
-            if not ev:
-                continue
-            # Determine venue information and geocode if needed
-            venue_name = ev.get("venue_name") or "Unknown Venue"
-            address = ev.get("address")
-            city = ev.get("city")
-            lat = lon = dept = region = None
-            if address or city:
-                addr_str = ", ".join(filter(None, [venue_name, address, city, "France"]))
-                geo = geocode_address(addr_str)
-                if geo:
-                    lat = geo.lat
-                    lon = geo.lon
-                    dept = geo.department
-                    region = geo.region
-            venue_id = upsert_venue(conn, venue_name, address, city, dept, region, lat, lon)
-            upsert_tournament(conn, venue_id, ev)
-            count += 1
-    logger.info("Normalisation complete: inserted/updated %d events", count)
+    outcomes = {"inserted": 0, "updated": 0, "unchanged": 0, "cancelled": 0}
+    parallel_stats: Dict[str, float] = {}
+    dedup_stats: Dict[str, int] = {}
+    commits = 0
+    aliases_saved = 0
+    start = time.perf_counter()
+    try:
+        with engine.connect() as conn:
+            resolver = VenueResolver(conn)
+            writer = None
+            if batch_size > 0 and engine.dialect.name == "postgresql":
+                writer = BulkWriter(conn, batch_size, resolver=resolver)
+            if workers > 0:
+                events = map_chunks(normalize_chunk, raw_events, workers, chunk_size, stats=parallel_stats)
+            else:
+                events = iter_normalized(raw_events)
+            if dedup:
+                deduped, dedup_stats = dedupe(events)
+                events = iter(deduped)
+            if skip:
+                # Events keep their input order (clusters that of their first event).
+                events = (ev for ev in events if ev["position"] >= skip)
+            if prefetcher is None:
+                stream: Iterable[Tuple[Dict, Optional[str]]] = ((ev, None) for ev in events)
+            else:
+                stream = prefetcher.lookahead_stream(events, geocode_query)
+            batches = 0
+            committed = 0
+            for ev, query in stream:
+                if is_tombstone(ev):
+                    if writer is not None:
+                        writer.remove(ev)
+                    else:
+                        outcomes[remove_tournament(conn, ev)] += 1
+                    count += 1
+                else:
+                    pending_address = None
+                    if prefetcher is None:
+                        venue = venue_fields(ev)
+                    else:
+                        known, geo = prefetcher.get(query) if query is not None else (True, None)
+                        venue = venue_fields(ev, geo, lookup=False)
+                        if not known:
+                            pending_address = query
+                        backfill.collect(prefetcher)
+                    if writer is not None:
+                        venue_ref = writer.add(venue, ev)
+                    else:
+                        venue_ref = resolver.resolve(venue)
+                        outcomes[upsert_tournament(conn, venue_ref, ev)] += 1
+                    if pending_address is not None and venue_ref is not None:
+                        # By id: the venue may be stored under another spelling (see `venues`).
+                        backfill.defer(pending_address, venue_ref)
+                    count += 1
+                # Backfilled venues must exist: with the bulk writer, wait for the batch to be flushed.
+                if prefetcher is not None and (writer is None or writer.stats["batches"] != batches):
+                    backfill.apply(conn, resolver)
+                    batches = int(writer.stats["batches"]) if writer is not None else 0
+                if commit_size > 0 and count - committed >= commit_size:
+                    if writer is not None:
+                        writer.flush()
+                        if prefetcher is not None:
+                            backfill.apply(conn, resolver)
+                    aliases_saved += resolver.save_aliases()
+                    conn.commit()
+                    committed = count
+                    commits += 1
+                    if checkpoint is not None:
+                        # Only numbered input (see `numbered`) has positions.
+                        checkpoint.save(ev["position"] + 1)
+                        logger.debug("Committed %d events, input position %d", count, ev["position"] + 1)
+                    else:
+                        logger.debug("Committed %d events", count)
+            if writer is not None:
+                stats = writer.close()
+                for outcome in outcomes:
+                    outcomes[outcome] = int(stats[outcome])
+                logger.info(
+                    "Bulk writes: %d batches, %d new venues, %d duplicate tournaments deleted, COPY %.2fs, merge %.2fs",
+                    stats["batches"],
+                    stats["venues_inserted"],
+                    stats["duplicates_deleted"],
+                    stats["copy_seconds"],
+                    stats["merge_seconds"],
+                )
+            aliases_saved += resolver.save_aliases()
+            logger.info(
+                "Venues: %d loaded (%d aliases), %d exact hits, %d alias hits, %d matched, %d missed, %d created, %d aliases saved",
+                resolver.stats["loaded"],
+                resolver.stats["aliases"],
+                resolver.stats["hits"],
+                resolver.stats["alias_hits"],
+                resolver.stats["matched"],
+                resolver.stats["misses"],
+                resolver.stats["created"],
+                aliases_saved,
+            )
+            conn.commit()
+            commits += 1
+        if prefetcher is not None:
+            # The events are committed: only the remaining geocoding is waited for.
+            logger.info("Events written in %.2fs, waiting for %d queued addresses", time.perf_counter() - start, prefetcher.pending)
+            prefetcher.close()
+            backfill.collect(prefetcher)
+            with engine.begin() as conn:
+                backfill.apply(conn, resolver)
+            logger.info(
+                "Geocoding prefetch: %d addresses, %d cached, %d resolved in background, %d venues deferred, %d backfilled",
+                prefetcher.stats["addresses"],
+                prefetcher.stats["cached"],
+                prefetcher.stats["resolved"],
+                backfill.stats["deferred"],
+                backfill.stats["backfilled"],
+            )
+    finally:
+        if prefetcher is not None:
+            prefetcher.close(wait=False)
+    logger.info(
+        "Geocoding: %d lookups, %d from memory, %d from cache, %d known not found, %d from gazetteer, %d Nominatim requests (%.0f%% hit rate)",
+        geocoder.stats["lookups"],
+        geocoder.stats["lru_hits"],
+        geocoder.stats["db_hits"],
+        geocoder.stats["negative_hits"],
+        geocoder.stats["gazetteer_hits"],
+        geocoder.stats["remote"],
+        100 * geocoder.hit_rate,
+    )
+    if parallel_stats:
+        logger.info(
+            "Parallel normalisation: %d workers, %d chunks, writer waited %.2fs for workers",
+            workers,
+            parallel_stats["chunks"],
+            parallel_stats["wait_seconds"],
+        )
+    if dedup_stats:
+        logger.info(
+            "Deduplication: %d events, %d merged into another source's event, %d title comparisons",
+            dedup_stats["events"],
+            dedup_stats["merged"],
+            dedup_stats["comparisons"],
+        )
+    elapsed = time.perf_counter() - start
+    logger.info(
+        "Normalisation complete: %d events (%d inserted, %d updated, %d unchanged, %d cancelled) in %d commits, %.2fs (%.0f events/s)",
+        count,
+        outcomes["inserted"],
+        outcomes["updated"],
+        outcomes["unchanged"],
+        outcomes["cancelled"],
+        commits,
+        elapsed,
+        count / elapsed if elapsed else 0.0,
+    )
+    return dict(outcomes, events=count)
 
 
 if __name__ == "__main__":
-    normalize_and_upsert()
+    parser = argparse.ArgumentParser(description="Normalise raw events and upsert them into the database.")
+    parser.add_argument("raw_events_path", nargs="?", help="raw events file (latest ingestion output by default)")
+    parser.add_argument("--batch-size", type=int, default=BULK_BATCH_SIZE, help="events per bulk batch, 0 for per-row upserts")
+    parser.add_argument(
+        "--lookahead", type=int, default=GEOCODE_LOOKAHEAD, help="events read ahead for background geocoding, 0 to geocode inline"
+    )
+    parser.add_argument("--workers", type=int, default=NORMALIZE_WORKERS, help="normalisation processes, 0 to normalise inline")
+    parser.add_argument("--chunk-size", type=int, default=NORMALIZE_CHUNK_SIZE, help="raw events per worker chunk")
+    parser.add_argument(
+        "--dedup", dest="dedup", action="store_true", default=DEDUP_ENABLED, help="merge duplicates across sources"
+    )
+    parser.add_argument("--no-dedup", dest="dedup", action="store_false", help="do not merge duplicates across sources")
+    parser.add_argument("--commit-size", type=int, default=COMMIT_SIZE, help="events per transaction, 0 for a single transaction")
+    parser.add_argument(
+        "--from-scratch", action="store_true", help="ignore the checkpoint of an interrupted run and process the whole file"
+    )
+    args = parser.parse_args()
+    normalize_and_upsert(
+        args.raw_events_path,
+        args.batch_size,
+        args.lookahead,
+        args.workers,
+        args.chunk_size,
+        args.dedup,
+        args.commit_size,
+        args.from_scratch,
+    )
@@ -0,0 +1,227 @@
+"""
+Background geocoding for the normaliser.
+
+Nominatim allows about one request per second, so geocoding new addresses
+inline held the whole normalisation (and its open transaction) for at least
+`GEOCODER_MIN_DELAY_SECONDS` per address. `GeocodePrefetcher` takes that off
+the write path:
+
+* `lookahead_stream` reads the event stream ``lookahead`` events ahead of the
+  writer (`NORMALIZE_GEOCODE_LOOKAHEAD`), and looks the new addresses of each
+  read-ahead up in the geocode cache with one `geocode_many` call;
+* addresses missing from the cache are queued, once each, to a background
+  thread that sends them to Nominatim at the allowed rate;
+* when the writer reaches an event, its coordinates are used if they are
+  known by then; otherwise the venue is written without them and
+  `VenueBackfill` sets them once the answer arrives.
+
+A run then takes roughly as long as the slower of geocoding and writing,
+instead of their sum.
+"""
+from __future__ import annotations
+
+import itertools
+import logging
+import os
+import queue
+import threading
+from collections import deque
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
+
+from sqlalchemy import text
+
+from .geocode import GeocodeResult, GeocoderService
+from .venues import VenueResolver
+
+logger = logging.getLogger(__name__)
+
+LOOKAHEAD = int(os.environ.get("NORMALIZE_GEOCODE_LOOKAHEAD", "1000"))
+
+BACKFILL_VENUE_SQL = """
+UPDATE venues
+SET latitude = :lat,
+    longitude = :lon,
+    geom = ST_SetSRID(ST_MakePoint(:lon, :lat), 4326),
+    department = COALESCE(department, :department),
+    region = COALESCE(region, :region)
+WHERE id = :venue_id AND latitude IS NULL
+"""
+
+T = TypeVar("T")
+
+
+class GeocodePrefetcher:
+    """Resolves addresses ahead of the writer on a background thread."""
+
+    def __init__(self, service: GeocoderService, lookahead: int = LOOKAHEAD) -> None:
+        self.service = service
+        self.lookahead = max(1, lookahead)
+        self._lock = threading.Lock()
+        self._results: Dict[str, Optional[GeocodeResult]] = {}
+        self._submitted: Set[str] = set()
+        self._arrived: List[str] = []
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self.stats: Dict[str, int] = {
+            "addresses": 0,
+            "cached": 0,
+            "queued": 0,
+            "resolved": 0,
+        }
+        self._thread = threading.Thread(
+            target=self._run, name="geocode-prefetch", daemon=True
+        )
+        self._thread.start()
+
+    def submit_many(self, addresses: Iterable[str]) -> None:
+        """Answer ``addresses`` from the cache and queue the others, once each."""
+        fresh = [a for a in dict.fromkeys(addresses) if a and a not in self._submitted]
+        if not fresh:
+            return
+        self._submitted.update(fresh)
+        cached = self.service.geocode_many(fresh, remote=False)
+        with self._lock:
+            self._results.update(cached)
+        self.stats["addresses"] += len(fresh)
+        self.stats["cached"] += len(cached)
+        for address in fresh:
+            if address not in cached:
+                self.stats["queued"] += 1
+                self._queue.put(address)
+
+    def get(self, address: str) -> Tuple[bool, Optional[GeocodeResult]]:
+        """Return (known, result): whether ``address`` is resolved yet, and how."""
+        with self._lock:
+            if address in self._results:
+                return True, self._results[address]
+        return False, None
+
+    def completed(self) -> List[Tuple[str, Optional[GeocodeResult]]]:
+        """Return the addresses resolved in the background since the last call."""
+        with self._lock:
+            arrived, self._arrived = self._arrived, []
+            return [(address, self._results[address]) for address in arrived]
+
+    def lookahead_stream(
+        self, items: Iterable[T], address_of: Callable[[T], Optional[str]]
+    ) -> Iterator[Tuple[T, Optional[str]]]:
+        """Yield (item, address) pairs, submitting addresses ``lookahead`` items early.
+
+        The read-ahead buffer is refilled when half empty, so the cache is
+        queried for half a window of addresses at a time.
+        """
+        it = iter(items)
+        buffer: "deque[Tuple[T, Optional[str]]]" = deque()
+        exhausted = False
+        while True:
+            if not exhausted and len(buffer) <= self.lookahead // 2:
+                wanted = self.lookahead - len(buffer)
+                batch = [
+                    (item, address_of(item)) for item in itertools.islice(it, wanted)
+                ]
+                exhausted = len(batch) < wanted
+                buffer.extend(batch)
+                self.submit_many(address for _, address in batch if address)
+            if not buffer:
+                return
+            yield buffer.popleft()
+
+    def _run(self) -> None:
+        while True:
+            address = self._queue.get()
+            if address is None:
+                return
+            try:
+                result = self.service.geocode(address)
+            except Exception:
+                logger.exception("Background geocoding failed for %r", address)
+                result = None
+            with self._lock:
+                self._results[address] = result
+                self._arrived.append(address)
+                self.stats["resolved"] += 1
+
+    @property
+    def pending(self) -> int:
+        """Addresses queued for Nominatim and not resolved yet."""
+        with self._lock:
+            return self.stats["queued"] - self.stats["resolved"]
+
+    def close(self, wait: bool = True) -> None:
+        """Stop the background thread, after the queued addresses when ``wait``."""
+        if not self._thread.is_alive():
+            return
+        if not wait:
+            try:
+                while True:
+                    self._queue.get_nowait()
+            except queue.Empty:
+                pass
+        self._queue.put(None)
+        self._thread.join()
+
+
+class VenueBackfill:
+    """Sets the coordinates of venues written before their address was geocoded.
+
+    Venues are identified by their id, or by their pending id in the
+    `VenueResolver` when the bulk writer has not created them yet, rather
+    than by name: a venue matched under another spelling is stored under its
+    own name.
+    """
+
+    def __init__(self) -> None:
+        self._waiting: Dict[str, Set[int]] = {}
+        self._ready: List[Tuple[int, GeocodeResult]] = []
+        self.stats: Dict[str, int] = {"deferred": 0, "backfilled": 0}
+
+    def defer(self, address: str, venue_ref: int) -> None:
+        """Record that venue ``venue_ref`` was written before ``address`` was resolved."""
+        refs = self._waiting.setdefault(address, set())
+        if venue_ref not in refs:
+            refs.add(venue_ref)
+            self.stats["deferred"] += 1
+
+    def collect(self, prefetcher: GeocodePrefetcher) -> None:
+        """Pick up the addresses the prefetcher resolved since the last call."""
+        for address, result in prefetcher.completed():
+            refs = self._waiting.pop(address, ())
+            if result is not None:
+                self._ready.extend((ref, result) for ref in refs)
+
+    def apply(self, conn, resolver: Optional[VenueResolver] = None) -> int:
+        """Update the venues whose coordinates arrived.
+
+        Pending venues (negative references) are resolved through
+        ``resolver``; those not created yet are kept for a later call.
+        """
+        updated = 0
+        waiting = []
+        for ref, geo in self._ready:
+            venue_id = resolver.venue_id(ref) if resolver is not None else ref
+            if venue_id is None or venue_id < 0:
+                waiting.append((ref, geo))
+                continue
+            res = conn.execute(
+                text(BACKFILL_VENUE_SQL),
+                {
+                    "venue_id": venue_id,
+                    "lat": geo.lat,
+                    "lon": geo.lon,
+                    "department": geo.department,
+                    "region": geo.region,
+                },
+            )
+            updated += res.rowcount
+        self._ready = waiting
+        self.stats["backfilled"] += updated
+        return updated
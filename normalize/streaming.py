@@ -0,0 +1,244 @@
+"""
+In-process streaming pipeline from the ingestors to the database.
+
+The file pipeline runs `ingestion.run_all.main`, which writes the whole
+``raw_events`` file, then `normalizer.normalize_and_upsert`, which reads it
+back: nothing reaches the database before the slowest source is done.
+`run_pipeline` overlaps the two stages. The ingestion sources run on their
+worker threads as usual (same concurrency and per-host limits, part files,
+HTTP cache and state store), and every raw event they produce is also put
+on an `EventStream`, a bounded queue drained by `normalizer.upsert_events` on
+the calling thread. The first events are normalised, written and committed
+(every `NORMALIZE_COMMIT_SIZE` events) while later sources are still being
+fetched.
+
+The queue holds at most `INGEST_STREAM_QUEUE_SIZE` events: when the writer
+falls behind, the source threads block on it instead of piling events up in
+memory. Each source still writes its part file under ``OUTPUT_DIR/parts``;
+only the assembled ``raw_events`` file is skipped, unless an audit path is
+given.
+
+Differences with the file pipeline:
+
+* the stream mode does not deduplicate across sources (`dedup` needs the
+  whole run): a new tournament announced by two sources is written twice.
+  Tournaments already stored are still updated in place (see `matching`);
+* events reach the database as they are parsed, so a source failing halfway
+  has its first events written (upserts are idempotent, and the next run
+  completes them);
+* events arrive interleaved across sources rather than in catalogue order;
+* there are no tombstones: like a full run, a stream run does not remove
+  tournaments that disappeared from their source.
+
+The state of the sources (see `ingestion.state`) is acknowledged only once
+the writer has written every event; if it fails, the next run starts again
+from the previous state.
+
+Usage::
+
+    python -m normalize.streaming [--audit ingestion/output/raw_events.jsonl]
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from ingestion import formats
+from ingestion.http_cache import HttpCache
+from ingestion.parse_pool import PARSE_WORKERS, ParsePool
+from ingestion.run_all import (
+    CATALOG_PATH,
+    OUTPUT_DIR,
+    assemble_output,
+    enabled_sources,
+    load_catalog,
+)
+from ingestion.runner import log_results, run_sources
+from ingestion.state import StateStore, new_run_id
+
+from .bulk import BATCH_SIZE as BULK_BATCH_SIZE
+from .checkpoint import COMMIT_SIZE
+from .normalizer import upsert_events
+from .prefetch import LOOKAHEAD as GEOCODE_LOOKAHEAD
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = int(os.environ.get("INGEST_STREAM_QUEUE_SIZE", "10000"))
+# How often a blocked producer checks whether the stream was closed.
+POLL_SECONDS = 0.1
+
+_END = object()
+
+
+class EventStream:
+    """Bounded queue of raw events from the source threads to one consumer.
+
+    `put` blocks while the queue is full. Events put after `finish` (by a
+    source thread that outlived its run, see `runner.run_sources`) or once
+    the consumer has gone (`close`) are dropped, so that no source thread
+    stays blocked forever.
+    """
+
+    def __init__(self, maxsize: int = QUEUE_SIZE) -> None:
+        self._queue: "queue.Queue" = queue.Queue(max(1, maxsize))
+        self._closed = threading.Event()
+        self._finished = False
+        self._lock = threading.Lock()
+        self.stats: Dict[str, float] = {
+            "events": 0,
+            "dropped": 0,
+            "blocked_seconds": 0.0,
+        }
+
+    def put(self, event: Dict) -> None:
+        if self._finished:
+            with self._lock:
+                self.stats["dropped"] += 1
+            return
+        self._put(event)
+
+    def _put(self, item) -> None:
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            start = time.perf_counter()
+            while True:
+                if self._closed.is_set():
+                    with self._lock:
+                        self.stats["dropped"] += 1
+                    return
+                try:
+                    self._queue.put(item, timeout=POLL_SECONDS)
+                    break
+                except queue.Full:
+                    continue
+            with self._lock:
+                self.stats["blocked_seconds"] += time.perf_counter() - start
+        if item is not _END:
+            with self._lock:
+                self.stats["events"] += 1
+
+    def finish(self) -> None:
+        """Signal the consumer that no more events will come."""
+        self._finished = True
+        self._put(_END)
+
+    def close(self) -> None:
+        """Stop accepting events (the consumer is done or failed)."""
+        self._closed.set()
+
+    def __iter__(self) -> Iterator[Dict]:
+        while True:
+            item = self._queue.get()
+            if item is _END:
+                return
+            yield item
+
+
+def run_pipeline(
+    audit_path: Optional[str] = None,
+    fmt: Optional[str] = None,
+    queue_size: int = QUEUE_SIZE,
+    batch_size: int = BULK_BATCH_SIZE,
+    lookahead: int = GEOCODE_LOOKAHEAD,
+    commit_size: int = COMMIT_SIZE,
+    sources: Optional[List[Dict]] = None,
+) -> Dict[str, int]:
+    """Ingest the enabled sources straight into the database.
+
+    ``audit_path``, if given, receives the raw events of the successful
+    sources, as the file pipeline would have written them, in format ``fmt``.
+    ``sources`` defaults to the enabled sources of the catalogue. Returns the
+    counts of `normalizer.upsert_events`.
+    """
+    fmt = formats.resolve_format(fmt or formats.FORMAT)
+    if sources is None:
+        sources = enabled_sources(load_catalog(str(CATALOG_PATH)))
+    stream = EventStream(queue_size)
+    results: Dict[str, Dict] = {}
+    errors: List[BaseException] = []
+    run_id = new_run_id()
+    state = StateStore()
+    parse_pool = ParsePool() if PARSE_WORKERS > 0 else None
+
+    def produce() -> None:
+        try:
+            results.update(
+                run_sources(
+                    sources,
+                    OUTPUT_DIR / "parts",
+                    cache=HttpCache(),
+                    state=state,
+                    fmt=fmt,
+                    parse_pool=parse_pool,
+                    sink=stream.put,
+                    run_id=run_id,
+                )
+            )
+        except BaseException as exc:  # noqa: BLE001
+            errors.append(exc)
+        finally:
+            stream.finish()
+
+    start = time.time()
+    producer = threading.Thread(target=produce, name="stream-ingest", daemon=True)
+    producer.start()
+    try:
+        try:
+            counts = upsert_events(
+                stream, batch_size, lookahead, dedup=False, commit_size=commit_size
+            )
+        finally:
+            stream.close()
+            producer.join()
+        if not errors:
+            # Every event of the successful sources is in the database.
+            state.acknowledge(run_id)
+    finally:
+        state.close()
+        if parse_pool is not None:
+            parse_pool.close()
+    if errors:
+        raise errors[0]
+    log_results(results, time.time() - start)
+    logger.info(
+        "Stream: %d events queued, sources blocked %.2fs on a full queue, %d dropped",
+        stream.stats["events"],
+        stream.stats["blocked_seconds"],
+        stream.stats["dropped"],
+    )
+    if audit_path is not None:
+        assemble_output(
+            [r["path"] for r in results.values() if r["status"] == "ok"],
+            Path(audit_path),
+            fmt,
+        )
+        logger.info("Audit copy of the raw events written to %s", audit_path)
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Ingest all sources straight into the database."
+    )
+    parser.add_argument("--audit", help="also write the raw events to this file")
+    parser.add_argument(
+        "--format", choices=("auto", *formats.EXTENSIONS), default=formats.FORMAT
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=QUEUE_SIZE,
+        help="raw events buffered between sources and writer",
+    )
+    parser.add_argument(
+        "--commit-size", type=int, default=COMMIT_SIZE, help="events per transaction"
+    )
+    args = parser.parse_args()
+    run_pipeline(args.audit, args.format, args.queue_size, commit_size=args.commit_size)
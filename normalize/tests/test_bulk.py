@@ -0,0 +1,222 @@
+import csv
+import io
+from datetime import datetime, timezone
+
+from types import SimpleNamespace
+
+from normalize.bulk import COPY_SQL, STAGING_COLUMNS, BulkWriter
+from normalize.venues import VenueResolver
+
+
+class FakeCursor:
+    def __init__(self, copies):
+        self.copies = copies
+
+    def copy_expert(self, sql, f):
+        self.copies.append((sql, f.read()))
+
+    def close(self):
+        pass
+
+
+class FakeResult:
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+
+    def fetchall(self):
+        return self.rows
+
+    def one(self):
+        return self.rows[0]
+
+    def __iter__(self):
+        return iter(self.rows)
+
+
+def make_venue(venue_id, name, city, lat=None, lon=None):
+    return SimpleNamespace(
+        id=venue_id,
+        name=name,
+        city=city,
+        address=None,
+        postcode=None,
+        latitude=lat,
+        longitude=lon,
+    )
+
+
+class FakeConn:
+    def __init__(self, venues=(), tournaments=()):
+        self.venues = list(venues)
+        self.tournaments = list(tournaments)
+        self.deleted = []
+        self.statements = []
+        self.copies = []
+        self.connection = self
+
+    def cursor(self):
+        return FakeCursor(self.copies)
+
+    def execute(self, statement, params=None):
+        sql = str(statement)
+        self.statements.append(sql.split()[0])
+        if sql.startswith("SELECT id, name, city"):
+            return FakeResult(self.venues)
+        if sql.startswith("DELETE"):
+            self.deleted.extend(params["ids"])
+        elif "FROM tournaments" in sql:
+            return FakeResult(self.tournaments)
+        if "RETURNING id, name, city" in sql:
+            return FakeResult([make_venue(7, "Casino Lyon", None)])
+        if sql.lstrip().startswith("WITH batch"):
+            # Pretend the first row of each batch is new and the others unchanged.
+            return FakeResult(
+                [
+                    SimpleNamespace(
+                        total=len(self.copies[-1][1].splitlines()),
+                        inserted=1,
+                        updated=0,
+                    )
+                ]
+            )
+        return FakeResult()
+
+
+def test_bulk_writer_copies_batches_then_merges():
+    conn = FakeConn()
+    writer = BulkWriter(conn, batch_size=2)
+    venue = {"name": "Casino Lyon", "city": "Lyon", "lat": 45.76, "lon": 4.83}
+    start = datetime(2025, 10, 1, 18, tzinfo=timezone.utc)
+    for title in ("Main Event", "Turbo", "Deepstack"):
+        writer.add(
+            venue,
+            {
+                "title": title,
+                "start": start,
+                "description": "" if title == "Turbo" else None,
+            },
+        )
+    stats = writer.close()
+
+    assert stats["batches"] == 2 and stats["events"] == 3
+    assert (stats["inserted"], stats["updated"], stats["unchanged"]) == (2, 0, 1)
+    assert [sql for sql, _ in conn.copies] == [COPY_SQL, COPY_SQL]
+    rows = list(csv.reader(io.StringIO(conn.copies[0][1])))
+    first = dict(zip(STAGING_COLUMNS, rows[0]))
+    assert first["title"] == "Main Event"
+    assert first["start_datetime_local"] == "2025-10-01T18:00:00+00:00"
+    assert first["description"] == "\\N"
+    assert dict(zip(STAGING_COLUMNS, rows[1]))["description"] == ""
+    # CREATE once, then per batch: venues INSERT, venue id UPDATE, tournaments merge, TRUNCATE.
+    assert conn.statements == ["CREATE"] + ["INSERT", "UPDATE", "WITH", "TRUNCATE"] * 2
+
+
+def test_resolver_skips_venue_statements_for_known_venues():
+    conn = FakeConn(venues=[make_venue(3, "Casino Lyon", "Lyon")])
+    resolver = VenueResolver(conn)
+    writer = BulkWriter(conn, batch_size=10, resolver=resolver)
+    start = datetime(2025, 10, 1, 18, tzinfo=timezone.utc)
+    writer.add(
+        {"name": "Casino Lyon", "city": "Lyon"}, {"title": "Main Event", "start": start}
+    )
+    writer.add(
+        {"name": "Casino Lyon", "city": None}, {"title": "Turbo", "start": start}
+    )
+    writer.close()
+    conn.statements.clear()
+    writer.add(
+        {"name": "Casino Lyon", "city": "Lyon"}, {"title": "Deepstack", "start": start}
+    )
+    writer.close()
+
+    rows = list(csv.reader(io.StringIO(conn.copies[0][1])))
+    assert [dict(zip(STAGING_COLUMNS, r))["venue_id"] for r in rows] == ["3", "\\N"]
+    # The known venue's tournaments are looked up, then merged.
+    assert conn.statements == ["SELECT", "WITH", "TRUNCATE"]
+    assert (
+        resolver.stats["hits"],
+        resolver.stats["misses"],
+        resolver.stats["created"],
+    ) == (2, 1, 1)
+
+
+def test_resolver_stages_name_variants_under_one_venue():
+    conn = FakeConn(venues=[make_venue(3, "Casino Barrière", "Deauville")])
+    resolver = VenueResolver(conn)
+    writer = BulkWriter(conn, batch_size=10, resolver=resolver)
+    start = datetime(2025, 10, 1, 18, tzinfo=timezone.utc)
+    writer.add(
+        {"name": "Barriere Deauville", "city": "Deauville"},
+        {"title": "Main Event", "start": start},
+    )
+    writer.add(
+        {"name": "Casino Lyon", "city": None}, {"title": "Turbo", "start": start}
+    )
+    writer.add(
+        {"name": "CASINO DE LYON", "city": None}, {"title": "Deepstack", "start": start}
+    )
+    writer.close()
+
+    rows = [
+        dict(zip(STAGING_COLUMNS, r))
+        for r in csv.reader(io.StringIO(conn.copies[0][1]))
+    ]
+    assert [(r["venue_name"], r["venue_id"]) for r in rows] == [
+        ("Barriere Deauville", "3"),
+        ("Casino Lyon", "\\N"),
+        ("Casino Lyon", "\\N"),
+    ]
+    # The variant of the new venue is aliased to it once it is created.
+    assert resolver.save_aliases() == 2
+    assert conn.statements[-1] == "INSERT"
+
+
+def test_stored_tournaments_are_updated_in_place():
+    origins = [
+        {
+            "source_name": "agenda",
+            "title": "MAIN EVENT",
+            "source_id": "a1",
+            "source_hash": "ha",
+        }
+    ]
+    start = datetime(2025, 10, 1, 18, tzinfo=timezone.utc)
+    tournaments = [
+        SimpleNamespace(
+            id=4,
+            venue_id=3,
+            title="MAIN EVENT",
+            start_datetime_local=start,
+            source_ids=["a1", "r1"],
+            origins=origins,
+        ),
+        SimpleNamespace(
+            id=9,
+            venue_id=3,
+            title="Main Event",
+            start_datetime_local=start,
+            source_ids=["r1"],
+            origins=None,
+        ),
+    ]
+    conn = FakeConn(tournaments=tournaments)
+    writer = BulkWriter(conn, batch_size=10)
+    event = {
+        "title": "Main Event",
+        "start": start,
+        "source_name": "rss",
+        "source_id": "r1",
+        "source_hash": "hr",
+    }
+    writer.add({"name": "Casino Lyon", "city": "Lyon"}, event)
+    stats = writer.close()
+
+    row = dict(zip(STAGING_COLUMNS, next(csv.reader(io.StringIO(conn.copies[0][1])))))
+    assert (row["title"], row["venue_id"], row["source_ids"]) == (
+        "MAIN EVENT",
+        "3",
+        "{a1,r1}",
+    )
+    assert conn.deleted == [9] and stats["duplicates_deleted"] == 1
+    # The venue is known from the stored tournament: no venue statements.
+    assert conn.statements == ["CREATE", "SELECT", "DELETE", "WITH", "TRUNCATE"]
@@ -0,0 +1,184 @@
+import json
+import os
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from ingestion.state import write_run
+from normalize import normalizer
+from normalize.checkpoint import Checkpoint
+
+
+def write_input(path, count):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(count):
+            event = {
+                "title": f"Deepstack #{i}",
+                "start": f"{i % 28 + 1:02d}/10/2025 20:00",
+                "venue_name": "Casino Lyon",
+                "city": "Lyon",
+                "source_name": "club",
+                "source_hash": str(i),
+            }
+            f.write(json.dumps(event) + "\n")
+
+
+def test_checkpoint_applies_to_unchanged_input_only(tmp_path):
+    path = tmp_path / "raw_events.jsonl"
+    write_input(path, 3)
+    checkpoint = Checkpoint(str(path))
+    assert checkpoint.load() == 0
+    checkpoint.save(2)
+    assert checkpoint.path.name == "raw_events.jsonl.checkpoint"
+    assert Checkpoint(str(path)).load() == 2
+
+    write_input(path, 4)
+    os.utime(path, ns=(0, 0))
+    assert checkpoint.load() == 0
+    checkpoint.clear()
+    checkpoint.clear()
+    assert not checkpoint.path.exists()
+
+
+@pytest.fixture
+def run(tmp_path, monkeypatch):
+    """Run `normalize_and_upsert` per row against SQLite, recording the tournaments written."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'db.sqlite'}", future=True)
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "CREATE TABLE venues (id INTEGER PRIMARY KEY, name TEXT, address TEXT, city TEXT, department TEXT, region TEXT, postcode TEXT, latitude REAL, longitude REAL)"
+            )
+        )
+        conn.execute(
+            text(
+                "CREATE TABLE venue_aliases (name_key TEXT, city_key TEXT, venue_id INTEGER, method TEXT)"
+            )
+        )
+        conn.execute(text("CREATE TABLE written (title TEXT)"))
+    crash_after = {"count": None}
+
+    def upsert_tournament(conn, venue_id, event):
+        if crash_after["count"] is not None:
+            if crash_after["count"] == 0:
+                raise RuntimeError("connection lost")
+            crash_after["count"] -= 1
+        conn.execute(
+            text("INSERT INTO written (title) VALUES (:title)"),
+            {"title": event["title"]},
+        )
+        return "inserted"
+
+    monkeypatch.setattr(normalizer, "get_engine", lambda: engine)
+    monkeypatch.setattr(
+        normalizer,
+        "get_geocoder",
+        lambda: SimpleNamespace(
+            stats=dict.fromkeys(
+                (
+                    "lookups",
+                    "lru_hits",
+                    "db_hits",
+                    "negative_hits",
+                    "gazetteer_hits",
+                    "remote",
+                ),
+                0,
+            ),
+            hit_rate=0.0,
+        ),
+    )
+    monkeypatch.setattr(normalizer, "geocode_address", lambda query: None)
+    monkeypatch.setattr(normalizer, "upsert_tournament", upsert_tournament)
+
+    def run(path, crash=None, **kwargs):
+        crash_after["count"] = crash
+        normalizer.normalize_and_upsert(
+            str(path), lookahead=0, commit_size=4, dedup=False, **kwargs
+        )
+
+    def written():
+        with engine.connect() as conn:
+            return [
+                row.title
+                for row in conn.execute(
+                    text("SELECT title FROM written ORDER BY rowid")
+                )
+            ]
+
+    run.written = written
+    return run
+
+
+def test_resumes_after_last_commit(tmp_path, run):
+    path = tmp_path / "raw_events.jsonl"
+    write_input(path, 10)
+    with pytest.raises(RuntimeError):
+        run(path, crash=6)
+    # One commit of 4 events; the 2 events written after it were rolled back.
+    assert len(run.written()) == 4
+    assert Checkpoint(str(path)).load() == 4
+
+    run(path)
+    assert run.written() == [f"Deepstack #{i}" for i in range(10)]
+    assert not Checkpoint(str(path)).path.exists()
+
+
+def test_from_scratch_ignores_checkpoint(tmp_path, run):
+    path = tmp_path / "raw_events.jsonl"
+    write_input(path, 6)
+    Checkpoint(str(path)).save(4)
+    run(path, from_scratch=True)
+    assert len(run.written()) == 6
+
+
+def test_acknowledges_the_ingestion_run_once_written(tmp_path, run, monkeypatch):
+    path = tmp_path / "raw_events.delta.jsonl"
+    write_input(path, 6)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(
+            json.dumps(
+                {
+                    "source_name": "club",
+                    "source_id": "gone",
+                    "source_hash": "h",
+                    "change": "removed",
+                }
+            )
+            + "\n"
+        )
+    write_run(path, "r1")
+    acknowledged, removed = [], []
+    monkeypatch.setattr(
+        normalizer, "acknowledge_run", lambda run_id: acknowledged.append(run_id) or 1
+    )
+    monkeypatch.setattr(
+        normalizer,
+        "remove_tournament",
+        lambda conn, tombstone: removed.append(tombstone["source_id"]) or "cancelled",
+    )
+    with pytest.raises(RuntimeError):
+        run(path, crash=5)
+    assert acknowledged == []
+
+    run(path)
+    assert acknowledged == ["r1"] and removed == ["gone"]
+
+
+def test_commits_unnumbered_events_without_checkpoint(run):
+    events = [
+        dict(
+            title=f"Deepstack #{i}",
+            start=f"0{i + 1}/10/2025 20:00",
+            venue_name="Casino Lyon",
+            city="Lyon",
+            source_name="club",
+        )
+        for i in range(6)
+    ]
+    counts = normalizer.upsert_events(
+        iter(events), lookahead=0, workers=0, dedup=False, commit_size=4
+    )
+    assert counts["events"] == 6
+    assert len(run.written()) == 6
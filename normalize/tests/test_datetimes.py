@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from normalize.datetimes import DatetimeParser
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        (
+            "2025-09-25T20:00:00+02:00",
+            datetime(2025, 9, 25, 20, tzinfo=timezone(timedelta(hours=2))),
+        ),
+        ("2025-09-25T18:00:00Z", datetime(2025, 9, 25, 18, tzinfo=timezone.utc)),
+        ("2025-09-25", datetime(2025, 9, 25)),
+        ("12/03/2025 19:30", datetime(2025, 3, 12, 19, 30)),
+        ("12-03-2025", datetime(2025, 3, 12)),
+        ("5.10.2025 à 20h", datetime(2025, 10, 5, 20)),
+        ("samedi 12 mars 2025 à 19h30", datetime(2025, 3, 12, 19, 30)),
+        ("Dimanche 1er juin 2025, 14H", datetime(2025, 6, 1, 14)),
+        ("3 févr. 2026 20:15", datetime(2026, 2, 3, 20, 15)),
+        ("15 août 2025", datetime(2025, 8, 15)),
+        ("Sep 25 2025 8pm", datetime(2025, 9, 25, 20)),
+    ],
+)
+def test_parses_common_formats(value, expected):
+    assert DatetimeParser().parse(value) == expected
+
+
+def test_invalid_values():
+    parser = DatetimeParser()
+    assert parser.parse(None) is None
+    assert parser.parse("") is None
+    assert parser.parse("31/02/2025") is None
+    assert parser.parse("12 brumaire 2025") is None
+    assert parser.stats["failed"] == 2
+
+
+def test_learns_format_per_source():
+    parser = DatetimeParser()
+    parser.parse("12/03/2025 19:30", source="club")
+    parser.parse("samedi 12 avril 2025 à 19h30", source="casino")
+    parser.parse("2025-04-12T19:30:00", source="feed")
+    assert parser.learned_formats() == {
+        "club": "dmy",
+        "casino": "fr_long",
+        "feed": "iso",
+    }
+    assert parser.parse("13/03/2025 20:00", source="club") == datetime(2025, 3, 13, 20)
+    assert parser.stats["dmy"] == 2
@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta, timezone
+
+from normalize.dedup import Deduplicator, dedupe, merge_cluster
+
+START = datetime(2025, 10, 4, 18, 0, tzinfo=timezone.utc)
+
+
+def make_event(
+    title, source, minutes=0, venue="Casino Barrière", city="Deauville", **fields
+):
+    event = {
+        "title": title,
+        "start": START + timedelta(minutes=minutes),
+        "venue_name": venue,
+        "city": city,
+        "source_name": source,
+        "source_url": f"https://{source}.example/{title}",
+        "source_hash": f"{source}-{title}",
+    }
+    event.update(fields)
+    return event
+
+
+def test_merges_title_variants_across_sources():
+    events = [
+        make_event("Main Event 150€", "rss", buy_in_cents=15000),
+        make_event(
+            "MAIN EVENT - 150 €", "agenda", minutes=30, description="Structure 30 min"
+        ),
+        make_event("Deep stack du samedi", "rss", minutes=60),
+        make_event("Deepstack samedi", "agenda", minutes=90, venue="CASINO BARRIERE"),
+    ]
+    merged, stats = dedupe(events)
+    # The most complete record is the canonical one.
+    assert [e["title"] for e in merged] == ["MAIN EVENT - 150 €", "Deepstack samedi"]
+    assert stats["merged"] == 2
+    main = merged[0]
+    assert main["buy_in_cents"] == 15000 and main["description"] == "Structure 30 min"
+    assert {o["source_name"] for o in main["origins"]} == {"rss", "agenda"}
+
+
+def test_keeps_distinct_events_apart():
+    events = [
+        make_event("Event #12", "rss"),
+        make_event("Event #13", "agenda"),
+        make_event("Main Event", "rss", minutes=0, buy_in_cents=15000),
+        make_event("Main Event", "agenda", minutes=0, buy_in_cents=25000),
+        make_event("Day 1A", "rss", minutes=300),
+        make_event("Day 1A", "rss", minutes=300, source_hash="other"),  # same source
+        make_event("Main Event 150€", "web", minutes=181),  # outside the 2-hour window
+        make_event("Main Event", "web", city="Cannes"),
+    ]
+    merged, stats = dedupe(events)
+    assert len(merged) == len(events)
+    assert stats["merged"] == 0
+
+
+def test_window_spans_bucket_boundaries():
+    dedup = Deduplicator(window_minutes=120)
+    dedup.add(make_event("Omaha PLO", "rss", minutes=119))
+    dedup.add(make_event("omaha plo", "agenda", minutes=125))
+    assert len(dedup.results()) == 1
+
+
+def test_canonical_record_ignores_input_order():
+    a = make_event("Main Event", "rss")
+    b = make_event("Main Event !", "agenda", description="desc")
+    first, second = merge_cluster([a, b]), merge_cluster([b, a])
+    assert first == second
+    assert first["title"] == "Main Event !"
+    assert first["source_hash"] not in (a["source_hash"], b["source_hash"])
+
+
+def test_events_without_venue_pass_through():
+    events = [
+        make_event("Main Event", "rss", venue=None),
+        make_event("Main Event", "agenda", venue=None),
+    ]
+    merged, _ = dedupe(events)
+    assert merged == events
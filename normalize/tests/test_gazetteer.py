@@ -0,0 +1,140 @@
+import math
+import random
+
+from normalize.gazetteer import (
+    Gazetteer,
+    KDTree,
+    _geo_api_rows,
+    _unit_vector,
+    fold,
+    get_gazetteer,
+)
+from normalize.geocode import GeocoderService
+from normalize.tests.test_geocode import FakeGeolocator
+
+
+def test_fold_ignores_accents_case_and_abbreviations():
+    assert fold("ÉVIAN-LES-BAINS") == fold("Evian les bains") == "evian les bains"
+    assert fold("St-Malo") == fold("Saint Malo")
+    assert fold("Les Sables-d’Olonne") == fold("les sables d'olonne")
+
+
+def test_lookup_and_locate_bundled_communes():
+    gazetteer = get_gazetteer()
+    assert gazetteer.lookup("deauville").department == "Calvados"
+    assert gazetteer.lookup(postcode="75008").name == "Paris"
+    assert gazetteer.lookup("Paris", "13001") is None
+    assert (
+        gazetteer.locate("Casino Barrière, 14800 Deauville, France").name == "Deauville"
+    )
+    assert gazetteer.locate("Casino, Rue du Port, 06400, France").name == "Cannes"
+    assert gazetteer.locate("Casino Lyon Vert, Nowhere, France") is None
+
+
+def test_arrondissements_have_their_own_centre():
+    gazetteer = get_gazetteer()
+    centre = gazetteer.lookup("Paris")
+    eighth = gazetteer.locate("Club, 12 avenue de Wagram, 75008 Paris, France")
+    assert eighth.name == "Paris" and "75008" in centre.postcodes
+    assert (eighth.lat, eighth.lon) != (centre.lat, centre.lon)
+    assert gazetteer.lookup(postcode="13008").lat < gazetteer.lookup("Marseille").lat
+
+
+def test_homonyms_need_a_postcode():
+    rows = [
+        {
+            "name": "Saint-Martin",
+            "postcode": "05120",
+            "lat": "44.8",
+            "lon": "6.6",
+            "department": "Hautes-Alpes",
+            "region": "PACA",
+        },
+        {
+            "name": "Saint-Martin",
+            "postcode": "32300",
+            "lat": "43.5",
+            "lon": "0.3",
+            "department": "Gers",
+            "region": "Occitanie",
+        },
+        {
+            "name": "Auch",
+            "postcode": "32000",
+            "lat": "43.6",
+            "lon": "0.6",
+            "department": "Gers",
+            "region": "Occitanie",
+        },
+    ]
+    gazetteer = Gazetteer(rows)
+    assert gazetteer.lookup("St Martin") is None
+    assert gazetteer.locate("Club, 32300 Saint-Martin").department == "Gers"
+    # A homonym falls through to the other components of the address.
+    assert gazetteer.locate("Casino, Saint-Martin, Auch").name == "Auch"
+    assert gazetteer.locate("Casino, Auch, Saint-Martin").name == "Auch"
+    assert gazetteer.locate("Casino, Saint-Martin, 05120").department == "Hautes-Alpes"
+    # An unknown (CEDEX) postcode does not hide a commune name.
+    assert gazetteer.locate("Casino, 32008 Auch Cedex").name == "Auch"
+
+
+def test_geo_api_rows():
+    def commune(nom, code, postcodes, lon, lat):
+        return {
+            "nom": nom,
+            "code": code,
+            "codesPostaux": postcodes,
+            "centre": {"type": "Point", "coordinates": [lon, lat]},
+            "departement": {"nom": "Rhône"},
+            "region": {"nom": "Auvergne-Rhône-Alpes"},
+        }
+
+    rows = list(
+        _geo_api_rows(
+            [
+                commune("Lyon", "69123", ["69001", "69002"], 4.8357, 45.764),
+                commune("Lyon 1er Arrondissement", "69381", ["69001"], 4.8292, 45.7699),
+                commune("Lyon 2e Arrondissement", "69382", ["69002"], 4.8265, 45.7493),
+                commune("Villeurbanne", "69266", ["69100"], 4.8798, 45.7719),
+            ]
+        )
+    )
+    assert [(r["name"], r["postcode"], r["lat"]) for r in rows] == [
+        ("Lyon", "", "45.7640"),
+        ("Lyon", "69001", "45.7699"),
+        ("Lyon", "69002", "45.7493"),
+        ("Villeurbanne", "69100", "45.7719"),
+    ]
+    gazetteer = Gazetteer(rows)
+    assert gazetteer.lookup("Lyon", "69002").lat == 45.7493
+    assert gazetteer.lookup("Lyon").lat == 45.764
+
+
+def test_kdtree_matches_brute_force():
+    rng = random.Random(3)
+    coords = [(rng.uniform(41, 51), rng.uniform(-5, 9)) for _ in range(500)]
+    points = [_unit_vector(lat, lon) for lat, lon in coords]
+    tree = KDTree(points)
+    for _ in range(50):
+        q = _unit_vector(rng.uniform(41, 51), rng.uniform(-5, 9))
+        expected = min(range(len(points)), key=lambda i: math.dist(points[i], q))
+        assert tree.nearest(q)[0] == expected
+
+
+def test_nearest_commune_within_range():
+    gazetteer = get_gazetteer()
+    assert gazetteer.nearest(49.36, 0.07).name in ("Deauville", "Trouville-sur-Mer")
+    assert gazetteer.nearest(43.30, 5.38).department == "Bouches-du-Rhône"
+    assert gazetteer.nearest(51.51, -0.13) is None  # London
+
+
+def test_geocoder_uses_gazetteer_before_nominatim(tmp_path):
+    service = GeocoderService(
+        db_path=str(tmp_path / "cache.sqlite"), min_delay=0, geolocator=FakeGeolocator()
+    )
+    result = service.geocode("Casino Barrière, Deauville, France")
+    assert result.department == "Calvados" and result.region == "Normandie"
+    assert service.geocode("Nowhere, Atlantis, France") is None
+    assert service.geolocator.calls == ["Nowhere, Atlantis, France"]
+    assert service.stats["gazetteer_hits"] == 1
+    service.close()
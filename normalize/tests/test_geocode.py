@@ -0,0 +1,146 @@
+import sqlite3
+from types import SimpleNamespace
+
+from normalize.geocode import (
+    DAY_SECONDS,
+    HIT,
+    MISS,
+    NEGATIVE_HIT,
+    GeocodeResult,
+    GeocoderService,
+)
+
+
+class FakeGeolocator:
+    def __init__(self):
+        self.calls = []
+
+    def geocode(self, address):
+        self.calls.append(address)
+        if address.startswith("Nowhere"):
+            return None
+        raw = {"address": {"county": "Rhône", "state": "Auvergne-Rhône-Alpes"}}
+        return SimpleNamespace(latitude=45.76, longitude=4.83, raw=raw)
+
+
+def make_service(tmp_path, **kwargs):
+    kwargs.setdefault("precision", "street")
+    return GeocoderService(
+        db_path=str(tmp_path / "cache.sqlite"),
+        min_delay=0,
+        geolocator=FakeGeolocator(),
+        **kwargs,
+    )
+
+
+def test_geocode_caches_in_memory_and_sqlite(tmp_path):
+    service = make_service(tmp_path)
+    first = service.geocode("Casino Lyon, Lyon, France")
+    assert first.department == "Rhône"
+    assert service.geocode("Casino Lyon, Lyon, France") == first
+    assert service.geocode("Nowhere, France") is None
+    assert service.geocode("Nowhere, France") is None
+    assert service.geolocator.calls == ["Casino Lyon, Lyon, France", "Nowhere, France"]
+    assert service.stats["lru_hits"] == 1 and service.stats["negative_hits"] == 1
+    assert service.stats["remote"] == 2
+    assert service.stats["not_found"] == 1
+    service.close()
+
+    # A new service (next run) finds both the hit and the miss in SQLite.
+    service = make_service(tmp_path)
+    assert service.lookup("Casino Lyon, Lyon, France") == (HIT, first)
+    assert service.lookup("Nowhere, France") == (NEGATIVE_HIT, None)
+    assert service.geolocator.calls == []
+    assert service.stats["db_hits"] == 1 and service.stats["negative_hits"] == 1
+    service.close()
+
+
+def test_negative_entries_expire_and_found_entries_refresh(tmp_path):
+    now = [1_000_000.0]
+    options = {"negative_ttl_days": 1, "refresh_days": 10, "clock": lambda: now[0]}
+    service = make_service(tmp_path, **options)
+    service.geocode_many(["Casino Lyon, Lyon, France", "Nowhere, France"])
+    assert service.cache_stats() == {
+        "found": 1,
+        "found_stale": 0,
+        "not_found": 1,
+        "not_found_expired": 0,
+    }
+    service.close()
+
+    now[0] += 2 * DAY_SECONDS
+    service = make_service(tmp_path, **options)
+    assert service.cache_stats()["not_found_expired"] == 1
+    assert service.lookup("Nowhere, France") == (MISS, None)
+    assert service.lookup("Casino Lyon, Lyon, France").outcome == HIT
+    service.close()
+
+    now[0] += 20 * DAY_SECONDS
+    service = make_service(tmp_path, **options)
+    assert service.prune(drop_stale=False) == {
+        "not_found_deleted": 1,
+        "stale_deleted": 0,
+    }
+    assert service.lookup("Casino Lyon, Lyon, France").outcome == MISS
+    assert service.stats["stale"] == 1
+    assert service.cache_stats() == {
+        "found": 1,
+        "found_stale": 0,
+        "not_found": 0,
+        "not_found_expired": 0,
+    }
+    service.close()
+
+
+def test_negative_entries_expire_in_memory(tmp_path):
+    now = [1_000_000.0]
+    gazetteer = SimpleNamespace(
+        locate=lambda address: SimpleNamespace(
+            lat=45.0, lon=4.0, department="Rhône", region="ARA"
+        )
+    )
+    service = make_service(
+        tmp_path, negative_ttl_days=1, clock=lambda: now[0], gazetteer=gazetteer
+    )
+    fallback = GeocodeResult(45.0, 4.0, "Rhône", "ARA")
+    assert service.lookup("Nowhere, Lyon, France") == (MISS, fallback)
+    # The commune fallback of an address Nominatim did not find is still a negative hit.
+    assert service.lookup("Nowhere, Lyon, France") == (NEGATIVE_HIT, fallback)
+    assert service.stats["lru_hits"] == 0 and service.stats["negative_hits"] == 1
+
+    now[0] += 2 * DAY_SECONDS
+    assert service.lookup("Nowhere, Lyon, France").outcome == MISS
+    assert service.geolocator.calls == ["Nowhere, Lyon, France"] * 2
+    service.close()
+
+
+def test_old_cache_schema_is_migrated(tmp_path):
+    path = tmp_path / "cache.sqlite"
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE cache (address TEXT PRIMARY KEY, lat REAL, lon REAL, department TEXT, region TEXT)"
+    )
+    conn.execute("INSERT INTO cache VALUES ('Old, France', 1.0, 2.0, 'Ain', 'ARA')")
+    conn.commit()
+    conn.close()
+    service = make_service(tmp_path)
+    assert service.lookup("Old, France") == (HIT, GeocodeResult(1.0, 2.0, "Ain", "ARA"))
+    service.close()
+
+
+def test_geocode_many_batches_cached_addresses(tmp_path):
+    service = make_service(tmp_path, lru_size=2)
+    addresses = [f"Casino {i}, France" for i in range(5)]
+    service.geocode_many(addresses)
+    assert len(service.geolocator.calls) == 5
+    results = service.geocode_many(
+        addresses + ["Casino 0, France", "", "Casino 9, France"]
+    )
+    assert set(results) == set(addresses) | {"Casino 9, France"}
+    assert all(r is not None for r in results.values())
+    # Casino 3 and 4 are still in the LRU, 0-2 come from SQLite, 9 is new.
+    assert service.stats["lru_hits"] == 2
+    assert service.stats["db_hits"] == 3
+    assert service.geolocator.calls[-1] == "Casino 9, France"
+    assert round(service.hit_rate, 2) == round(5 / 11, 2)
+    service.close()
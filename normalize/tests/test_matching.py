@@ -0,0 +1,203 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from normalize.dedup import origins_hash
+from normalize.matching import match_stored, remove_tournament
+
+START = datetime(2025, 10, 4, 18, 0, tzinfo=timezone.utc)
+
+
+def origin(source, title, key, h):
+    return {
+        "source_name": source,
+        "source_url": f"https://{source}.example/",
+        "title": title,
+        "source_id": key,
+        "source_hash": h,
+    }
+
+
+def stored(row_id, title, origins, venue_id=3, start=START):
+    return SimpleNamespace(
+        id=row_id,
+        venue_id=venue_id,
+        title=title,
+        start_datetime_local=start,
+        source_ids=sorted(o["source_id"] for o in origins if o.get("source_id"))
+        or None,
+        origins=origins or None,
+        status="scheduled",
+    )
+
+
+def event(title, source, key, h, **fields):
+    return dict(
+        {
+            "title": title,
+            "start": START,
+            "source_name": source,
+            "source_url": f"https://{source}.example/",
+            "source_id": key,
+            "source_hash": h,
+        },
+        **fields,
+    )
+
+
+class FakeConn:
+    def __init__(self, rows):
+        self.rows = rows
+        self.params = []
+
+    def execute(self, statement, params=None):
+        self.params.append(params)
+        ids = set(params["source_ids"])
+        keys = set(zip(params["venue_ids"], params["titles"], params["starts"]))
+        return [
+            r
+            for r in self.rows
+            if ids & set(r.source_ids or ())
+            or (r.venue_id, r.title, r.start_datetime_local) in keys
+        ]
+
+
+MERGED = stored(
+    5,
+    "MAIN EVENT - 150 €",
+    [
+        origin("agenda", "MAIN EVENT - 150 €", "a1", "ha"),
+        origin("rss", "Main Event 150€", "r1", "hr"),
+    ],
+)
+
+
+def test_delta_event_updates_merged_tournament_in_place():
+    # Only the RSS source changed: its event alone must not become a new tournament.
+    conn = FakeConn([MERGED])
+    (item,), deleted = match_stored(
+        conn, [(event("Main Event 150€", "rss", "r1", "hr2", buy_in_cents=15000), None)]
+    )
+    ev, venue_id = item
+    assert (ev["title"], ev["start"], venue_id, deleted) == (
+        "MAIN EVENT - 150 €",
+        START,
+        3,
+        [],
+    )
+    assert [(o["source_name"], o["source_hash"]) for o in ev["origins"]] == [
+        ("rss", "hr2"),
+        ("agenda", "ha"),
+    ]
+    assert (
+        ev["source_hash"] == origins_hash(ev["origins"]) and ev["buy_in_cents"] == 15000
+    )
+
+    # Unchanged sources give the tournament its stored hash back.
+    (item,), _ = match_stored(
+        conn, [(event("Main Event 150€", "rss", "r1", "hr"), None)]
+    )
+    assert item[0]["source_hash"] == origins_hash(MERGED.origins)
+
+
+def test_events_of_one_tournament_are_merged_and_duplicates_deleted():
+    duplicate = stored(
+        6,
+        "Main Event 150€",
+        [origin("rss", "Main Event 150€", "r1", "hr")],
+        start=START.replace(minute=30),
+    )
+    conn = FakeConn([duplicate, MERGED])
+    items = [
+        (event("Main Event 150€", "rss", "r1", "hr"), 3),
+        (event("Turbo", "rss", "r2", "ht"), 3),
+        (
+            event("MAIN EVENT - 150 €", "agenda", "a1", "ha", description="Structure"),
+            None,
+        ),
+    ]
+    result, deleted = match_stored(conn, items)
+    assert deleted == [6]
+    assert result[1] == items[1] and result[2] is None
+    ev, venue_id = result[0]
+    assert (ev["title"], venue_id, ev["description"]) == (
+        "MAIN EVENT - 150 €",
+        3,
+        "Structure",
+    )
+    assert sorted(o["source_id"] for o in ev["origins"]) == ["a1", "r1"]
+
+
+def test_tournaments_without_source_ids_match_by_key():
+    legacy = stored(7, "Turbo", [])
+    conn = FakeConn([legacy])
+    (item,), deleted = match_stored(conn, [(event("Turbo", "rss", "r2", "ht"), 3)])
+    assert item[1] == 3 and deleted == []
+    assert [o["source_id"] for o in item[0]["origins"]] == ["r2"] and item[0][
+        "source_hash"
+    ] == "ht"
+    # Without a venue id nor a source id there is nothing to look up.
+    assert match_stored(conn, [({"title": "Turbo", "start": START}, None)]) == (
+        [({"title": "Turbo", "start": START}, None)],
+        [],
+    )
+    assert len(conn.params) == 1
+
+
+class RemovalConn:
+    def __init__(self, rows):
+        self.rows = rows
+        self.updates = []
+
+    def execute(self, statement, params=None):
+        sql = str(statement).strip()
+        if sql.startswith("SELECT"):
+            return [r for r in self.rows if params["source_id"] in (r.source_ids or ())]
+        self.updates.append(
+            ("cancel" if "status = 'cancelled'" in sql else "origins", params)
+        )
+        return []
+
+
+def test_tombstones_remove_origins_and_cancel_orphaned_tournaments():
+    now = START.replace(day=1)
+    single = stored(8, "Turbo", [origin("rss", "Turbo", "r2", "ht")])
+    past = stored(
+        9,
+        "Freeroll",
+        [origin("rss", "Freeroll", "r3", "hf")],
+        start=START.replace(day=1, hour=0),
+    )
+    conn = RemovalConn([MERGED, single, past])
+    assert (
+        remove_tournament(
+            conn, {"source_name": "rss", "source_id": "r1", "change": "removed"}, now
+        )
+        == "updated"
+    )
+    kind, params = conn.updates[0]
+    assert (
+        kind == "origins"
+        and params["source_ids"] == ["a1"]
+        and params["source_hash"] == "ha"
+    )
+    assert (
+        remove_tournament(
+            conn, {"source_name": "rss", "source_id": "r2", "change": "removed"}, now
+        )
+        == "cancelled"
+    )
+    assert conn.updates[1] == ("cancel", {"id": 8})
+    # Past tournaments routinely disappear from listings.
+    assert (
+        remove_tournament(
+            conn, {"source_name": "rss", "source_id": "r3", "change": "removed"}, now
+        )
+        == "unchanged"
+    )
+    assert (
+        remove_tournament(
+            conn, {"source_name": "rss", "source_id": "r9", "change": "removed"}, now
+        )
+        == "unchanged"
+    )
+    assert len(conn.updates) == 2
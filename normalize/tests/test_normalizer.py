@@ -1,4 +1,6 @@
-from normalize.normalizer import normalize_event
+from types import SimpleNamespace
+
+from normalize.normalizer import normalize_event, upsert_tournament
 
 
 def test_normalize_event():
@@ -18,3 +20,62 @@ def test_normalize_event():
     assert ev["buy_in_cents"] == 10000
     assert ev["variant"] == "Holdem"
     assert ev["start"].tzinfo is not None
+
+
+class FakeResult:
+    def __init__(self, row):
+        self.row = row
+
+    def fetchone(self):
+        return self.row
+
+
+class FakeConn:
+    """Returns what Postgres would RETURN for an insert, an update, then a skipped update."""
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.sql = []
+        self.selects = 0
+
+    def execute(self, statement, params=None):
+        if str(statement).lstrip().startswith("SELECT"):
+            # No tournament stored for the event's sources (see `matching`).
+            self.selects += 1
+            return []
+        self.sql.append(str(statement))
+        return FakeResult(self.rows.pop(0))
+
+
+def test_upsert_tournament_reports_outcome():
+    conn = FakeConn(
+        [SimpleNamespace(inserted=True), SimpleNamespace(inserted=False), None]
+    )
+    event = {
+        "title": "Main Event",
+        "start": "2025-10-01T18:00:00+00:00",
+        "source_hash": "abc",
+    }
+    assert [upsert_tournament(conn, 1, event) for _ in range(3)] == [
+        "inserted",
+        "updated",
+        "unchanged",
+    ]
+    assert "IS DISTINCT FROM EXCLUDED.source_hash" in conn.sql[0]
+    # Single-source events are matched by the unique key only.
+    assert conn.selects == 0
+
+
+def test_upsert_tournament_matches_merged_events_with_stored_ones():
+    conn = FakeConn([SimpleNamespace(inserted=True)])
+    event = {
+        "title": "Main Event",
+        "start": "2025-10-01T18:00:00+00:00",
+        "source_hash": "abc",
+        "origins": [
+            {"source_name": "club", "title": "Main Event", "source_id": "c1"},
+            {"source_name": "rss", "title": "MAIN EVENT", "source_id": "r1"},
+        ],
+    }
+    assert upsert_tournament(conn, 1, event) == "inserted"
+    assert conn.selects == 1
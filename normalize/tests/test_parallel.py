@@ -0,0 +1,29 @@
+from normalize.normalizer import iter_normalized, normalize_chunk
+from normalize.parallel import map_chunks
+
+
+def make_raw(i):
+    return {
+        "title": f"Deepstack #{i}" if i % 7 else "",
+        "start": f"{i % 28 + 1:02d}/10/2025 20:00",
+        "buy_in": "100 €",
+        "source_name": "club",
+        "change": "removed" if i % 11 == 0 else None,
+    }
+
+
+def test_map_chunks_matches_inline_order():
+    raws = [make_raw(i) for i in range(1, 60)]
+    stats = {}
+    parallel = list(
+        map_chunks(normalize_chunk, raws, workers=2, chunk_size=4, stats=stats)
+    )
+    assert parallel == list(iter_normalized(raws))
+    assert [ev.get("title") for ev in parallel][:3] == [
+        "Deepstack #1",
+        "Deepstack #2",
+        "Deepstack #3",
+    ]
+    # Tombstones are passed through to the writer.
+    assert [ev["change"] for ev in parallel if "change" in ev] == ["removed"] * 5
+    assert stats["chunks"] == 15
@@ -0,0 +1,102 @@
+import threading
+from types import SimpleNamespace
+
+from normalize.geocode import GeocodeResult, GeocoderService
+from normalize.prefetch import GeocodePrefetcher, VenueBackfill
+
+
+class SlowGeolocator:
+    """Answers only once released, like a rate-limited Nominatim."""
+
+    def __init__(self):
+        self.calls = []
+        self.release = threading.Event()
+
+    def geocode(self, address):
+        self.release.wait(5)
+        self.calls.append(address)
+        if address.startswith("Nowhere"):
+            return None
+        return SimpleNamespace(
+            latitude=43.7,
+            longitude=7.27,
+            raw={"address": {"state": "Provence-Alpes-Côte d'Azur"}},
+        )
+
+
+class FakeConn:
+    def __init__(self):
+        self.updates = []
+
+    def execute(self, statement, params=None):
+        self.updates.append(params)
+        return SimpleNamespace(rowcount=1)
+
+
+def test_prefetcher_reads_ahead_and_backfills(tmp_path):
+    geolocator = SlowGeolocator()
+    service = GeocoderService(
+        db_path=str(tmp_path / "cache.sqlite"), min_delay=0, geolocator=geolocator
+    )
+    # Seed the cache with one address.
+    geolocator.release.set()
+    service.geocode("Known, France")
+    geolocator.release.clear()
+    geolocator.calls.clear()
+
+    prefetcher = GeocodePrefetcher(service, lookahead=4)
+    addresses = [
+        "Known, France",
+        "Casino Nice, France",
+        None,
+        "Casino Nice, France",
+        "Nowhere, France",
+        "Known, France",
+    ]
+    stream = prefetcher.lookahead_stream(range(len(addresses)), lambda i: addresses[i])
+
+    # The first pair comes out once four items have been read and submitted.
+    assert next(stream) == (0, "Known, France")
+    assert prefetcher.stats == {"addresses": 2, "cached": 1, "queued": 1, "resolved": 0}
+    assert prefetcher.get("Known, France")[0]
+    assert prefetcher.get("Casino Nice, France") == (False, None)
+
+    backfill = VenueBackfill()
+    backfill.defer("Casino Nice, France", 7)
+    backfill.defer("Casino Nice, France", 7)
+    assert [i for i, _ in stream] == [1, 2, 3, 4, 5]
+
+    geolocator.release.set()
+    prefetcher.close()
+    assert geolocator.calls == ["Casino Nice, France", "Nowhere, France"]
+    assert prefetcher.get("Casino Nice, France")[1].lat == 43.7
+
+    conn = FakeConn()
+    backfill.collect(prefetcher)
+    assert backfill.apply(conn) == 1
+    assert conn.updates[0]["venue_id"] == 7 and conn.updates[0]["lon"] == 7.27
+    assert backfill.stats == {"deferred": 1, "backfilled": 1}
+    service.close()
+
+
+def test_backfill_waits_for_pending_venues():
+    result = GeocodeResult(
+        lat=43.7, lon=7.27, department="Alpes-Maritimes", region=None
+    )
+    prefetcher = SimpleNamespace(completed=lambda: [("Casino Nice, France", result)])
+    resolver = SimpleNamespace(
+        created={}, venue_id=lambda ref: ref if ref >= 0 else resolver.created.get(ref)
+    )
+    backfill = VenueBackfill()
+    # A new venue staged by the bulk writer under a pending id, and a known one matched by alias.
+    backfill.defer("Casino Nice, France", -1)
+    backfill.defer("Casino Nice, France", 3)
+    backfill.collect(prefetcher)
+    conn = FakeConn()
+    assert backfill.apply(conn, resolver) == 1
+    assert [u["venue_id"] for u in conn.updates] == [3]
+
+    resolver.created[-1] = 12
+    assert backfill.apply(conn, resolver) == 1
+    assert [u["venue_id"] for u in conn.updates] == [3, 12]
+    assert backfill.apply(conn, resolver) == 0
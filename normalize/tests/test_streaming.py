@@ -0,0 +1,203 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from normalize import normalizer, streaming
+from normalize.streaming import EventStream
+
+
+def test_stream_applies_backpressure_and_keeps_order():
+    stream = EventStream(maxsize=2)
+    produced = []
+
+    def produce():
+        for i in range(5):
+            stream.put({"i": i})
+            produced.append(i)
+        stream.finish()
+
+    producer = threading.Thread(target=produce)
+    producer.start()
+    time.sleep(0.2)
+    # The producer is blocked on the full queue.
+    assert len(produced) == 2
+    assert [ev["i"] for ev in stream] == [0, 1, 2, 3, 4]
+    producer.join()
+    assert stream.stats["events"] == 5 and stream.stats["blocked_seconds"] > 0
+
+
+def test_closed_stream_releases_blocked_producers():
+    stream = EventStream(maxsize=1)
+    stream.put({"i": 0})
+    producer = threading.Thread(target=lambda: (stream.put({"i": 1}), stream.finish()))
+    producer.start()
+    stream.close()
+    producer.join(timeout=2)
+    assert not producer.is_alive()
+    assert stream.stats["dropped"] == 2
+
+
+def test_pipeline_writes_events_while_sources_run(tmp_path, monkeypatch):
+    source_done = threading.Event()
+    written_before_done = []
+
+    def fake_run_sources(sources, parts_dir, sink=None, **kwargs):
+        for i in range(3):
+            sink({"title": f"event {i}"})
+        time.sleep(0.2)
+        source_done.set()
+        return {
+            "club": {
+                "events": 3,
+                "status": "ok",
+                "duration": 0.2,
+                "stats": {},
+                "path": tmp_path / "club.jsonl",
+            }
+        }
+
+    def fake_upsert_events(raw_events, *args, **kwargs):
+        count = 0
+        for _ in raw_events:
+            count += 1
+            written_before_done.append(not source_done.is_set())
+        return {"events": count, "inserted": count, "updated": 0, "unchanged": 0}
+
+    monkeypatch.setattr(streaming, "run_sources", fake_run_sources)
+    monkeypatch.setattr(streaming, "upsert_events", fake_upsert_events)
+    acknowledged = []
+    monkeypatch.setattr(
+        streaming,
+        "StateStore",
+        lambda: SimpleNamespace(close=lambda: None, acknowledge=acknowledged.append),
+    )
+    monkeypatch.setattr(streaming, "HttpCache", lambda: None)
+    monkeypatch.setattr(streaming, "PARSE_WORKERS", 0)
+    counts = streaming.run_pipeline(sources=[{"name": "club"}])
+    assert counts["events"] == 3
+    assert all(written_before_done)
+    assert len(acknowledged) == 1
+
+
+def test_pipeline_keeps_state_pending_when_the_writer_fails(tmp_path, monkeypatch):
+    staged = []
+
+    def fake_run_sources(sources, parts_dir, sink=None, run_id=None, **kwargs):
+        sink({"title": "event"})
+        staged.append(run_id)
+        return {
+            "club": {
+                "events": 1,
+                "status": "ok",
+                "duration": 0.0,
+                "stats": {},
+                "path": tmp_path / "club.jsonl",
+            }
+        }
+
+    def failing_upsert_events(raw_events, *args, **kwargs):
+        next(iter(raw_events))
+        raise RuntimeError("connection lost")
+
+    acknowledged = []
+    monkeypatch.setattr(streaming, "run_sources", fake_run_sources)
+    monkeypatch.setattr(streaming, "upsert_events", failing_upsert_events)
+    monkeypatch.setattr(
+        streaming,
+        "StateStore",
+        lambda: SimpleNamespace(close=lambda: None, acknowledge=acknowledged.append),
+    )
+    monkeypatch.setattr(streaming, "HttpCache", lambda: None)
+    monkeypatch.setattr(streaming, "PARSE_WORKERS", 0)
+    with pytest.raises(RuntimeError):
+        streaming.run_pipeline(sources=[{"name": "club"}])
+    assert staged[0] is not None and acknowledged == []
+
+
+def test_events_put_after_finish_are_dropped():
+    stream = EventStream(maxsize=10)
+    stream.put({"i": 0})
+    stream.finish()
+    stream.put({"i": 1})
+    assert [ev["i"] for ev in stream] == [0]
+    assert stream.stats["dropped"] == 1
+
+
+def test_pipeline_commits_stream_events_in_batches(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'db.sqlite'}", future=True)
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "CREATE TABLE venues (id INTEGER PRIMARY KEY, name TEXT, address TEXT, city TEXT, department TEXT,"
+                " region TEXT, postcode TEXT, latitude REAL, longitude REAL)"
+            )
+        )
+        conn.execute(
+            text(
+                "CREATE TABLE venue_aliases (name_key TEXT, city_key TEXT, venue_id INTEGER, method TEXT)"
+            )
+        )
+        conn.execute(text("CREATE TABLE written (title TEXT)"))
+
+    def fake_run_sources(sources, parts_dir, sink=None, **kwargs):
+        for i in range(10):
+            sink(
+                {
+                    "title": f"Deepstack #{i}",
+                    "start": f"{i + 1:02d}/10/2025 20:00",
+                    "venue_name": "Casino Lyon",
+                    "city": "Lyon",
+                    "source_name": "club",
+                }
+            )
+        return {
+            "club": {
+                "events": 10,
+                "status": "ok",
+                "duration": 0.0,
+                "stats": {},
+                "path": tmp_path / "club.jsonl",
+            }
+        }
+
+    def upsert_tournament(conn, venue_id, event):
+        conn.execute(
+            text("INSERT INTO written (title) VALUES (:title)"),
+            {"title": event["title"]},
+        )
+        return "inserted"
+
+    geocoder_stats = (
+        "lookups",
+        "lru_hits",
+        "db_hits",
+        "negative_hits",
+        "gazetteer_hits",
+        "remote",
+    )
+    monkeypatch.setattr(normalizer, "get_engine", lambda: engine)
+    monkeypatch.setattr(
+        normalizer,
+        "get_geocoder",
+        lambda: SimpleNamespace(stats=dict.fromkeys(geocoder_stats, 0), hit_rate=0.0),
+    )
+    monkeypatch.setattr(normalizer, "geocode_address", lambda query: None)
+    monkeypatch.setattr(normalizer, "upsert_tournament", upsert_tournament)
+    monkeypatch.setattr(streaming, "run_sources", fake_run_sources)
+    monkeypatch.setattr(
+        streaming,
+        "StateStore",
+        lambda: SimpleNamespace(close=lambda: None, acknowledge=lambda run_id: 1),
+    )
+    monkeypatch.setattr(streaming, "HttpCache", lambda: None)
+    monkeypatch.setattr(streaming, "PARSE_WORKERS", 0)
+    # Two intermediate commits of 4 events, then the final one.
+    counts = streaming.run_pipeline(
+        sources=[{"name": "club"}], lookahead=0, commit_size=4
+    )
+    assert counts["events"] == 10
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM written")).scalar() == 10
@@ -0,0 +1,123 @@
+"""Writes against a real Postgres, skipped unless ``TEST_DATABASE_URL`` is set.
+
+The database needs PostGIS; each test runs in a throwaway schema.
+"""
+import os
+import uuid
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from normalize import normalizer
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+SCHEMA_SQL = Path(__file__).resolve().parents[2] / "schema" / "schema.sql"
+
+pytestmark = pytest.mark.skipif(
+    not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set"
+)
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    schema = f"test_{uuid.uuid4().hex[:12]}"
+    admin = create_engine(TEST_DATABASE_URL, future=True)
+    with admin.begin() as conn:
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+    engine = create_engine(
+        TEST_DATABASE_URL,
+        future=True,
+        connect_args={"options": f"-csearch_path={schema},public"},
+    )
+    with engine.begin() as conn:
+        conn.exec_driver_sql(SCHEMA_SQL.read_text(encoding="utf-8"))
+    geocoder_stats = (
+        "lookups",
+        "lru_hits",
+        "db_hits",
+        "negative_hits",
+        "gazetteer_hits",
+        "remote",
+    )
+    monkeypatch.setattr(normalizer, "get_engine", lambda: engine)
+    monkeypatch.setattr(
+        normalizer,
+        "get_geocoder",
+        lambda: SimpleNamespace(stats=dict.fromkeys(geocoder_stats, 0), hit_rate=0.0),
+    )
+    monkeypatch.setattr(normalizer, "geocode_address", lambda query: None)
+    try:
+        yield engine
+    finally:
+        engine.dispose()
+        with admin.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+        admin.dispose()
+
+
+def raw(source, source_id, title, source_hash, description=None):
+    return {
+        "title": title,
+        "description": description,
+        "start": "2030-10-01T18:00:00+00:00",
+        "venue_name": "Casino Barrière",
+        "city": "Deauville",
+        "source_name": source,
+        "source_id": source_id,
+        "source_hash": source_hash,
+    }
+
+
+def upsert(events, dedup=False):
+    return normalizer.upsert_events(
+        iter(events), lookahead=0, workers=0, dedup=dedup, commit_size=0
+    )
+
+
+def tournaments(engine):
+    with engine.connect() as conn:
+        return conn.execute(
+            text(
+                "SELECT title, description, source_ids, origins FROM tournaments ORDER BY id"
+            )
+        ).all()
+
+
+def test_reruns_update_stored_tournaments_in_place(engine):
+    club = raw("club", "c1", "Main Event 150€", "h1", "Freezeout")
+    rss = raw("rss", "r1", "MAIN EVENT - 150 €", "h2")
+    assert upsert([club, rss], dedup=True)["inserted"] == 1
+    (merged,) = tournaments(engine)
+    assert sorted(merged.source_ids) == ["c1", "r1"]
+
+    # A later run without deduplication sees one source, with new content.
+    counts = upsert([raw("rss", "r1", "MAIN EVENT - 150 €", "h3", "Re-entry")])
+    assert (counts["inserted"], counts["updated"]) == (0, 1)
+    (updated,) = tournaments(engine)
+    assert updated.title == "Main Event 150€"
+    assert updated.description == "Re-entry"
+    assert {o["source_name"] for o in updated.origins} == {"club", "rss"}
+
+    # The same run again leaves it untouched.
+    counts = upsert([raw("rss", "r1", "MAIN EVENT - 150 €", "h3", "Re-entry")])
+    assert (counts["inserted"], counts["updated"], counts["unchanged"]) == (0, 0, 1)
+    assert len(tournaments(engine)) == 1
+
+
+def test_rerun_merges_duplicates_written_by_earlier_runs(engine):
+    upsert([raw("club", "c1", "Main Event 150€", "h1")])
+    upsert([raw("rss", "r1", "MAIN EVENT - 150 €", "h2")])
+    assert len(tournaments(engine)) == 2
+
+    counts = upsert(
+        [
+            raw("club", "c1", "Main Event 150€", "h1"),
+            raw("rss", "r1", "MAIN EVENT - 150 €", "h2"),
+        ],
+        dedup=True,
+    )
+    assert counts["inserted"] == 0
+    (merged,) = tournaments(engine)
+    assert sorted(merged.source_ids) == ["c1", "r1"]
@@ -0,0 +1,171 @@
+from types import SimpleNamespace
+
+from normalize.venues import VenueResolver, venue_tokens
+
+
+class FakeResult(list):
+    pass
+
+
+class FakeConn:
+    def __init__(self, venues=(), aliases=()):
+        self.venues = [
+            SimpleNamespace(
+                id=i,
+                name=n,
+                city=c,
+                address=a,
+                postcode=None,
+                latitude=lat,
+                longitude=lon,
+            )
+            for i, n, c, a, lat, lon in venues
+        ]
+        self.aliases = [
+            SimpleNamespace(name_key=n, city_key=c, venue_id=i) for n, c, i in aliases
+        ]
+        self.saved = []
+
+    def execute(self, statement, params=None):
+        sql = str(statement).strip()
+        if sql.startswith("SELECT id, name, city"):
+            return FakeResult(self.venues)
+        if sql.startswith("SELECT name_key"):
+            return FakeResult(self.aliases)
+        if sql.startswith("INSERT INTO venue_aliases"):
+            self.saved.extend(params)
+        return FakeResult()
+
+
+VENUES = [
+    (
+        1,
+        "Casino Barrière",
+        "Deauville",
+        "Rue Edmond Blanc, 14800 Deauville",
+        49.3597,
+        0.0704,
+    ),
+    (2, "Casino de Lyon", "Lyon", None, None, None),
+    (3, "Pasino Grand", "Aix-en-Provence", None, 43.5297, 5.4474),
+    (4, "Club 1", "Paris", None, None, None),
+]
+
+
+def venue(name, city=None, **fields):
+    return dict(
+        {"name": name, "city": city, "address": None, "lat": None, "lon": None},
+        **fields
+    )
+
+
+def test_venue_tokens_drop_generic_words_and_city():
+    assert venue_tokens("Casino Barrière", "Deauville") == {"barriere"}
+    assert venue_tokens("Casino Barriere Deauville", "Deauville") == {"barriere"}
+    assert venue_tokens("Barrière Deauville", "Deauville") == {"barriere"}
+    assert venue_tokens("Casino de Lyon", "Lyon") == {"lyon"}
+    assert venue_tokens("Unknown Venue", "Lyon") == frozenset()
+
+
+def test_matches_spellings_of_a_known_venue():
+    resolver = VenueResolver(FakeConn(VENUES))
+    assert resolver.match(venue("Casino Barrière", "Deauville")) == 1
+    assert resolver.match(venue("CASINO BARRIERE", "deauville")) == 1
+    assert resolver.match(venue("Barrière Deauville", "Deauville")) == 1
+    assert resolver.match(venue("Grand Casino Barrière", "Deauville")) == 1
+    # Same postcode, city spelled differently.
+    assert (
+        resolver.match(
+            venue("Barriere", "Deauville-sur-Mer", address="14800 Deauville")
+        )
+        == 1
+    )
+    assert resolver.match(venue("Casino", "Lyon")) is None
+    assert resolver.match(venue("Club 2", "Paris")) is None
+    assert (
+        resolver.stats["hits"],
+        resolver.stats["alias_hits"],
+        resolver.stats["matched"],
+        resolver.stats["misses"],
+    ) == (1, 1, 3, 2)
+
+
+def test_names_of_qualifiers_only_do_not_match():
+    resolver = VenueResolver(
+        FakeConn(
+            [
+                (1, "Grand Hotel Casino", "Cannes", None, 43.5513, 7.0128),
+                (2, "Casino Barrière Croisette", "Cannes", None, None, None),
+            ]
+        )
+    )
+    assert resolver.match(venue("Grand Casino", "Cannes")) is None
+    assert (
+        resolver.match(venue("Grand Casino", "Cannes", lat=43.5514, lon=7.0129)) is None
+    )
+    assert resolver.match(venue("Grand Casino Barrière", "Cannes")) is None
+    assert resolver.match(venue("Casino Barrière Croisette Hôtel", "Cannes")) == 2
+    assert resolver.stats["misses"] == 3
+
+
+def test_matches_by_location():
+    resolver = VenueResolver(FakeConn(VENUES))
+    # No city, but geocoded next to the Pasino.
+    assert resolver.match(venue("Le Pasino", None, lat=43.5299, lon=5.4476)) == 3
+    assert (
+        resolver.match(
+            venue("Unknown Venue", "Aix-en-Provence", lat=43.5297, lon=5.4475)
+        )
+        == 3
+    )
+    assert (
+        resolver.match(venue("Unknown Venue", "Aix-en-Provence", lat=43.54, lon=5.4474))
+        is None
+    )
+
+
+def test_aliases_are_saved_and_reused():
+    conn = FakeConn(VENUES)
+    resolver = VenueResolver(conn)
+    resolver.match(venue("Barrière Deauville", "Deauville"))
+    resolver.match(venue("Barrière Deauville", "Deauville"))
+    assert resolver.save_aliases() == 1
+    assert conn.saved == [
+        {
+            "name_key": "barriere deauville",
+            "city_key": "deauville",
+            "venue_id": 1,
+            "method": "name",
+        }
+    ]
+
+    reloaded = VenueResolver(
+        FakeConn(VENUES, aliases=[("barriere deauville", "deauville", 1)])
+    )
+    assert reloaded.match(venue("Barrière Deauville", "Deauville")) == 1
+    assert reloaded.stats["alias_hits"] == 1 and reloaded.stats["aliases"] == 1
+
+
+def test_new_venues_are_matched_once_created():
+    conn = FakeConn()
+    resolver = VenueResolver(conn)
+    assert resolver.match(venue("Casino Partouche", "Cannes")) is None
+    resolver.add("Casino Partouche", "Cannes", 9)
+    assert resolver.match(venue("Partouche", "Cannes")) == 9
+    assert resolver.stats["created"] == 1
+
+
+def test_staged_venues_resolve_once_created():
+    resolver = VenueResolver(FakeConn(VENUES))
+    assert resolver.stage(venue("Barrière Deauville", "Deauville")) == (
+        1,
+        venue("Barrière Deauville", "Deauville"),
+    )
+    ref, staged = resolver.stage(venue("Casino Partouche", "Cannes"))
+    assert ref < 0 and resolver.venue_id(ref) is None
+    assert resolver.stage(venue("Partouche", "Cannes")) == (
+        ref,
+        venue("Casino Partouche", "Cannes"),
+    )
+    resolver.add("Casino Partouche", "Cannes", 9)
+    assert resolver.venue_id(ref) == 9 and resolver.venue_id(1) == 1
@@ -7,24 +7,20 @@ import re
 from datetime import datetime
 from typing import Optional
 
-from dateutil import parser
+from . import datetimes
 
 
-def parse_datetime(value: Optional[str]) -> Optional[datetime]:
-    """Parse a string into a timezone‑aware datetime.
+def parse_datetime(
+    value: Optional[str], source: Optional[str] = None
+) -> Optional[datetime]:
+    """Parse a string into a datetime (timezone‑aware when it has an offset).
 
-    Accepts various formats; returns None if parsing fails.
+    Accepts ISO 8601, day-first numeric and French long dates through the
+    fast paths of `normalize.datetimes`, and any other format dateutil reads;
+    ``source`` lets the parser try the format last seen for that source
+    first. Returns None if parsing fails.
     """
-    if not value:
-        return None
-    try:
-        dt = parser.isoparse(value)
-        return dt
-    except Exception:
-        try:
-            return parser.parse(value)
-        except Exception:
-            return None
+    return datetimes.parse(value, source)
 
 
 def parse_buy_in(value: Optional[str]) -> Optional[int]:
@@ -0,0 +1,485 @@
+"""
+In-memory venue resolver and matcher.
+
+A run touches a few hundred venues but used to look each one up with a
+``SELECT ... WHERE name = :name AND city = :city`` per event. `VenueResolver`
+loads the venues once at the start of a run, answers lookups from memory and
+records the venues it (or the bulk writer) creates, so only the first event
+of a new venue reaches the database. Hit/miss counters are kept in ``stats``.
+
+Sources do not spell venues the same way: "Casino Barrière", "Casino
+Barriere Deauville" and "Barrière Deauville" are one venue. A venue that is
+not known by its exact (name, city) is looked up, in order:
+
+1. by alias: the accent- and case-folded name and city, either of a known
+   venue or recorded in the ``venue_aliases`` table by an earlier match;
+2. by name: the tokens identifying the venue (`venue_tokens`: folded, without
+   generic words such as "casino" and without the city) are the same as
+   those of exactly one venue of the same city or postcode;
+3. fuzzily: the names differ only by qualifiers (`QUALIFIER_WORDS`, e.g.
+   "Grand Casino Barrière" and "Casino Barrière"): their distinctive tokens,
+   the others, are the same and not empty, and the Jaccard similarity of all
+   their tokens, the best within the city or postcode without a tie, reaches
+   `NORMALIZE_VENUE_MATCH_THRESHOLD`;
+4. by location: the venue is geocoded within `NORMALIZE_VENUE_RADIUS_M` of a
+   venue sharing a distinctive token (or of a single named venue, for an
+   event without a venue name).
+
+Names with different numbers ("Club 1" and "Club 2") never match, nor do
+names made only of qualifiers ("Grand Casino" and "Grand Hotel Casino"). Every
+lookup is a handful of dict accesses, a 0.01° grid serving the location
+step. Matches found by steps 2 to 4 are written to ``venue_aliases`` by
+`save_aliases`, so later runs resolve them in step 1.
+
+A NULL city is a key like any other: events without a city share one venue
+per name instead of creating a new venue each time.
+"""
+from __future__ import annotations
+
+import math
+import os
+import re
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from .gazetteer import POSTCODE_RE, fold
+
+VenueKey = Tuple[str, Optional[str]]
+AliasKey = Tuple[str, str]
+
+MATCH_RADIUS_M = float(os.environ.get("NORMALIZE_VENUE_RADIUS_M", "150"))
+MATCH_THRESHOLD = float(os.environ.get("NORMALIZE_VENUE_MATCH_THRESHOLD", "0.5"))
+UNKNOWN_VENUE = "Unknown Venue"
+# Words that name the kind of venue rather than the venue itself.
+GENERIC_WORDS = frozenset(
+    ("casino", "club", "poker", "de", "du", "des", "la", "le", "les", "l", "d", "the")
+)
+# Words qualifying a venue, shared by too many venues to tell them apart.
+QUALIFIER_WORDS = frozenset(
+    (
+        "grand",
+        "petit",
+        "hotel",
+        "resort",
+        "spa",
+        "palace",
+        "royal",
+        "municipal",
+        "cercle",
+        "bar",
+    )
+)
+GRID_DEGREES = 0.01
+METRES_PER_DEGREE = 111_320.0
+_NON_ALNUM_RE = re.compile(r"[^0-9a-z]+")
+_NUMBER_RE = re.compile(r"^\d+$")
+
+SELECT_VENUES_SQL = "SELECT id, name, city, address, postcode, latitude, longitude FROM venues ORDER BY id"
+SELECT_ALIASES_SQL = "SELECT name_key, city_key, venue_id FROM venue_aliases"
+INSERT_ALIAS_SQL = """
+INSERT INTO venue_aliases (name_key, city_key, venue_id, method)
+VALUES (:name_key, :city_key, :venue_id, :method)
+ON CONFLICT (name_key, city_key) DO NOTHING
+"""
+
+
+def insert_venue(
+    conn,
+    name: str,
+    address: Optional[str],
+    city: Optional[str],
+    department: Optional[str],
+    region: Optional[str],
+    lat: Optional[float],
+    lon: Optional[float],
+) -> int:
+    """Insert a new venue and return its ID."""
+    geom_expr = "ST_SetSRID(ST_MakePoint(:lon, :lat), 4326)" if lat and lon else None
+    if geom_expr:
+        insert_sql = text(
+            """
+            INSERT INTO venues (name, address, city, department, region, postcode, latitude, longitude, geom)
+            VALUES (:name, :address, :city, :department, :region, NULL, :lat, :lon, ST_SetSRID(ST_MakePoint(:lon, :lat), 4326))
+            RETURNING id
+            """
+        )
+        params = {
+            "name": name,
+            "address": address,
+            "city": city,
+            "department": department,
+            "region": region,
+            "lat": lat,
+            "lon": lon,
+        }
+    else:
+        insert_sql = text(
+            """
+            INSERT INTO venues (name, address, city, department, region)
+            VALUES (:name, :address, :city, :department, :region)
+            RETURNING id
+            """
+        )
+        params = {
+            "name": name,
+            "address": address,
+            "city": city,
+            "department": department,
+            "region": region,
+        }
+    res = conn.execute(insert_sql, params)
+    vid = res.scalar()
+    return vid
+
+
+def venue_tokens(name: Optional[str], city: Optional[str]) -> FrozenSet[str]:
+    """Return the tokens identifying a venue name: folded, without generic words or the city.
+
+    A name made only of generic words and the city ("Casino de Lyon") keeps
+    the city tokens; an unknown venue has no tokens.
+    """
+    if not name or name == UNKNOWN_VENUE:
+        return frozenset()
+    tokens = [
+        t for t in _NON_ALNUM_RE.sub(" ", fold(name)).split() if t not in GENERIC_WORDS
+    ]
+    city_tokens = set(_NON_ALNUM_RE.sub(" ", fold(city or "")).split())
+    return frozenset([t for t in tokens if t not in city_tokens] or tokens)
+
+
+def alias_key(name: str, city: Optional[str]) -> AliasKey:
+    return fold(name), fold(city or "")
+
+
+def _blocks(
+    city: Optional[str], address: Optional[str], postcode: Optional[str] = None
+) -> List[str]:
+    postcodes = set(POSTCODE_RE.findall(address or ""))
+    if postcode:
+        postcodes.add(postcode)
+    return [fold(city or "")] + ["cp:" + p for p in sorted(postcodes)]
+
+
+def _numbers(tokens: Iterable[str]) -> FrozenSet[str]:
+    return frozenset(t for t in tokens if _NUMBER_RE.match(t))
+
+
+def _distinctive(tokens: FrozenSet[str]) -> FrozenSet[str]:
+    return tokens - QUALIFIER_WORDS
+
+
+def _cell(lat: float, lon: float) -> Tuple[int, int]:
+    return math.floor(lat / GRID_DEGREES), math.floor(lon / GRID_DEGREES)
+
+
+def distance_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Equirectangular distance, accurate to well under a metre at venue scale."""
+    x = math.radians(lon2 - lon1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return 6_371_000.0 * math.hypot(x, y)
+
+
+class VenueResolver:
+    """Maps venues to ids by exact (name, city), alias or fuzzy match, loaded once and kept up to date."""
+
+    def __init__(
+        self, conn, radius_m: float = MATCH_RADIUS_M, threshold: float = MATCH_THRESHOLD
+    ) -> None:
+        self.conn = conn
+        self.radius_m = radius_m
+        self.threshold = threshold
+        self._ids: Dict[VenueKey, int] = {}
+        self._aliases: Dict[AliasKey, int] = {}
+        self._tokens: Dict[int, FrozenSet[str]] = {}
+        self._by_core: Dict[Tuple[str, str], List[int]] = {}
+        self._by_token: Dict[Tuple[str, str], List[int]] = {}
+        self._grid: Dict[Tuple[int, int], List[int]] = {}
+        self._coords: Dict[int, Tuple[float, float]] = {}
+        self._new_aliases: List[Dict] = []
+        # Venues staged by the bulk writer before they exist get negative ids.
+        self._pending: Dict[int, VenueKey] = {}
+        self._created: Dict[int, int] = {}
+        self._pending_aliases: Dict[int, List[Tuple[AliasKey, str]]] = {}
+        self.stats: Dict[str, int] = {
+            "loaded": 0,
+            "aliases": 0,
+            "hits": 0,
+            "alias_hits": 0,
+            "matched": 0,
+            "misses": 0,
+            "created": 0,
+        }
+        self.load()
+
+    def load(self) -> None:
+        """(Re)load the venues and their aliases from the database."""
+        for index in (
+            self._ids,
+            self._aliases,
+            self._tokens,
+            self._by_core,
+            self._by_token,
+            self._grid,
+            self._coords,
+        ):
+            index.clear()
+        self._pending.clear()
+        self._created.clear()
+        self._pending_aliases.clear()
+        for row in self.conn.execute(text(SELECT_VENUES_SQL)):
+            # Keep the oldest venue when older runs created duplicates.
+            if (row.name, row.city) not in self._ids:
+                self._index(
+                    row.id,
+                    row.name,
+                    row.city,
+                    row.address,
+                    row.postcode,
+                    row.latitude,
+                    row.longitude,
+                )
+        self.stats["loaded"] = len(self._ids)
+        aliases = 0
+        for row in self.conn.execute(text(SELECT_ALIASES_SQL)):
+            self._aliases.setdefault((row.name_key, row.city_key), row.venue_id)
+            aliases += 1
+        self.stats["aliases"] = aliases
+
+    def _index(
+        self,
+        venue_id: int,
+        name: str,
+        city: Optional[str],
+        address: Optional[str] = None,
+        postcode: Optional[str] = None,
+        lat: Optional[float] = None,
+        lon: Optional[float] = None,
+    ) -> None:
+        self._ids[(name, city)] = venue_id
+        self._aliases.setdefault(alias_key(name, city), venue_id)
+        tokens = venue_tokens(name, city)
+        self._tokens[venue_id] = tokens
+        if tokens:
+            core = " ".join(sorted(tokens))
+            for block in _blocks(city, address, postcode):
+                self._by_core.setdefault((core, block), []).append(venue_id)
+                for token in tokens:
+                    self._by_token.setdefault((token, block), []).append(venue_id)
+        if lat is not None and lon is not None:
+            self._coords[venue_id] = (lat, lon)
+            self._grid.setdefault(_cell(lat, lon), []).append(venue_id)
+
+    def _best(
+        self,
+        tokens: FrozenSet[str],
+        candidates: Iterable[int],
+        threshold: float,
+        same_distinctive: bool,
+    ) -> Optional[int]:
+        """Return the unique most similar candidate scoring at least ``threshold``.
+
+        Candidates must have the same distinctive tokens as ``tokens`` when
+        ``same_distinctive``, and share one otherwise.
+        """
+        numbers = _numbers(tokens)
+        distinctive = _distinctive(tokens)
+        if not distinctive:
+            return None
+        best, best_score, tie = None, 0.0, False
+        for venue_id in set(candidates):
+            other = self._tokens[venue_id]
+            if _numbers(other) != numbers:
+                continue
+            other_distinctive = _distinctive(other)
+            if (
+                other_distinctive != distinctive
+                if same_distinctive
+                else not other_distinctive & distinctive
+            ):
+                continue
+            score = len(tokens & other) / len(tokens | other)
+            if score > best_score:
+                best, best_score, tie = venue_id, score, False
+            elif score == best_score and score > 0:
+                tie = True
+        if best is None or tie or best_score < threshold:
+            return None
+        return best
+
+    def _nearby(self, lat: float, lon: float) -> List[int]:
+        dlat = self.radius_m / METRES_PER_DEGREE
+        dlon = dlat / max(math.cos(math.radians(lat)), 0.01)
+        (x0, y0), (x1, y1) = _cell(lat - dlat, lon - dlon), _cell(
+            lat + dlat, lon + dlon
+        )
+        found = []
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                for venue_id in self._grid.get((x, y), ()):
+                    if distance_m(lat, lon, *self._coords[venue_id]) <= self.radius_m:
+                        found.append(venue_id)
+        return found
+
+    def _find(self, venue: Dict) -> Tuple[Optional[int], str]:
+        """Return the id matching ``venue`` (negative while pending) and how it was found."""
+        name, city = venue["name"], venue.get("city")
+        lat, lon = venue.get("lat"), venue.get("lon")
+        if (not name or name == UNKNOWN_VENUE) and lat is not None and lon is not None:
+            # An event without a venue name at the address of a single known venue.
+            named = {i for i in self._nearby(lat, lon) if self._tokens[i]}
+            if len(named) == 1:
+                return named.pop(), "location"
+        venue_id = self._ids.get((name, city))
+        if venue_id is not None:
+            return venue_id, "exact"
+        venue_id = self._aliases.get(alias_key(name, city))
+        if venue_id is not None:
+            return venue_id, "alias"
+        tokens = venue_tokens(name, city)
+        if not tokens:
+            return None, "miss"
+        blocks = _blocks(city, venue.get("address"))
+        core = " ".join(sorted(tokens))
+        for block in blocks:
+            ids = set(self._by_core.get((core, block), ()))
+            if len(ids) == 1:
+                return ids.pop(), "name"
+        candidates = [
+            i
+            for block in blocks
+            for token in tokens
+            for i in self._by_token.get((token, block), ())
+        ]
+        venue_id = self._best(tokens, candidates, self.threshold, same_distinctive=True)
+        if venue_id is not None:
+            return venue_id, "fuzzy"
+        if lat is not None and lon is not None:
+            venue_id = self._best(
+                tokens, self._nearby(lat, lon), 1e-9, same_distinctive=False
+            )
+            if venue_id is not None:
+                return venue_id, "geo"
+        return None, "miss"
+
+    def _lookup(self, venue: Dict) -> Tuple[Optional[int], str]:
+        venue_id, method = self._find(venue)
+        if venue_id is not None and venue_id < 0:
+            venue_id = self._created.get(venue_id, venue_id)
+        if venue_id is None:
+            self.stats["misses"] += 1
+            return None, method
+        if method == "exact":
+            self.stats["hits"] += 1
+        elif method == "alias":
+            self.stats["alias_hits"] += 1
+        else:
+            self.stats["matched"] += 1
+            if method != "location":
+                # An unnamed venue's (name, city) does not identify it: no alias.
+                self._remember(
+                    alias_key(venue["name"], venue.get("city")), venue_id, method
+                )
+        return venue_id, method
+
+    def _remember(self, key: AliasKey, venue_id: int, method: str) -> None:
+        self._aliases[key] = venue_id
+        if venue_id < 0:
+            self._pending_aliases.setdefault(venue_id, []).append((key, method))
+        else:
+            self._new_aliases.append(
+                {
+                    "name_key": key[0],
+                    "city_key": key[1],
+                    "venue_id": venue_id,
+                    "method": method,
+                }
+            )
+
+    def get(self, name: str, city: Optional[str]) -> Optional[int]:
+        """Return the id of a venue known by its exact name and city, counting the hit or miss."""
+        venue_id = self._ids.get((name, city))
+        if venue_id is not None and venue_id < 0:
+            venue_id = self._created.get(venue_id)
+        self.stats["hits" if venue_id is not None else "misses"] += 1
+        return venue_id
+
+    def match(self, venue: Dict) -> Optional[int]:
+        """Return the id of the known venue ``venue`` (the output of `venue_fields`) names, if any."""
+        venue_id, _ = self._lookup(venue)
+        return venue_id if venue_id is not None and venue_id >= 0 else None
+
+    def stage(self, venue: Dict) -> Tuple[int, Dict]:
+        """Return the venue id and fields under which the bulk writer stages ``venue``.
+
+        A new venue gets a negative pending id (see `venue_id`) and is staged
+        under the name of the first variant seen in the run, so that the
+        writer creates it only once.
+        """
+        venue_id, _ = self._lookup(venue)
+        if venue_id is None:
+            pending_id = -(len(self._pending) + 1)
+            self._pending[pending_id] = (venue["name"], venue.get("city"))
+            self._index(
+                pending_id,
+                venue["name"],
+                venue.get("city"),
+                venue.get("address"),
+                None,
+                venue.get("lat"),
+                venue.get("lon"),
+            )
+            return pending_id, venue
+        if venue_id < 0:
+            name, city = self._pending[venue_id]
+            return venue_id, dict(venue, name=name, city=city)
+        return venue_id, venue
+
+    def venue_id(self, ref: int) -> Optional[int]:
+        """Return the id of a venue returned by `stage`: None while a pending venue is not created."""
+        return ref if ref >= 0 else self._created.get(ref)
+
+    def add(
+        self,
+        name: str,
+        city: Optional[str],
+        venue_id: int,
+        lat: Optional[float] = None,
+        lon: Optional[float] = None,
+        address: Optional[str] = None,
+    ) -> None:
+        """Record a venue created during the run."""
+        known = self._ids.get((name, city))
+        if known is not None and known < 0 and known not in self._created:
+            self._created[known] = venue_id
+            self._ids[(name, city)] = venue_id
+            for key, method in self._pending_aliases.pop(known, ()):
+                self._remember(key, venue_id, method)
+            self.stats["created"] += 1
+        elif known is None:
+            self._index(venue_id, name, city, address, None, lat, lon)
+            self.stats["created"] += 1
+
+    def resolve(self, venue: Dict) -> int:
+        """Return the id of ``venue`` (the output of `venue_fields`), creating it if needed."""
+        venue_id = self.match(venue)
+        if venue_id is None:
+            venue_id = insert_venue(self.conn, **venue)
+            self.add(
+                venue["name"],
+                venue.get("city"),
+                venue_id,
+                venue.get("lat"),
+                venue.get("lon"),
+                venue.get("address"),
+            )
+        return venue_id
+
+    def save_aliases(self) -> int:
+        """Write the aliases found since the last call to ``venue_aliases``; return how many."""
+        if not self._new_aliases:
+            return 0
+        self.conn.execute(text(INSERT_ALIAS_SQL), self._new_aliases)
+        count = len(self._new_aliases)
+        self._new_aliases = []
+        return count
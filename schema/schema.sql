@@ -31,6 +31,19 @@ CREATE TABLE IF NOT EXISTS venues (
 CREATE INDEX IF NOT EXISTS idx_venues_geom ON venues USING GIST (geom);
 CREATE INDEX IF NOT EXISTS idx_venues_city ON venues (city);
 
+-- Other spellings of venue names, found by the normaliser's venue matcher
+-- (normalize/venues.py) and keyed by the folded name and city.
+CREATE TABLE IF NOT EXISTS venue_aliases (
+    name_key TEXT NOT NULL,
+    city_key TEXT NOT NULL DEFAULT '',
+    venue_id INTEGER NOT NULL REFERENCES venues(id) ON DELETE CASCADE,
+    method TEXT NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (name_key, city_key)
+);
+
+CREATE INDEX IF NOT EXISTS idx_venue_aliases_venue ON venue_aliases (venue_id);
+
 -- Table of tournaments/events.
 CREATE TABLE IF NOT EXISTS tournaments (
     id SERIAL PRIMARY KEY,
@@ -46,11 +59,21 @@ CREATE TABLE IF NOT EXISTS tournaments (
     status event_status DEFAULT 'scheduled',
     source_url TEXT,
     source_hash TEXT NOT NULL,
+    -- Identity keys (source_id) of the raw events this tournament was built from.
+    source_ids TEXT[],
+    -- Sources merged into this tournament: [{source_name, source_url, title, source_id, source_hash}, ...]
+    origins JSONB,
     created_at TIMESTAMPTZ DEFAULT NOW(),
     updated_at TIMESTAMPTZ DEFAULT NOW(),
     CONSTRAINT unique_event UNIQUE (venue_id, title, start_datetime_local)
 );
 
+-- Databases created before cross-source deduplication.
+ALTER TABLE tournaments ADD COLUMN IF NOT EXISTS origins JSONB;
+-- Databases created before tournaments were matched across runs (see normalize/matching.py).
+ALTER TABLE tournaments ADD COLUMN IF NOT EXISTS source_ids TEXT[];
+
 CREATE INDEX IF NOT EXISTS idx_tournaments_start ON tournaments (start_datetime_local);
 CREATE INDEX IF NOT EXISTS idx_tournaments_status ON tournaments (status);
 CREATE INDEX IF NOT EXISTS idx_tournaments_variant ON tournaments (variant);
+CREATE INDEX IF NOT EXISTS idx_tournaments_source_ids ON tournaments USING GIN (source_ids);